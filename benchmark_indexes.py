@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Before/after benchmark of the index migration
+
+Builds a large synthetic database with the pre-migration schema (no
+secondary indexes, association tables without a key), times the hot
+queries, runs migrate_indexes() and times them again.
+
+Usage: python benchmark_indexes.py [--scale 5.0] [--repeat 5] [--keep PATH]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from flask import Flask
+from sqlalchemy import Column, MetaData, Table, func, select, text
+
+from models.database import (
+    db, Animal, Therapy, Experiment, Assay, AssayMeasurement,
+    experiment_therapy_association, animal_assay_association
+)
+from models.indexes import ASSOCIATION_TABLES, migrate_indexes
+from models.pagination import paginate_keyset
+from models.statistics import compute_summary, compute_measurement_insights
+from models.synthetic import SCALE_UNIT_ANIMALS, generate_dataset
+
+
+def create_legacy_schema(connection):
+    """Create the schema as it was before the index plan"""
+    db.metadata.create_all(connection)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.drop(connection)
+    legacy = MetaData()
+    for table in ASSOCIATION_TABLES:
+        table.drop(connection)
+        Table(table.name, legacy, *[Column(column.name, column.type) for column in table.columns])
+    legacy.create_all(connection)
+
+
+def benchmark_queries(sizes: dict, seed: int = 7) -> dict:
+    """The hot lookups of the web app, keyed by a short label"""
+    rng = random.Random(seed)
+    experiment_ids = [rng.randint(1, sizes['experiments']) for _ in range(20)]
+    assay_ids = [rng.randint(1, sizes['assays']) for _ in range(20)]
+    since = datetime(2025, 3, 1)
+    link = experiment_therapy_association.c
+
+    def measurements_by_assay_parameter():
+        for assay_id in assay_ids:
+            db.session.execute(select(AssayMeasurement.value).where(
+                AssayMeasurement.assay_id == assay_id,
+                AssayMeasurement.parameter_name == 'Glucose')).all()
+
+    def experiment_assays():
+        for experiment_id in experiment_ids:
+            db.session.execute(select(Assay.id).where(Assay.experiment_id == experiment_id)).all()
+
+    def experiment_therapies():
+        for experiment_id in experiment_ids:
+            db.session.execute(select(Therapy.name).join(experiment_therapy_association)
+                               .where(link.experiment_id == experiment_id)).all()
+
+    def therapy_experiments():
+        for therapy_id in range(1, 16):
+            db.session.execute(select(func.count()).select_from(experiment_therapy_association)
+                               .where(link.therapy_id == therapy_id)).scalar()
+
+    def assay_animals():
+        for assay_id in assay_ids:
+            db.session.execute(select(animal_assay_association.c.animal_id)
+                               .where(animal_assay_association.c.assay_id == assay_id)).all()
+
+    def measurement_insights():
+        for experiment_id in experiment_ids[:5]:
+            compute_measurement_insights(experiment_id, limit=8)
+
+    def recent_experiments():
+        db.session.execute(select(func.count()).where(Experiment.created_at >= since)).scalar()
+
+    def animals_first_page():
+        paginate_keyset(Animal.query, [(Animal.created_at, True), (Animal.id, True)], per_page=20)
+
+    return {
+        'measurements(assay, parameter) x20': measurements_by_assay_parameter,
+        'assays of experiment x20': experiment_assays,
+        'therapies of experiment x20': experiment_therapies,
+        'experiments per therapy x15': therapy_experiments,
+        'animals of assay x20': assay_animals,
+        'measurement insights x5': measurement_insights,
+        'recent experiments count': recent_experiments,
+        'animals listing first page': animals_first_page,
+        'dashboard summary': compute_summary,
+    }
+
+
+def time_queries(queries: dict, repeat: int) -> dict:
+    """Median wall time of each query in milliseconds"""
+    timings = {}
+    for label, run in queries.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[label] = statistics.median(samples)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=float, default=5.0,
+                        help=f'Dataset size in units of {SCALE_UNIT_ANIMALS} animals')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query (median reported)')
+    parser.add_argument('--keep', metavar='PATH', help='Keep the generated database at PATH')
+    args = parser.parse_args()
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    if os.path.exists(path):
+        os.remove(path)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.abspath(path)}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        start = time.perf_counter()
+        with db.engine.begin() as connection:
+            create_legacy_schema(connection)
+        sizes = generate_dataset(args.scale)
+        db.session.execute(text("ANALYZE"))
+        print(f"Generated {', '.join(f'{count} {name}' for name, count in sizes.items())} "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        queries = benchmark_queries(sizes)
+        before = time_queries(queries, args.repeat)
+        db.session.remove()
+
+        start = time.perf_counter()
+        with db.engine.begin() as connection:
+            changes = migrate_indexes(connection)
+        print(f"Migration: {len(changes)} changes in {time.perf_counter() - start:.1f}s")
+
+        after = time_queries(queries, args.repeat)
+        db.session.remove()
+
+    width = max(len(label) for label in queries)
+    print(f"\n{'query':<{width}}  {'before ms':>10}  {'after ms':>10}  {'speedup':>8}")
+    for label in queries:
+        speedup = before[label] / after[label] if after[label] else float('inf')
+        print(f"{label:<{width}}  {before[label]:>10.2f}  {after[label]:>10.2f}  {speedup:>7.1f}x")
+
+    if not args.keep:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Route benchmark suite
+
+Generates a synthetic dataset at each requested scale, then drives every
+page and JSON endpoint through the Flask test client. For each route it
+reports p50/p95 latency and SQL statements per request. Every run is
+appended to a JSONL history file along with the git revision, and the
+report shows how p50 changed since the previous run at the same scale.
+
+A route that raises (e.g. a missing template) or answers 5xx is flagged
+as failed in the results and listed after the report; the run is still
+recorded. Latency changes are only reported between runs where the route
+succeeded both times, so a failure's fast error path never reads as a
+speed-up.
+
+Usage:
+    python benchmark_routes.py [--scale 1 --scale 10] [--requests 20]
+                               [--output benchmark_results.jsonl] [--label NAME]
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(), 'benchmark_routes.db')
+
+# create_app reads its database URI from the environment
+os.environ['INVIVODB_DATABASE_URI'] = f'sqlite:///{DATABASE_PATH}'
+sys.path.insert(0, os.path.join(BASE_DIR, 'src', 'web'))
+sys.path.insert(0, os.path.join(BASE_DIR, 'src'))
+
+from sqlalchemy import event, func, select
+
+from app import create_app
+from models.database import db, Animal, Experiment, AssayType, Assay
+from models.cache import statistics_cache
+from models.engine import READ_ENGINE_KEY
+from models.synthetic import generate_dataset
+
+app = create_app()
+
+DEFAULT_OUTPUT = os.path.join(BASE_DIR, 'benchmark_results.jsonl')
+
+# (name, method, URL template, request body factory); templates are filled
+# from sample_ids()
+ROUTES = (
+    ('landing', 'GET', '/', None),
+    ('dashboard', 'GET', '/dashboard', None),
+    ('animals', 'GET', '/animals', None),
+    ('animal_detail', 'GET', '/animals/{animal_id}', None),
+    ('experiments', 'GET', '/experiments', None),
+    ('experiments_by_species', 'GET', '/experiments?species_id={species_id}', None),
+    ('experiment_detail', 'GET', '/experiments/{experiment_id}', None),
+    ('experiment_profile', 'GET', '/experiment_profile/{experiment_id}', None),
+    ('therapies', 'GET', '/therapies', None),
+    ('therapies_search', 'GET', '/therapies?q=anti', None),
+    ('search', 'GET', '/search?q=mouse+survival', None),
+    ('species_profiles', 'GET', '/species', None),
+    ('assay_types', 'GET', '/assay_types', None),
+    ('assay_detail', 'GET', '/assay/{assay_id}', None),
+    ('select_experiment_for_assay', 'GET', '/select_experiment_for_assay?search=study', None),
+    ('add_animal_form', 'GET', '/add_animal', None),
+    ('add_experiment_form', 'GET', '/add_experiment', None),
+    ('add_assay_type_form', 'GET', '/add_assay_type', None),
+    ('add_assay_form', 'GET', '/add_assay/{experiment_id}', None),
+    ('add_measurement_form', 'GET', '/add_measurement/{assay_id}', None),
+    ('api_summary', 'GET', '/api/summary', None),
+    ('metrics', 'GET', '/metrics', None),
+    ('api_assay_types', 'GET', '/api/assay_types?search=chem', None),
+    ('api_assay_parameters', 'GET', '/api/assay_parameters?assay_type_id={assay_type_id}', None),
+    ('api_export_measurements', 'GET', '/api/export/measurements?experiment_id={experiment_id}',
+     None),
+    ('api_animals_list', 'GET', '/api/animals?limit=1000', None),
+    ('api_experiments_list', 'GET', '/api/experiments?species_id={species_id}&limit=1000', None),
+    ('api_assays_list', 'GET', '/api/assays?experiment_id={experiment_id}', None),
+    ('api_measurements_list', 'GET', '/api/measurements?experiment_id={experiment_id}', None),
+    ('api_animal_series', 'GET', '/api/animals/{animal_id}/series', None),
+    ('api_experiment_stats', 'GET', '/api/experiments/{experiment_id}/stats', None),
+    ('api_assays', 'POST', '/api/assays', lambda ids: {'json': {
+        'experiment_id': ids['experiment_id'], 'assay_type_id': ids['assay_type_id'],
+        'timepoint': 'Day 7',
+        'measurements': [{'parameter_name': 'Glucose', 'value': 101.5, 'unit': 'mg/dL'}]}}),
+    ('api_animals_import', 'POST', '/api/animals/import', lambda ids: {'data': {
+        'file': (io.BytesIO(b'species_code,strain,sex\nMM,C57BL/6,Female\nRN,Wistar,Male\n'),
+                 'animals.csv')}}),
+)
+
+
+class QueryCounter:
+    """Counts SQL statements executed on the given engines"""
+
+    def __init__(self, *engines):
+        self.count = 0
+        for engine in engines:
+            if engine is not None:
+                event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args, **kwargs):
+        self.count += 1
+
+
+def percentile(samples, q: float) -> float:
+    """Nearest-rank percentile of samples (q in 0-100)"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def sample_ids() -> dict:
+    """Pick the rows parameterized routes hit (mid-table, never a best case)"""
+    def middle(column):
+        return db.session.execute(select(func.max(column))).scalar() // 2 or 1
+
+    experiment_id = middle(Experiment.id)
+    return {
+        'animal_id': middle(Animal.id),
+        'experiment_id': experiment_id,
+        'assay_id': db.session.execute(select(func.min(Assay.id))
+                                       .where(Assay.experiment_id == experiment_id)).scalar() or 1,
+        'assay_type_id': db.session.execute(
+            select(AssayType.id).where(AssayType.name == 'Blood Chemistry')).scalar() or 1,
+        'species_id': db.session.execute(
+            select(Animal.species_id).where(Animal.id == 1)).scalar() or 1,
+    }
+
+
+def reset_database(scale: float, seed: int) -> tuple:
+    """Fill an empty database file at the given scale and pick sample ids"""
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+        if READ_ENGINE_KEY in app.extensions:
+            app.extensions[READ_ENGINE_KEY].dispose()
+        if os.path.exists(DATABASE_PATH):
+            os.remove(DATABASE_PATH)
+        db.create_all()
+        statistics_cache.clear()
+        counts = generate_dataset(scale=scale, seed=seed)
+        ids = sample_ids()
+        db.session.remove()
+    return counts, ids
+
+
+def route_failed(statuses: dict) -> bool:
+    """Whether a route raised or answered with a server error in any request"""
+    return any(not code.isdigit() or int(code) >= 500 for code in statuses)
+
+
+def benchmark_route(client, counter: QueryCounter, method: str, url: str, body, ids: dict,
+                    requests: int) -> dict:
+    """Issue one warm-up and then `requests` timed requests against a route"""
+    latencies, queries, statuses, errors = [], [], {}, []
+    size = 0
+    for attempt in range(requests + 1):
+        kwargs = body(ids) if body else {}
+        counter.count = 0
+        start = time.perf_counter()
+        try:
+            response = client.open(url, method=method, **kwargs)
+            data = response.get_data()
+            status = str(response.status_code)
+        except Exception as e:  # Routes whose template or handler fails still get timed
+            data, status = b'', type(e).__name__
+            if len(errors) < 3:
+                errors.append(f'{type(e).__name__}: {e}'[:200])
+        elapsed = (time.perf_counter() - start) * 1000
+        if attempt == 0:
+            continue
+        latencies.append(elapsed)
+        queries.append(counter.count)
+        statuses[status] = statuses.get(status, 0) + 1
+        size = len(data)
+    return {
+        'url': url,
+        'method': method,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'queries_p50': percentile(queries, 50),
+        'queries_max': max(queries),
+        'response_bytes': size,
+        'statuses': statuses,
+        'errors': errors,
+        'failed': route_failed(statuses),
+    }
+
+
+def uncovered_routes() -> list:
+    """Endpoints registered on the app that ROUTES does not exercise"""
+    covered = set()
+    adapter = app.url_map.bind('localhost')
+    for _, method, template, _ in ROUTES:
+        path = template.split('?')[0].format(animal_id=1, experiment_id=1, assay_id=1,
+                                             assay_type_id=1, species_id=1)
+        covered.add(adapter.match(path, method=method)[0])
+    return sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                  if rule.endpoint != 'static' and rule.endpoint not in covered)
+
+
+def run_scale(scale: float, seed: int, requests: int, counter: QueryCounter) -> dict:
+    start = time.perf_counter()
+    counts, ids = reset_database(scale, seed)
+    print(f"\nScale {scale:g}: {', '.join(f'{count} {table}' for table, count in counts.items())} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    client = app.test_client()
+    routes = {}
+    for name, method, template, body in ROUTES:
+        routes[name] = benchmark_route(client, counter, method, template.format(**ids), body, ids,
+                                       requests)
+    return {'scale': scale, 'seed': seed, 'dataset': counts, 'routes': routes}
+
+
+def load_history(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as history:
+        return [json.loads(line) for line in history if line.strip()]
+
+
+def previous_run(history: list, scale: float, seed: int):
+    for entry in reversed(history):
+        if entry['scale'] == scale and entry['seed'] == seed:
+            return entry
+    return None
+
+
+def print_report(result: dict, previous) -> None:
+    routes = result['routes']
+    width = max(len(name) for name in routes)
+    header = f"{'route':<{width}}  {'status':>10}  {'p50 ms':>9}  {'p95 ms':>9}  {'queries':>7}"
+    if previous:
+        header += f"  {'p50 vs ' + previous['revision']:>20}"
+    print(header)
+    for name, stats in routes.items():
+        status = ','.join(sorted(code if code.isdigit() else 'error' for code in stats['statuses']))
+        line = (f"{name:<{width}}  {status:>10}  {stats['p50_ms']:>9.2f}  {stats['p95_ms']:>9.2f}  "
+                f"{stats['queries_p50']:>7}")
+        before = previous['routes'].get(name) if previous else None
+        if before and before['p50_ms'] and not stats['failed'] and not before.get('failed'):
+            change = (stats['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+            line += f"  {change:>+19.0f}%"
+        print(line)
+        for error in stats['errors'][:1]:
+            print(f"{'':<{width}}    ! {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every route on a synthetic dataset')
+    parser.add_argument('--scale', type=float, action='append',
+                        help='Dataset scale in units of 1000 animals (repeatable, default 1)')
+    parser.add_argument('--seed', type=int, default=42, help='Dataset seed')
+    parser.add_argument('--requests', type=int, default=20, help='Timed requests per route')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help='JSONL file results are appended to')
+    parser.add_argument('--label', help='Free-text label stored with the results')
+    args = parser.parse_args()
+
+    # Report the exception a failing route raised rather than the 500
+    # handler's response
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+
+    missing = uncovered_routes()
+    if missing:
+        print(f"Warning: routes not covered by the benchmark: {', '.join(missing)}")
+
+    with app.app_context():
+        # GET requests read from the read engine, writes go to the primary
+        counter = QueryCounter(db.engine, app.extensions.get(READ_ENGINE_KEY))
+    history = load_history(args.output)
+    revision = git_revision()
+    for scale in args.scale or [1.0]:
+        result = run_scale(scale, args.seed, args.requests, counter)
+        result.update({
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'revision': revision,
+            'label': args.label,
+            'requests': args.requests,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+        })
+        print_report(result, previous_run(history, scale, args.seed))
+        failed = [name for name, stats in result['routes'].items() if stats['failed']]
+        if failed:
+            print(f"{len(failed)} route(s) failed (flagged in the results): {', '.join(failed)}")
+        with open(args.output, 'a', encoding='utf-8') as output:
+            output.write(json.dumps(result) + '\n')
+        print(f"Results appended to {args.output}")
+
+    os.remove(DATABASE_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,9 +5,11 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src', 'web'))
 
-from app import app, db
+from app import create_app, db
 from models.database import Species
 
+app = create_app()
+
 species_to_add = [
     {"common_name": "Dog", "scientific_name": "Canis lupus familiaris", "taxonomy_id": "9615"},
     {"common_name": "Macaque", "scientific_name": "Macaca mulatta", "taxonomy_id": "9544"},
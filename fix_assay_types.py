@@ -7,9 +7,11 @@ import sys
 import os
 sys.path.append('src')
 
-from web.app import app, db
+from web.app import create_app, db
 from models.database import AssayType
 
+app = create_app()
+
 def fix_assay_types():
     """Fix assay types data"""
     with app.app_context():
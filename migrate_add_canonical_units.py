@@ -0,0 +1,35 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src', 'web'))
+
+from app import create_app, db
+from sqlalchemy import inspect, text
+
+from models.series import rebuild_series
+from models.units import backfill_canonical_values
+
+app = create_app()
+
+def column_exists(conn, table_name, column_name):
+    result = conn.execute(text(f"PRAGMA table_info({table_name})")).fetchall()
+    return any(row[1] == column_name for row in result)
+
+def report(totals):
+    print(f"  batch {totals['batches']}: {totals['scanned']} scanned, "
+          f"{totals['converted']} converted ({totals['rows_per_second']:.0f} rows/s)")
+
+with app.app_context():
+    with db.engine.begin() as conn:
+        for column, column_type in (('canonical_value', 'FLOAT'),
+                                    ('canonical_unit', 'VARCHAR(50)')):
+            if not column_exists(conn, 'assay_measurements', column):
+                print(f"Adding '{column}' column to 'assay_measurements' table...")
+                conn.execute(text(f'ALTER TABLE assay_measurements '
+                                  f'ADD COLUMN {column} {column_type}'))
+            else:
+                print(f"'{column}' column already exists in 'assay_measurements' table.")
+
+    result = backfill_canonical_values(progress=report)
+    print(f"Normalized {result['scanned']} measurements in {result['seconds']:.2f}s")
+    if result['scanned'] and inspect(db.engine).has_table('measurement_series'):
+        print(f"Rebuilt {rebuild_series()} series")
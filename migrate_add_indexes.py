@@ -0,0 +1,19 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src', 'web'))
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from app import create_app, db
+from models.indexes import migrate_indexes
+
+app = create_app()
+
+with app.app_context():
+    with db.engine.begin() as conn:
+        changes = migrate_indexes(conn)
+    if changes:
+        for change in changes:
+            print(change)
+        print(f"{len(changes)} changes applied.")
+    else:
+        print("All indexes already exist.")
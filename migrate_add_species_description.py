@@ -2,9 +2,11 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src', 'web'))
 
-from app import app, db
+from app import create_app, db
 from sqlalchemy import text
 
+app = create_app()
+
 def column_exists(conn, table_name, column_name):
     result = conn.execute(text(f"PRAGMA table_info({table_name})")).fetchall()
     return any(row[1] == column_name for row in result)
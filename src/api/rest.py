@@ -0,0 +1,286 @@
+"""
+InvivoDB REST API
+
+Read-only collection endpoints for animals, experiments, assays and
+measurements, serialized with the Pydantic schemas in models.schemas.
+Responses are streamed: rows are fetched in batches with yield_per and
+each batch is written out as soon as it is encoded, so the server holds one
+batch at a time however large the result is. Downstream pipelines can pull
+whole tables, and resume an interrupted pull with after_id.
+
+Formats (?format=):
+- ndjson (default): one JSON object per line, application/x-ndjson
+- json: a single JSON array, sent in chunks
+
+Longitudinal series (/api/animals/<id>/series) are served from the
+array-backed store in models.series, as JSON arrays or as the raw float64
+blob (?format=binary).
+
+GET endpoints send ETag/Last-Modified validators (models.conditional) and
+answer a matching If-None-Match/If-Modified-Since with 304 before querying.
+"""
+
+import typing
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from pydantic import BaseModel
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import schemas
+from models.cohort_statistics import get_experiment_stats
+from models.conditional import conditional, experiment_version, series_version, tables_version
+from models.database import (
+    Species, Animal, Experiment, Therapy, TherapyCategory, AssayType, Assay, AssayMeasurement,
+    MeasurementSeries
+)
+from models.series import Series, decode_series, get_animal_series
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+
+@lru_cache(maxsize=None)
+def _schema_fields(schema) -> Tuple[Tuple[str, Optional[type], bool], ...]:
+    """
+    (field name, nested schema or None, is a list) for each field of a
+    schema, in declaration order
+    """
+    fields = []
+    for name, field in schema.model_fields.items():
+        annotation, is_list = field.annotation, False
+        if typing.get_origin(annotation) is typing.Union:
+            annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+        if typing.get_origin(annotation) in (list, List):
+            annotation, is_list = typing.get_args(annotation)[0], True
+        is_schema = isinstance(annotation, type) and issubclass(annotation, BaseModel)
+        nested = annotation if is_schema else None
+        fields.append((name, nested, is_list))
+    return tuple(fields)
+
+
+def to_schema(schema, obj) -> BaseModel:
+    """
+    Build a schema instance from an ORM object without re-validating it
+
+    Stored rows are serialized as they are: the columns are free text, and
+    values the form or an import accepted (e.g. sex "Intersex") must not
+    abort a stream halfway through. Attributes the object lacks become null;
+    nested schemas are built from the loaded relationships.
+    """
+    values = {}
+    for name, nested, is_list in _schema_fields(schema):
+        value = getattr(obj, name, None)
+        if nested is not None and value is not None:
+            value = ([to_schema(nested, item) for item in value] if is_list
+                     else to_schema(nested, value))
+        values[name] = value
+    return schema.model_construct(**values)
+
+
+def encode(schema, obj) -> str:
+    """Serialize an ORM object as a JSON document shaped by schema"""
+    return to_schema(schema, obj).model_dump_json(warnings=False)
+
+
+def _encoded_batches(query, schema, batch_size: int) -> Iterator[List[str]]:
+    batch = []
+    for obj in query.yield_per(batch_size):
+        batch.append(encode(schema, obj))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stream_json(query, schema, fmt: str = 'ndjson',
+                batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[str]:
+    """
+    Yield the rows of an ORM query as NDJSON lines or a JSON array, one chunk
+    per batch
+
+    Args:
+        query: ORM query of the model schema describes
+        schema: Pydantic schema each row is serialized with
+        fmt: 'ndjson' or 'json'
+        batch_size: Rows fetched per round trip and encoded per chunk
+    """
+    if fmt == 'ndjson':
+        for batch in _encoded_batches(query, schema, batch_size):
+            yield '\n'.join(batch) + '\n'
+        return
+
+    yield '['
+    separator = ''
+    for batch in _encoded_batches(query, schema, batch_size):
+        yield separator + ','.join(batch)
+        separator = ','
+    yield ']'
+
+
+def _stream_response(query, model, schema):
+    """Apply the shared after_id/limit parameters and stream the query"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in STREAM_FORMATS:
+        expected = ', '.join(STREAM_FORMATS)
+        return jsonify({'error': f'Unsupported format "{fmt}", expected one of {expected}'}), 400
+    batch_size = min(max(request.args.get('batch_size', DEFAULT_BATCH_SIZE, type=int), 1),
+                     MAX_BATCH_SIZE)
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', type=int)
+
+    # Ordered by primary key so an interrupted pull resumes with
+    # after_id=<last id received>
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    query = query.order_by(model.id)
+    if limit is not None:
+        query = query.limit(max(limit, 0))
+
+    return Response(stream_with_context(stream_json(query, schema, fmt, batch_size)),
+                    mimetype=STREAM_FORMATS[fmt])
+
+
+@api_bp.route('/animals')
+@conditional(lambda: tables_version(Animal, Species))
+def list_animals():
+    """Stream animals with their species; filter by species_id, strain or sex"""
+    query = Animal.query.options(joinedload(Animal.species))
+
+    species_id = request.args.get('species_id', type=int)
+    if species_id is not None:
+        query = query.filter(Animal.species_id == species_id)
+    for column in ('strain', 'sex'):
+        value = request.args.get(column)
+        if value:
+            query = query.filter(getattr(Animal, column) == value)
+
+    return _stream_response(query, Animal, schemas.Animal)
+
+
+@api_bp.route('/experiments')
+@conditional(lambda: tables_version(Experiment, Animal, Species, Therapy, TherapyCategory))
+def list_experiments():
+    """Stream experiments with animal and therapies (by animal or species)"""
+    # Many-to-one joins ride along with each batch; therapies are loaded per
+    # batch with one IN query
+    query = Experiment.query.options(
+        joinedload(Experiment.animal).joinedload(Animal.species),
+        selectinload(Experiment.therapies).joinedload(Therapy.category),
+    )
+
+    animal_id = request.args.get('animal_id', type=int)
+    if animal_id is not None:
+        query = query.filter(Experiment.animal_id == animal_id)
+    species_id = request.args.get('species_id', type=int)
+    if species_id is not None:
+        query = query.filter(Experiment.animal.has(Animal.species_id == species_id))
+
+    return _stream_response(query, Experiment, schemas.Experiment)
+
+
+@api_bp.route('/experiments/<int:experiment_id>/stats')
+@conditional(lambda experiment_id: experiment_version(experiment_id, measurements=True))
+def experiment_stats(experiment_id):
+    """Group statistics of an experiment per arm, timepoint and parameter"""
+    stats = get_experiment_stats(experiment_id)
+    if stats is None:
+        return jsonify({'error': f'Experiment {experiment_id} not found'}), 404
+    return jsonify(stats)
+
+
+@api_bp.route('/assays')
+@conditional(lambda: tables_version(Assay, AssayType, AssayMeasurement))
+def list_assays():
+    """Stream assays with type and measurements (by experiment or type)"""
+    query = Assay.query.options(joinedload(Assay.assay_type), selectinload(Assay.measurements))
+
+    for column in ('experiment_id', 'assay_type_id'):
+        value = request.args.get(column, type=int)
+        if value is not None:
+            query = query.filter(getattr(Assay, column) == value)
+
+    return _stream_response(query, Assay, schemas.Assay)
+
+
+@api_bp.route('/measurements')
+@conditional(lambda: tables_version(AssayMeasurement, Assay))
+def list_measurements():
+    """Stream measurements; filter by assay, experiment or parameter_name"""
+    query = AssayMeasurement.query
+
+    assay_id = request.args.get('assay_id', type=int)
+    if assay_id is not None:
+        query = query.filter(AssayMeasurement.assay_id == assay_id)
+    experiment_id = request.args.get('experiment_id', type=int)
+    if experiment_id is not None:
+        query = (query.join(Assay, Assay.id == AssayMeasurement.assay_id)
+                 .filter(Assay.experiment_id == experiment_id))
+    parameter_name = request.args.get('parameter_name')
+    if parameter_name:
+        query = query.filter(AssayMeasurement.parameter_name == parameter_name)
+
+    return _stream_response(query, AssayMeasurement, schemas.AssayMeasurement)
+
+
+def _float_list(values) -> List[Optional[float]]:
+    """JSON has no NaN, so missing timepoints and values are sent as null"""
+    values = values.tolist() if hasattr(values, 'tolist') else values
+    return [None if value != value else value for value in values]
+
+
+def _series_json(series: Series) -> dict:
+    return {
+        'parameter_name': series.parameter_name,
+        'unit': series.unit,
+        'count': len(series.values),
+        'timepoint_hours': _float_list(series.timepoint_hours),
+        'values': _float_list(series.values),
+    }
+
+
+@api_bp.route('/animals/<int:animal_id>/series')
+@conditional(series_version)
+def animal_series(animal_id):
+    """Every longitudinal series of an animal, keyed by parameter name"""
+    series = get_animal_series(animal_id)
+    return jsonify({'animal_id': animal_id,
+                    'series': {name: _series_json(one) for name, one in series.items()}})
+
+
+@api_bp.route('/animals/<int:animal_id>/series/<path:parameter_name>')
+@conditional(series_version)
+def animal_parameter_series(animal_id, parameter_name):
+    """
+    One longitudinal series of an animal
+
+    ?format=binary returns the stored blob: `count` timepoint_hours followed
+    by `count` values, little-endian float64 (NaN where missing), with the
+    count, dtype and unit in X-Series-* headers.
+    """
+    row = MeasurementSeries.query.filter_by(animal_id=animal_id,
+                                            parameter_name=parameter_name).first()
+    if row is None:
+        return jsonify({'error': f'Animal {animal_id} has no "{parameter_name}" measurements'}), 404
+
+    fmt = request.args.get('format', 'json')
+    if fmt == 'binary':
+        response = Response(row.data, mimetype='application/octet-stream')
+        response.headers['X-Series-Count'] = str(row.count)
+        response.headers['X-Series-Dtype'] = row.dtype
+        if row.unit is not None:
+            response.headers['X-Series-Unit'] = row.unit
+        return response
+    if fmt != 'json':
+        return jsonify({'error': f'Unsupported format "{fmt}", expected json or binary'}), 400
+    timepoint_hours, values = decode_series(row.data, row.count)
+    series = Series(animal_id, row.parameter_name, row.unit, timepoint_hours, values)
+    return jsonify(dict(_series_json(series), animal_id=animal_id))
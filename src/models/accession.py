@@ -0,0 +1,171 @@
+"""
+InvivoDB Accession Number Allocator
+
+This module hands out accession number sequences from a per-(species_code,
+year) counter row. A reservation is a single atomic UPDATE of that row, so
+concurrent workers can never be given the same sequence and allocation does
+not scan the animals table. Blocks of sequences can be reserved at once for
+bulk imports.
+
+Reservations run in the caller's session: the counter row stays locked until
+the caller commits, and a rollback returns the reserved sequences. Code that
+stores accession numbers it did not allocate (imports with explicit numbers,
+migrations) calls note_used_sequences so the counter moves past them.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from models.database import (
+    db, Animal, AccessionCounter, generate_accession_number, parse_accession_number
+)
+
+MAX_SEQUENCE = 999999  # Sequences are 6 digits
+
+
+def _existing_max_sequence(session, species_code: str, year: int) -> int:
+    """Highest sequence already used by animals (read only to seed a counter)"""
+    last_accession = session.execute(
+        select(Animal.accession_number)
+        .where(Animal.accession_number.like(f"{species_code}{year}%"))
+        .order_by(Animal.accession_number.desc())
+        .limit(1)
+    ).scalar()
+    if not last_accession:
+        return 0
+    try:
+        return parse_accession_number(last_accession)['sequence']
+    except ValueError:
+        return 0
+
+
+def _exhausted(species_code: str, year: int) -> ValueError:
+    """Error raised when a block would run past MAX_SEQUENCE"""
+    return ValueError(f"Accession sequences for {species_code}{year} exhausted")
+
+
+def _increment(session, species_code: str, year: int, count: int):
+    """
+    Atomically bump the counter; returns the new last_sequence, or None if
+    there is no counter yet
+
+    The limit is part of the UPDATE, so a block that would pass
+    MAX_SEQUENCE leaves the counter as it was.
+    """
+    key = (AccessionCounter.species_code == species_code, AccessionCounter.year == year)
+    result = session.execute(
+        update(AccessionCounter)
+        .where(*key, AccessionCounter.last_sequence + count <= MAX_SEQUENCE)
+        .values(last_sequence=AccessionCounter.last_sequence + count)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        if session.execute(select(AccessionCounter.year).where(*key)).first() is not None:
+            raise _exhausted(species_code, year)
+        return None
+    # The UPDATE holds the row (or, on SQLite, the database) write lock until
+    # commit
+    return session.execute(select(AccessionCounter.last_sequence).where(*key)).scalar_one()
+
+
+def reserve_sequences(species_code: str, year: int, count: int = 1, session=None) -> range:
+    """
+    Reserve a block of consecutive accession sequences
+
+    Args:
+        species_code: 2-3 letter species code (MM, RN, MAC, CAN)
+        year: 4-digit year
+        count: Number of sequences to reserve
+        session: Session to allocate in (defaults to db.session)
+
+    Returns:
+        range: The reserved sequence numbers
+
+    Raises:
+        ValueError: If count is not positive or the block would exceed 999999;
+                    the counter is left unchanged
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1")
+    session = session or db.session
+
+    last_sequence = _increment(session, species_code, year, count)
+    if last_sequence is None:
+        # First allocation for this species and year: seed from existing animals
+        seed = _existing_max_sequence(session, species_code, year)
+        if seed + count > MAX_SEQUENCE:
+            raise _exhausted(species_code, year)
+        try:
+            with session.begin_nested():
+                session.add(AccessionCounter(species_code=species_code, year=year,
+                                             last_sequence=seed + count))
+            last_sequence = seed + count
+        except IntegrityError:
+            # Another worker seeded the counter first
+            last_sequence = _increment(session, species_code, year, count)
+    return range(last_sequence - count + 1, last_sequence + 1)
+
+
+def allocate_accession_numbers(species_code: str, year: int, count: int, session=None) -> List[str]:
+    """Reserve count sequences and return their formatted accession numbers"""
+    return [generate_accession_number(species_code, year, sequence)
+            for sequence in reserve_sequences(species_code, year, count, session=session)]
+
+
+def allocate_accession_number(species_code: str, year: int, session=None) -> str:
+    """Reserve the next sequence and return its formatted accession number"""
+    return allocate_accession_numbers(species_code, year, 1, session=session)[0]
+
+
+def _raise_counter(session, where, sequence: int):
+    """Move a counter up to sequence; counters already past it are left alone"""
+    session.execute(update(AccessionCounter)
+                    .where(*where, AccessionCounter.last_sequence < sequence)
+                    .values(last_sequence=sequence)
+                    .execution_options(synchronize_session=False))
+
+
+def note_used_sequences(accession_numbers: Iterable[str],
+                        session=None) -> Dict[Tuple[str, int], int]:
+    """
+    Raise the counters past accession numbers stored without being allocated
+
+    Runs in the caller's transaction, before or after the numbers are
+    written: a counter seeded here starts past both the stored animals and
+    the given numbers. Call it before reserving sequences for the same
+    batch. Numbers that do not parse are ignored.
+
+    Args:
+        accession_numbers: Accession numbers stored (or about to be) without
+                           allocation
+        session: Session the numbers were written in (defaults to db.session)
+
+    Returns:
+        dict: Highest sequence noted per (species_code, year)
+    """
+    session = session or db.session
+    highest: Dict[Tuple[str, int], int] = {}
+    for accession_number in accession_numbers:
+        try:
+            parsed = parse_accession_number(accession_number)
+        except (TypeError, ValueError):
+            continue
+        key = (parsed['species_code'], parsed['year'])
+        highest[key] = max(highest.get(key, 0), parsed['sequence'])
+
+    for (species_code, year), sequence in highest.items():
+        where = (AccessionCounter.species_code == species_code, AccessionCounter.year == year)
+        _raise_counter(session, where, sequence)
+        if session.execute(select(AccessionCounter.year).where(*where)).first() is not None:
+            continue
+        seed = max(_existing_max_sequence(session, species_code, year), sequence)
+        try:
+            with session.begin_nested():
+                session.add(AccessionCounter(species_code=species_code, year=year,
+                                             last_sequence=seed))
+        except IntegrityError:
+            # Another worker seeded the counter first
+            _raise_counter(session, where, seed)
+    return highest
@@ -0,0 +1,292 @@
+"""
+InvivoDB Batch Accession Codec
+
+Array versions of generate_checksum, validate_accession_number,
+parse_accession_number and generate_accession_number from models.database,
+for migrations, imports and audits that handle accession numbers by the
+hundred thousand. Every function returns exactly what the scalar function
+returns element by element (invalid numbers get a False mask entry instead
+of a ValueError from parse).
+
+With NumPy installed the strings are decoded into a fixed-width code point
+matrix and checked column-wise; validating a million numbers takes a
+fraction of a second. Without NumPy the same checks run per string against
+precomputed per-character tables, and the functions return lists instead of
+arrays. Strings containing non-ASCII characters are rare and are always
+handed to the scalar functions, whose str.isalpha()/isdigit() checks are
+Unicode-aware.
+"""
+
+import re
+import string
+from typing import Dict, Optional, Sequence
+
+from models.database import (
+    generate_accession_number, generate_checksum, validate_accession_number
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without NumPy
+    np = None
+
+# Longest valid accession number: 3-letter species code + year(4) +
+# sequence(6) + checksum(2)
+MAX_LENGTH = 15
+_HEX_DIGITS = '0123456789ABCDEF'
+
+# Checksum value of each ASCII character, modulo 256: digits count their
+# value, anything else ord(char) - ord('A') + 10. The checksum is a sum modulo
+# 256, so reducing each term first changes nothing and lets bytes.translate()
+# do the lookup.
+_CHECKSUM_TABLE = bytes(((code - 48) if 48 <= code <= 57 else (code - 55)) % 256
+                        for code in range(256))
+
+_ACCESSION_FORMAT = re.compile(r'(?:[A-Za-z]{2}|[A-Za-z]{3})[0-9]{10}[0-9A-F]{2}')
+
+
+def _checksum_ascii(base_number: str) -> str:
+    total = sum(base_number.encode('ascii').translate(_CHECKSUM_TABLE)) % 256
+    return _HEX_DIGITS[total >> 4] + _HEX_DIGITS[total & 15]
+
+
+def _validate_one(accession_number: Optional[str]) -> bool:
+    if not accession_number or not accession_number.isascii():
+        return validate_accession_number(accession_number)
+    return (_ACCESSION_FORMAT.fullmatch(accession_number) is not None
+            and _checksum_ascii(accession_number[:-2]) == accession_number[-2:])
+
+
+def _code_points(values: Sequence[Optional[str]]):
+    """
+    (N, MAX_LENGTH) uint8 character matrix, lengths capped at MAX_LENGTH, and
+    the rows left to the scalar functions
+    """
+    items = ['' if value is None else value for value in values]
+    lengths = np.fromiter(map(len, items), dtype=np.int64, count=len(items))
+    try:
+        codes = (np.array(items, dtype=f'S{MAX_LENGTH}').view(np.uint8)
+                 .reshape(len(items), MAX_LENGTH))
+        fallback = lengths > MAX_LENGTH
+    except UnicodeEncodeError:
+        wide = (np.array(items, dtype=f'U{MAX_LENGTH}').view(np.uint32)
+                .reshape(len(items), MAX_LENGTH))
+        non_ascii = wide > 127
+        codes = np.where(non_ascii, 0, wide).astype(np.uint8)
+        fallback = non_ascii.any(axis=1) | (lengths > MAX_LENGTH)
+    return items, codes, np.minimum(lengths, MAX_LENGTH), fallback
+
+
+if np is not None:
+    _CHECKSUM_VALUES = np.frombuffer(_CHECKSUM_TABLE, dtype=np.uint8)
+    # 1 for ASCII letters, 2 for ASCII digits
+    _CHARACTER_CLASS = np.zeros(256, dtype=np.uint8)
+    _CHARACTER_CLASS[np.frombuffer(string.ascii_letters.encode('ascii'), dtype=np.uint8)] = 1
+    _CHARACTER_CLASS[np.frombuffer(b'0123456789', dtype=np.uint8)] = 2
+    _HEX_CODES = np.frombuffer(_HEX_DIGITS.encode('ascii'), dtype=np.uint8)
+
+
+def _checksum_values(codes, base_lengths):
+    """Checksum totals of the first base_lengths[i] characters of each row"""
+    included = np.arange(codes.shape[1]) < base_lengths[:, None]
+    return (_CHECKSUM_VALUES[codes] * included).sum(axis=1, dtype=np.int64) % 256
+
+
+def _hex_codes(totals):
+    """(N, 2) character codes of the upper-case hex form of checksum totals"""
+    return np.stack([_HEX_CODES[totals >> 4], _HEX_CODES[totals & 15]], axis=1)
+
+
+def _as_strings(pairs):
+    """(N, 2) character code matrix to an array of 2-character strings"""
+    return np.ascontiguousarray(pairs, dtype=np.uint32).view('U2').ravel()
+
+
+def checksums(base_numbers: Sequence[str]):
+    """
+    generate_checksum() for many base numbers
+
+    Args:
+        base_numbers: Accession numbers without their checksum
+
+    Returns:
+        Array (list without NumPy) of 2-character checksums
+    """
+    if np is None:
+        return [_checksum_ascii(base) if base.isascii() else generate_checksum(base)
+                for base in base_numbers]
+
+    items, codes, lengths, fallback = _code_points(base_numbers)
+    result = _as_strings(_hex_codes(_checksum_values(codes, lengths)))
+    for index in np.flatnonzero(fallback):
+        result[index] = generate_checksum(items[index])
+    return result
+
+
+def _validate_codes(codes, lengths):
+    """
+    Validity of ASCII rows, each row's species code length, and each row's
+    last two characters
+    """
+    character_class = _CHARACTER_CLASS[codes]
+    letters = character_class == 1
+    digits = character_class == 2
+    # A 3-letter species code shifts year and sequence one column right and
+    # makes the number 15 long
+    three_letters = letters[:, 0] & letters[:, 1] & letters[:, 2]
+    code_length = 2 + three_letters.astype(np.int64)
+    shape_ok = (letters[:, 0] & letters[:, 1] & (lengths == code_length + 12)
+                & digits[:, 3:12].all(axis=1)
+                & np.where(three_letters, digits[:, 12], digits[:, 2]))
+
+    values = _CHECKSUM_VALUES[codes]
+    totals = (values[:, :12].sum(axis=1, dtype=np.int64) + values[:, 12] * three_letters) % 256
+    rows = np.arange(len(codes))
+    tail = np.stack([codes[rows, np.maximum(lengths - 2, 0)],
+                     codes[rows, np.maximum(lengths - 1, 0)]], axis=1)
+    return shape_ok & (tail == _hex_codes(totals)).all(axis=1), code_length, tail
+
+
+def validate_many(accession_numbers: Sequence[Optional[str]]):
+    """
+    validate_accession_number() for many accession numbers
+
+    Args:
+        accession_numbers: Accession numbers (None counts as invalid)
+
+    Returns:
+        Boolean array (list without NumPy), True where the number is valid
+    """
+    if np is None:
+        return [_validate_one(accession_number) for accession_number in accession_numbers]
+
+    items, codes, lengths, fallback = _code_points(accession_numbers)
+    valid, _, _ = _validate_codes(codes, lengths)
+    for index in np.flatnonzero(fallback):
+        valid[index] = validate_accession_number(items[index])
+    return valid
+
+
+def _digits_value(codes, start, width: int):
+    """Integer value of width digit columns beginning at per-row column start"""
+    columns = np.minimum(start[:, None] + np.arange(width), codes.shape[1] - 1)
+    digits = np.take_along_axis(codes, columns, axis=1).astype(np.int64) - 48
+    return digits @ (10 ** np.arange(width - 1, -1, -1, dtype=np.int64))
+
+
+def parse_many(accession_numbers: Sequence[Optional[str]]) -> Dict[str, object]:
+    """
+    parse_accession_number() for many accession numbers
+
+    Invalid numbers do not raise; they are False in 'valid' and have an empty
+    species code and checksum and year and sequence 0.
+
+    Args:
+        accession_numbers: Accession numbers to parse
+
+    Returns:
+        dict: Arrays (lists without NumPy) 'valid', 'species_code', 'year',
+              'sequence' and 'checksum', aligned with the input
+    """
+    if np is None:
+        parsed = {'valid': [], 'species_code': [], 'year': [], 'sequence': [], 'checksum': []}
+        for accession_number in accession_numbers:
+            valid = _validate_one(accession_number)
+            code_length = 3 if valid and accession_number[:3].isalpha() else 2
+            parsed['valid'].append(valid)
+            parsed['species_code'].append(accession_number[:code_length] if valid else '')
+            year = int(accession_number[code_length:code_length + 4]) if valid else 0
+            sequence = int(accession_number[code_length + 4:code_length + 10]) if valid else 0
+            parsed['year'].append(year)
+            parsed['sequence'].append(sequence)
+            parsed['checksum'].append(accession_number[code_length + 10:] if valid else '')
+        return parsed
+
+    items, codes, lengths, fallback = _code_points(accession_numbers)
+    valid, code_length, tail = _validate_codes(codes, lengths)
+    year = _digits_value(codes, code_length, 4)
+    sequence = _digits_value(codes, code_length + 4, 6)
+    checksum = _as_strings(tail)
+    species = codes[:, :3].astype(np.uint32)
+    species[code_length == 2, 2] = 0
+    species_code = species.view('U3').ravel()
+    for index in np.flatnonzero(fallback):
+        valid[index] = validate_accession_number(items[index])
+        if valid[index]:
+            # Unicode letters and digits pass the scalar checks; int() reads
+            # the digits
+            accession_number = items[index]
+            length = 3 if accession_number[:3].isalpha() else 2
+            species_code[index] = accession_number[:length]
+            year[index] = int(accession_number[length:length + 4])
+            sequence[index] = int(accession_number[length + 4:length + 10])
+            checksum[index] = accession_number[length + 10:]
+
+    return {
+        'valid': valid,
+        'species_code': np.where(valid, species_code, ''),
+        'year': np.where(valid, year, 0),
+        'sequence': np.where(valid, sequence, 0),
+        'checksum': np.where(valid, checksum, ''),
+    }
+
+
+def generate_many(species_codes, years, sequences):
+    """
+    generate_accession_number() for many (species code, year, sequence) triples
+
+    Each argument may be a sequence or a single value shared by every number,
+    e.g. generate_many('MM', 2025, range(1, 1001)).
+
+    Returns:
+        Array (list without NumPy) of accession numbers
+    """
+    if np is None:
+        def as_list(value):
+            return [value] if isinstance(value, (str, int)) else list(value)
+
+        columns = [as_list(species_codes), as_list(years), as_list(sequences)]
+        count = max(len(column) for column in columns)
+        columns = [column * count if len(column) == 1 else column for column in columns]
+        return [generate_accession_number(code, year, sequence)
+                for code, year, sequence in zip(*columns)]
+
+    species = np.asarray(species_codes, dtype=object)
+    # Lengths come from the str objects: NumPy's fixed-width strings drop
+    # trailing NULs
+    code_length = np.asarray(np.frompyfunc(len, 1, 1)(species), dtype=np.int64)
+    species, code_length, years, sequences = (array.ravel() for array in np.broadcast_arrays(
+        species, code_length, np.asarray(years, dtype=np.int64),
+        np.asarray(sequences, dtype=np.int64)))
+    count = len(species)
+
+    # Regular rows (ASCII 2-3 character code, 4-digit year, sequence that fits
+    # 6 digits) are assembled as a character matrix; anything else goes
+    # through the scalar function
+    species_matrix = np.zeros((count, 3), dtype=np.uint32)
+    if count:
+        wide = species.astype('U3').view(np.uint32).reshape(count, -1)
+        species_matrix[:, :wide.shape[1]] = wide
+    regular = (((code_length == 2) | (code_length == 3)) & (species_matrix <= 127).all(axis=1)
+               & ((species_matrix > 0) | (np.arange(3) >= code_length[:, None])).all(axis=1)
+               & (years >= 1000) & (years <= 9999) & (sequences >= 0) & (sequences <= 999999))
+    code_length = np.where(regular, code_length, 2)
+
+    matrix = np.zeros((count, MAX_LENGTH), dtype=np.uint8)
+    matrix[:, :3] = np.where(regular[:, None], species_matrix, 0)
+    body = np.concatenate([years[:, None] // 10 ** np.arange(3, -1, -1) % 10,
+                           sequences[:, None] // 10 ** np.arange(5, -1, -1) % 10], axis=1) + 48
+    np.put_along_axis(matrix, code_length[:, None] + np.arange(10), body.astype(np.uint8), axis=1)
+    base_length = code_length + 10
+    np.put_along_axis(matrix, base_length[:, None] + np.arange(2),
+                      _hex_codes(_checksum_values(matrix, base_length)), axis=1)
+    result = matrix.view(f'S{MAX_LENGTH}').ravel().astype(f'U{MAX_LENGTH}')
+
+    irregular = np.flatnonzero(~regular)
+    if len(irregular):
+        result = result.astype(object)
+        for index in irregular:
+            result[index] = generate_accession_number(str(species[index]), int(years[index]),
+                                                      int(sequences[index]))
+        result = result.astype(str)
+    return result
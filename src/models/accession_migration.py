@@ -0,0 +1,189 @@
+"""
+InvivoDB Accession Number Migration
+
+Converts animals still carrying an old-style accession number
+(MM-001-2024: species code, sequence, year) to the current format
+(MM2024000001 + checksum). Only (id, accession_number) pairs are read, a
+batch at a time in id order. Each batch is checked for conflicts with one
+IN query plus a set of the numbers this run has already assigned, written
+with a single executemany UPDATE ... WHERE id, and committed together with a
+checkpoint row and the accession counters raised past the highest converted
+sequence per species and year, so later allocations never reuse a number.
+A run that stops partway keeps the batches it committed and the next run
+resumes after the checkpoint.
+
+A dry run does the same reading, conversion and conflict detection without
+writing anything, and reports throughput.
+"""
+
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, select, update
+
+from models.accession import note_used_sequences
+from models.accession_codec import generate_many, validate_many
+from models.cache import mark_tables_written
+from models.database import db, Animal, MigrationCheckpoint
+
+CHECKPOINT_NAME = 'accession_numbers'
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED = 100  # Conflicts and unconvertible numbers listed in the result
+
+
+def parse_old_accession_number(old_number: Optional[str]) -> Optional[Tuple[str, int, int]]:
+    """
+    Split an old-style accession number
+
+    Returns:
+        tuple: (species_code, year, sequence), or None if not in the old format
+    """
+    if not old_number or '-' not in old_number:
+        return None
+    parts = old_number.split('-')
+    if len(parts) != 3:
+        return None
+    try:
+        return parts[0], int(parts[2]), int(parts[1])
+    except ValueError:
+        return None
+
+
+def _checkpoint(session) -> int:
+    return session.execute(select(MigrationCheckpoint.last_id)
+                           .where(MigrationCheckpoint.name == CHECKPOINT_NAME)).scalar() or 0
+
+
+def _save_checkpoint(session, last_id: int):
+    updated = session.execute(update(MigrationCheckpoint)
+                              .where(MigrationCheckpoint.name == CHECKPOINT_NAME)
+                              .values(last_id=last_id, updated_at=datetime.utcnow()))
+    if not updated.rowcount:
+        session.add(MigrationCheckpoint(name=CHECKPOINT_NAME, last_id=last_id))
+
+
+def _existing(session, numbers: List[str]) -> set:
+    """Which of numbers are already used by some animal (one query)"""
+    if not numbers:
+        return set()
+    return set(session.execute(select(Animal.accession_number)
+                               .where(Animal.accession_number.in_(numbers))).scalars())
+
+
+def _count(result: Dict, outcome: str, examples: str, example: tuple):
+    result[outcome] += 1
+    if len(result[examples]) < MAX_REPORTED:
+        result[examples].append(example)
+
+
+def _finish(result: Dict, start: float):
+    result['seconds'] = time.perf_counter() - start
+    result['rows_per_second'] = result['scanned'] / result['seconds'] if result['seconds'] else 0.0
+
+
+def migrate_accession_numbers(session=None, batch_size: int = DEFAULT_BATCH_SIZE,
+                              dry_run: bool = False, restart: bool = False,
+                              progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Convert old-style accession numbers in bounded, resumable batches
+
+    Args:
+        session: Session to use (defaults to db.session)
+        batch_size: Animals read, converted and committed per batch
+        dry_run: Convert and check for conflicts without writing anything
+        restart: Ignore a checkpoint left by an interrupted run
+        progress: Called with the running totals after every batch
+
+    Returns:
+        dict: Totals (scanned, already_valid, migrated, conflicts,
+              unconvertible, batches), resumed_from, seconds, rows_per_second,
+              and up to MAX_REPORTED (id, old, new) conflict and (id, old)
+              unconvertible examples
+    """
+    session = session or db.session
+    MigrationCheckpoint.__table__.create(session.connection(), checkfirst=True)
+    resumed_from = 0 if restart else _checkpoint(session)
+    session.commit()
+
+    result = {
+        'dry_run': dry_run, 'resumed_from': resumed_from, 'scanned': 0, 'already_valid': 0,
+        'migrated': 0, 'conflicts': 0, 'unconvertible': 0, 'batches': 0, 'seconds': 0.0,
+        'rows_per_second': 0.0, 'conflict_examples': [], 'unconvertible_examples': [],
+    }
+    assigned = set()  # Numbers given out by this run, so two old numbers never get the same new one
+    last_id = resumed_from
+    start = time.perf_counter()
+    statement = (update(Animal.__table__)
+                 .where(Animal.__table__.c.id == bindparam('animal_id'))
+                 .values(accession_number=bindparam('new_number'),
+                         updated_at=bindparam('updated_at')))
+
+    while True:
+        rows = session.execute(select(Animal.id, Animal.accession_number)
+                               .where(Animal.id > last_id)
+                               .order_by(Animal.id).limit(batch_size)).all()
+        if not rows:
+            break
+        ids = [row[0] for row in rows]
+        numbers = [row[1] for row in rows]
+        last_id = ids[-1]
+
+        # Valid numbers are left alone; the rest are converted in one vectorized
+        # call
+        candidates = []
+        for animal_id, old_number, valid in zip(ids, numbers, validate_many(numbers)):
+            if valid:
+                result['already_valid'] += 1
+                continue
+            parsed = parse_old_accession_number(old_number)
+            if parsed is None:
+                _count(result, 'unconvertible', 'unconvertible_examples', (animal_id, old_number))
+            else:
+                candidates.append((animal_id, old_number) + parsed)
+        new_numbers = []
+        if candidates:
+            generated = generate_many(*zip(*[candidate[2:] for candidate in candidates]))
+            new_numbers = [str(number) for number in generated]
+        # One query finds new numbers some animal already has; `assigned`
+        # covers the ones this run gave out
+        taken = _existing(session, new_numbers)
+
+        changes = []
+        for (animal_id, old_number, *_), new_number, valid in zip(candidates, new_numbers,
+                                                                  validate_many(new_numbers)):
+            if not valid:
+                _count(result, 'unconvertible', 'unconvertible_examples', (animal_id, old_number))
+            elif new_number in taken or new_number in assigned:
+                _count(result, 'conflicts', 'conflict_examples',
+                       (animal_id, old_number, new_number))
+            else:
+                assigned.add(new_number)
+                changes.append({'animal_id': animal_id, 'new_number': new_number})
+
+        if dry_run:
+            session.rollback()
+        else:
+            if changes:
+                now = datetime.utcnow()
+                session.execute(statement, [dict(change, updated_at=now) for change in changes])
+                note_used_sequences([change['new_number'] for change in changes], session=session)
+                mark_tables_written(session, Animal)
+            _save_checkpoint(session, last_id)
+            session.commit()
+
+        result['scanned'] += len(rows)
+        result['migrated'] += len(changes)
+        result['batches'] += 1
+        _finish(result, start)
+        if progress:
+            progress(result)
+
+    if not dry_run:
+        # A finished run leaves no checkpoint, so the next one checks every
+        # animal
+        session.execute(delete(MigrationCheckpoint)
+                        .where(MigrationCheckpoint.name == CHECKPOINT_NAME))
+        session.commit()
+    _finish(result, start)
+    return result
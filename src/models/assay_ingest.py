@@ -0,0 +1,146 @@
+"""
+InvivoDB Bulk Assay Ingestion
+
+This module writes one or many AssayCreate payloads (an assay plus its
+nested measurements) in a single transaction. Payloads are validated in
+one pass, foreign keys are checked with one query per referenced table,
+is_normal and the canonical value/unit are derived for every measurement
+at once, and assays, their animal links and measurements are written with
+executemany inserts. The series store is refreshed in the same transaction.
+"""
+
+from typing import Dict, List, Sequence, Union
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+from models.database import (
+    db, Animal, Experiment, AssayType, Assay, AssayMeasurement, animal_assay_association
+)
+from models.schemas import AssayCreate
+from models.cache import mark_tables_written
+from models.series import refresh_series
+from models.units import add_canonical_values
+
+
+class AssayIngestError(ValueError):
+    """Raised when a payload fails validation; nothing is written"""
+
+    def __init__(self, errors: List[dict]):
+        super().__init__(f"{len(errors)} invalid assay payload(s)")
+        self.errors = errors
+
+
+def compute_is_normal(values: Sequence, range_mins: Sequence, range_maxs: Sequence) -> List:
+    """
+    Flag values against their reference ranges
+
+    Returns:
+        list: True/False where value and both bounds are present, else None
+    """
+    return [low <= value <= high if None not in (value, low, high) else None
+            for value, low, high in zip(values, range_mins, range_maxs)]
+
+
+def _validate(payloads: Sequence[dict]) -> List[AssayCreate]:
+    assays, errors = [], []
+    for index, payload in enumerate(payloads):
+        try:
+            assays.append(AssayCreate.model_validate(payload))
+        except ValidationError as e:
+            errors.extend({'index': index, 'field': '.'.join(str(p) for p in err['loc']),
+                           'error': err['msg']} for err in e.errors())
+    if errors:
+        raise AssayIngestError(errors)
+    return assays
+
+
+def _check_references(session, assays: List[AssayCreate]) -> Dict[int, int]:
+    """Verify referenced rows exist; returns experiment_id -> animal_id"""
+    experiment_ids = {assay.experiment_id for assay in assays}
+    type_ids = {assay.assay_type_id for assay in assays}
+    animal_ids = {animal_id for assay in assays for animal_id in assay.animal_ids}
+
+    experiment_animals = dict(session.execute(
+        select(Experiment.id, Experiment.animal_id).where(Experiment.id.in_(experiment_ids))).all())
+    known_types = set(session.scalars(select(AssayType.id).where(AssayType.id.in_(type_ids))))
+    known_animals = set()
+    if animal_ids:
+        known_animals = set(session.scalars(select(Animal.id).where(Animal.id.in_(animal_ids))))
+
+    errors = []
+    for index, assay in enumerate(assays):
+        if assay.experiment_id not in experiment_animals:
+            errors.append({'index': index, 'field': 'experiment_id',
+                           'error': 'Experiment not found'})
+        if assay.assay_type_id not in known_types:
+            errors.append({'index': index, 'field': 'assay_type_id',
+                           'error': 'Assay type not found'})
+        for animal_id in set(assay.animal_ids) - known_animals:
+            errors.append({'index': index, 'field': 'animal_ids',
+                           'error': f'Animal {animal_id} not found'})
+    if errors:
+        raise AssayIngestError(errors)
+    return experiment_animals
+
+
+def ingest_assays(payloads: Union[dict, Sequence[dict]], session=None) -> dict:
+    """
+    Validate and store assays with their measurements in one transaction
+
+    Args:
+        payloads: One AssayCreate-shaped dict or a list of them
+        session: Session to use (defaults to db.session)
+
+    Returns:
+        dict: assay_ids (in payload order) and assay/measurement/link counts
+
+    Raises:
+        AssayIngestError: If any payload is invalid (nothing is written)
+    """
+    session = session or db.session
+    if isinstance(payloads, dict):
+        payloads = [payloads]
+    assays = _validate(payloads)
+    if not assays:
+        return {'assay_ids': [], 'assays': 0, 'measurements': 0, 'animal_links': 0}
+    experiment_animals = _check_references(session, assays)
+
+    assay_rows = [assay.model_dump(exclude={'measurements', 'animal_ids'}) for assay in assays]
+    assay_ids = list(session.scalars(
+        insert(Assay).returning(Assay.id, sort_by_parameter_order=True), assay_rows))
+
+    link_rows = []
+    measurement_rows = []
+    for assay_id, assay in zip(assay_ids, assays):
+        animal_ids = assay.animal_ids or [experiment_animals[assay.experiment_id]]
+        link_rows.extend({'animal_id': animal_id, 'assay_id': assay_id}
+                         for animal_id in dict.fromkeys(animal_ids))
+        for measurement in assay.measurements:
+            row = measurement.model_dump()
+            row['assay_id'] = assay_id
+            measurement_rows.append(row)
+
+    flags = compute_is_normal([row['value'] for row in measurement_rows],
+                              [row['reference_range_min'] for row in measurement_rows],
+                              [row['reference_range_max'] for row in measurement_rows])
+    for row, flag in zip(measurement_rows, flags):
+        if row['is_normal'] is None:
+            row['is_normal'] = flag
+    add_canonical_values(measurement_rows)
+
+    if link_rows:
+        session.execute(insert(animal_assay_association), link_rows)
+    if measurement_rows:
+        session.execute(insert(AssayMeasurement), measurement_rows)
+        refresh_series(session.connection(), recheck=False)
+
+    mark_tables_written(session, Assay, AssayMeasurement, animal_assay_association)
+    session.commit()
+
+    return {
+        'assay_ids': assay_ids,
+        'assays': len(assay_ids),
+        'measurements': len(measurement_rows),
+        'animal_links': len(link_rows)
+    }
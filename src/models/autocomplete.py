@@ -0,0 +1,238 @@
+"""
+InvivoDB Autocomplete Index
+
+This module answers the assay type and parameter lookups behind the entry
+forms from process memory instead of the database. A snapshot holds every
+assay type (sorted by name) and, per assay type, the distinct
+(parameter_name, unit) pairs measured with it, each with a sorted list of
+lowercase search keys: names and categories for assay types, parameter
+names and units for parameters. Prefix queries bisect the key list;
+substring queries scan it. Either takes microseconds at the sizes these
+tables reach.
+
+Snapshots live in the statistics cache, so a commit that writes
+assay_types, assays or assay_measurements drops the current one and the
+next lookup rebuilds it; the cache TTL bounds staleness for writes made by
+other processes. Rebuilds reload the assay types and fold in only the
+parameters of measurements added since the previous snapshot, re-reading
+the WATERMARK_WINDOW ids below its watermark (as models.series does) so
+rows committed out of id order are not missed; a full rebuild, which also
+forgets parameters whose measurements were deleted, runs every
+FULL_REBUILD_SECONDS.
+
+Each snapshot carries a content digest, from which the routes derive
+ETags for repeat lookups.
+"""
+
+import hashlib
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.cache import statistics_cache
+from models.database import db, AssayType, Assay, AssayMeasurement
+from models.series import WATERMARK_WINDOW
+
+CACHE_KEY = 'autocomplete_index'
+DEPENDS_ON = (AssayType, Assay, AssayMeasurement)
+FULL_REBUILD_SECONDS = 3600
+ASSAY_TYPE_LIMIT = 20
+
+# Sorts after every character, so (prefix + _KEY_END,) bounds the keys
+# starting with prefix
+_KEY_END = '\U0010ffff'
+
+# (lowercase key, position of the entry it belongs to)
+Keys = List[Tuple[str, int]]
+
+
+def _search_keys(entries: Sequence[dict], fields: Sequence[str]) -> Keys:
+    keys = {(entry[field].lower(), position)
+            for position, entry in enumerate(entries) for field in fields if entry[field]}
+    return sorted(keys)
+
+
+def _lookup(keys: Keys, search: str, prefix: bool) -> List[int]:
+    """Positions of the entries whose key starts with (or contains) search"""
+    needle = search.lower()
+    if prefix:
+        start = bisect_left(keys, (needle,))
+        end = bisect_left(keys, (needle + _KEY_END,), lo=start)
+        positions = {position for _, position in keys[start:end]}
+    else:
+        positions = {position for key, position in keys if needle in key}
+    return sorted(positions)
+
+
+class AutocompleteSnapshot:
+    """An immutable copy of the autocomplete data with its search keys"""
+
+    def __init__(self, assay_types: List[dict], parameters: Dict[int, List[dict]], watermark: int,
+                 full_build_at: float):
+        self.assay_types = assay_types
+        self.parameters = parameters
+        self.watermark = watermark  # Newest measurement id folded into parameters
+        # time.monotonic() of the full build parameters started from
+        self.full_build_at = full_build_at
+        self._type_keys = _search_keys(assay_types, ('name', 'category'))
+        self._parameter_keys = {assay_type_id: _search_keys(entries, ('parameter_name', 'unit'))
+                                for assay_type_id, entries in parameters.items()}
+        digest = hashlib.sha1(repr((assay_types, sorted(parameters.items()))).encode('utf-8'))
+        self.version = digest.hexdigest()[:16]
+
+    def find_assay_types(self, search: str = '', category: str = '', prefix: bool = False,
+                         limit: Optional[int] = ASSAY_TYPE_LIMIT) -> List[dict]:
+        """
+        Assay types whose name or category matches search, ordered by name
+
+        Args:
+            search: Case-insensitive text to match (empty matches everything)
+            category: Only assay types of exactly this category
+            prefix: Match the start of the name or category instead of any part
+            limit: Maximum number of results (None for all)
+        """
+        if search:
+            positions = _lookup(self._type_keys, search, prefix)
+            entries = [self.assay_types[position] for position in positions]
+        else:
+            entries = self.assay_types
+        if category:
+            entries = [entry for entry in entries if entry['category'] == category]
+        return entries[:limit] if limit is not None else list(entries)
+
+    def find_parameters(self, assay_type_id: int, search: str = '', prefix: bool = False,
+                        limit: Optional[int] = None) -> List[dict]:
+        """
+        (parameter_name, unit) pairs measured with an assay type, ordered by
+        name then unit
+
+        Args:
+            assay_type_id: Assay type ID
+            search: Case-insensitive text to match against names and units
+            prefix: Match the start of the name or unit instead of any part
+            limit: Maximum number of results (None for all)
+        """
+        entries = self.parameters.get(assay_type_id, [])
+        if search:
+            keys = self._parameter_keys[assay_type_id] if entries else []
+            entries = [entries[position] for position in _lookup(keys, search, prefix)]
+        return entries[:limit] if limit is not None else list(entries)
+
+    def etag(self, *parts) -> str:
+        """ETag of a lookup: changes with the snapshot content and the query"""
+        key = '\x1f'.join([self.version] + ['' if part is None else str(part) for part in parts])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]
+
+
+def _load_assay_types(session) -> List[dict]:
+    rows = session.execute(select(AssayType.id, AssayType.name, AssayType.category,
+                                  AssayType.description, AssayType.units)
+                           .order_by(AssayType.name))
+    return [{'id': row.id, 'name': row.name, 'category': row.category,
+             'description': row.description, 'units': row.units} for row in rows]
+
+
+def _load_parameters(session, after_id: int, latest: int) -> Dict[int, set]:
+    rows = session.execute(
+        select(Assay.assay_type_id, AssayMeasurement.parameter_name, AssayMeasurement.unit)
+        .distinct()
+        .join(Assay, Assay.id == AssayMeasurement.assay_id)
+        .where(AssayMeasurement.id > after_id, AssayMeasurement.id <= latest)
+    )
+    pairs: Dict[int, set] = {}
+    for assay_type_id, parameter_name, unit in rows:
+        pairs.setdefault(assay_type_id, set()).add((parameter_name, unit))
+    return pairs
+
+
+def _sort_key(pair: Tuple[str, Optional[str]]):
+    return pair[0] or '', pair[1] is not None, pair[1] or ''
+
+
+class AutocompleteIndex:
+    """
+    Keeps the current autocomplete snapshot, rebuilding it after writes
+
+    Usage:
+        snapshot = autocomplete_index.snapshot()
+        snapshot.find_assay_types('blo')
+    """
+
+    def __init__(self, full_rebuild_seconds: float = FULL_REBUILD_SECONDS):
+        self.full_rebuild_seconds = full_rebuild_seconds
+        self.builds = 0
+        self.full_builds = 0
+        self._last: Optional[AutocompleteSnapshot] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, session=None) -> AutocompleteSnapshot:
+        """Current snapshot, rebuilt if a write or the TTL dropped it"""
+        snapshot = statistics_cache.get(CACHE_KEY)
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            snapshot = statistics_cache.get(CACHE_KEY)
+            if snapshot is None:
+                snapshot = self._build(session or db.session)
+                statistics_cache.set(CACHE_KEY, snapshot, depends_on=DEPENDS_ON)
+            return snapshot
+
+    def warm(self, session=None) -> bool:
+        """
+        Build the snapshot ahead of the first lookup
+
+        Returns:
+            bool: False if the database could not be read (e.g. no schema yet);
+                  the first lookup then builds it
+        """
+        try:
+            self.snapshot(session)
+        except SQLAlchemyError:
+            (session or db.session).rollback()
+            return False
+        return True
+
+    def clear(self):
+        """Forget the snapshot, so the next lookup rebuilds it from scratch"""
+        with self._lock:
+            self._last = None
+            statistics_cache.invalidate(CACHE_KEY)
+
+    def _build(self, session) -> AutocompleteSnapshot:
+        now = time.monotonic()
+        latest = session.execute(select(func.max(AssayMeasurement.id))).scalar() or 0
+        previous = self._last
+        # A lower newest id means measurements were deleted (or the database
+        # replaced)
+        if (previous is None or latest < previous.watermark
+                or now - previous.full_build_at >= self.full_rebuild_seconds):
+            pairs: Dict[int, set] = {}
+            after_id, full_build_at = 0, now
+            self.full_builds += 1
+        else:
+            pairs = {assay_type_id: {(entry['parameter_name'], entry['unit']) for entry in entries}
+                     for assay_type_id, entries in previous.parameters.items()}
+            # Pairs are a set, so re-reading the window below the watermark only
+            # adds late commits
+            after_id = max(previous.watermark - WATERMARK_WINDOW, 0)
+            full_build_at = previous.full_build_at
+
+        for assay_type_id, added in _load_parameters(session, after_id, latest).items():
+            pairs.setdefault(assay_type_id, set()).update(added)
+        parameters = {assay_type_id: [{'parameter_name': name, 'unit': unit}
+                                      for name, unit in sorted(found, key=_sort_key)]
+                      for assay_type_id, found in pairs.items()}
+
+        snapshot = AutocompleteSnapshot(_load_assay_types(session), parameters, latest,
+                                        full_build_at)
+        self._last = snapshot
+        self.builds += 1
+        return snapshot
+
+
+# Process-wide index behind /api/assay_types and /api/assay_parameters
+autocomplete_index = AutocompleteIndex()
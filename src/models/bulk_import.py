@@ -0,0 +1,235 @@
+"""
+InvivoDB Bulk Animal Import
+
+This module streams animal records from CSV or JSONL, validates each one
+against the AnimalCreate schema and inserts them in large batches, one
+transaction per batch. Species are resolved from a map loaded once per
+import, and accession numbers are reserved a block at a time.
+
+Bad rows are reported with their line number and skipped; they never abort
+the rest of the file.
+"""
+
+import csv
+import json
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from models.database import db, Species, Animal, generate_accession_number, get_species_code
+from models.schemas import AnimalCreate
+from models.accession import note_used_sequences, reserve_sequences
+from models.cache import mark_tables_written
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+SUPPORTED_FORMATS = ('csv', 'jsonl')
+
+
+class ImportReport:
+    """Outcome of a bulk import"""
+
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.started_at = time.perf_counter()
+        self.duration_seconds = 0.0
+
+    def add_error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self) -> dict:
+        return {
+            'processed': self.processed,
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'duration_seconds': round(self.duration_seconds, 3)
+        }
+
+
+class SpeciesResolver:
+    """Resolves species ids, codes and names from a map loaded once"""
+
+    def __init__(self, species: Iterable[Species]):
+        self.by_id: Dict[int, str] = {}
+        self.by_key: Dict[str, int] = {}
+        for item in species:
+            code = get_species_code(item.scientific_name)
+            self.by_id[item.id] = code
+            self.by_key.setdefault(item.scientific_name.lower(), item.id)
+            self.by_key.setdefault(item.common_name.lower(), item.id)
+            if code != 'UNK':
+                self.by_key.setdefault(code.lower(), item.id)
+
+    @classmethod
+    def load(cls, session=None) -> 'SpeciesResolver':
+        session = session or db.session
+        return cls(session.query(Species).all())
+
+    def resolve(self, record: dict) -> Optional[int]:
+        """Species id for a record's species_id/species_code/species"""
+        species_id = record.get('species_id')
+        if species_id not in (None, ''):
+            try:
+                species_id = int(species_id)
+            except (TypeError, ValueError):
+                return None
+            return species_id if species_id in self.by_id else None
+        for field in ('species_code', 'species'):
+            value = record.get(field)
+            if value:
+                return self.by_key.get(str(value).strip().lower())
+        return None
+
+
+def _clean(record: dict) -> dict:
+    """Strip strings and turn empty CSV cells into None"""
+    cleaned = {}
+    for key, value in record.items():
+        if key is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip() or None
+        cleaned[key.strip()] = value
+    return cleaned
+
+
+def iter_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Stream records from a CSV or JSONL text stream
+
+    Yields:
+        tuple: (line number, record or None, parse error or None)
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, _clean(record), None
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, None, f"Invalid JSON: {e.msg}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "Expected a JSON object"
+                continue
+            yield line_number, _clean(record), None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt} (expected one of {SUPPORTED_FORMATS})")
+
+
+def _validation_message(error: ValidationError) -> str:
+    return '; '.join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+def _insert_batch(session, rows: List[Tuple[int, dict]], report: ImportReport, year: int,
+                  species_codes: Dict[int, str]):
+    """Assign accession numbers to a batch, insert it and commit"""
+    needed: Dict[str, List[dict]] = {}
+    # Raise the counters past the explicit numbers first, so generated ones
+    # never collide with them
+    note_used_sequences([values['accession_number'] for _, values in rows
+                         if values.get('accession_number')], session=session)
+    for _, values in rows:
+        if not values.get('accession_number'):
+            needed.setdefault(species_codes[values['species_id']], []).append(values)
+    for species_code, pending in needed.items():
+        sequences = reserve_sequences(species_code, year, len(pending), session=session)
+        for values, sequence in zip(pending, sequences):
+            values['accession_number'] = generate_accession_number(species_code, year, sequence)
+
+    now = datetime.utcnow()
+    for _, values in rows:
+        values['created_at'] = values['updated_at'] = now
+
+    try:
+        with session.begin_nested():
+            session.execute(insert(Animal), [values for _, values in rows])
+        report.inserted += len(rows)
+    except IntegrityError:
+        # Isolate the offending rows (e.g. duplicate accession numbers)
+        for line_number, values in rows:
+            try:
+                with session.begin_nested():
+                    session.execute(insert(Animal), [values])
+                report.inserted += 1
+            except IntegrityError as e:
+                report.add_error(line_number, f"Database rejected row: {e.orig}")
+
+    mark_tables_written(session, Animal)
+    session.commit()
+
+
+def import_animals(stream: TextIO, fmt: str = 'csv', batch_size: int = DEFAULT_BATCH_SIZE,
+                   year: Optional[int] = None, session=None) -> ImportReport:
+    """
+    Import animals from a CSV or JSONL stream
+
+    Each record carries the AnimalCreate fields, with the species given as
+    species_id, species_code (e.g. "MM") or species (scientific/common name).
+    Records without an accession_number get one from a reserved block.
+
+    Args:
+        stream: Text stream to read from (consumed incrementally)
+        fmt: 'csv' or 'jsonl'
+        batch_size: Rows inserted per transaction
+        year: Year used for generated accession numbers (defaults to the
+              current year)
+        session: Session to use (defaults to db.session)
+
+    Returns:
+        ImportReport: Counts, per-row errors and elapsed time
+    """
+    session = session or db.session
+    year = year or datetime.now().year
+    resolver = SpeciesResolver.load(session)
+    report = ImportReport()
+    batch: List[Tuple[int, dict]] = []
+
+    for line_number, record, parse_error in iter_records(stream, fmt):
+        report.processed += 1
+        if parse_error:
+            report.add_error(line_number, parse_error)
+            continue
+
+        species_id = resolver.resolve(record)
+        if species_id is None:
+            report.add_error(line_number, "Unknown species")
+            continue
+        record['species_id'] = species_id
+
+        try:
+            animal = AnimalCreate(**record)
+        except ValidationError as e:
+            report.add_error(line_number, _validation_message(e))
+            continue
+
+        values = animal.model_dump()
+        if values['sex'] is not None:
+            values['sex'] = values['sex'].value
+        batch.append((line_number, values))
+
+        if len(batch) >= batch_size:
+            _insert_batch(session, batch, report, year, resolver.by_id)
+            batch = []
+
+    if batch:
+        _insert_batch(session, batch, report, year, resolver.by_id)
+
+    report.duration_seconds = time.perf_counter() - report.started_at
+    return report
@@ -0,0 +1,184 @@
+"""
+InvivoDB Statistics Cache
+
+This module keeps computed summaries (dashboard statistics and the like)
+in process memory. Each entry declares the tables it was computed from,
+and a session commit that wrote to any of those tables drops exactly the
+affected entries. A TTL bounds staleness for writes the session never
+sees, such as commits made by another worker process.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from sqlalchemy import event
+
+# Session.info key holding the tables written since the last commit
+PENDING_TABLES_KEY = 'invivodb_written_tables'
+
+DEFAULT_TTL_SECONDS = 300
+
+
+def _table_names(targets: Iterable) -> Set[str]:
+    """Normalize models, tables and table names to a set of table names"""
+    names = set()
+    for target in targets:
+        if isinstance(target, str):
+            names.add(target)
+        elif hasattr(target, '__tablename__'):
+            names.add(target.__tablename__)
+        else:
+            names.add(target.name)
+    return names
+
+
+def mark_tables_written(session, *targets):
+    """
+    Record tables written outside the ORM unit of work
+
+    Core INSERT/UPDATE statements do not pass through flush, so code that
+    issues them should call this to have dependent entries dropped on commit.
+
+    Args:
+        session: The session the statements were executed on
+        targets: Models, Table objects or table names that were written
+    """
+    session.info.setdefault(PENDING_TABLES_KEY, set()).update(_table_names(targets))
+
+
+class _CacheEntry:
+    __slots__ = ('value', 'tables', 'expires_at')
+
+    def __init__(self, value: Any, tables: Set[str], expires_at: float):
+        self.value = value
+        self.tables = tables
+        self.expires_at = expires_at
+
+
+class StatisticsCache:
+    """
+    In-memory cache of computed statistics with write-based invalidation
+
+    Usage:
+        value = cache.get_or_compute('summary', compute_summary,
+                                     depends_on=(Animal, Experiment))
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.value
+
+    def set(self, key: str, value: Any, depends_on: Iterable = (), ttl: Optional[float] = None):
+        """
+        Store a value together with the tables it was computed from
+
+        Args:
+            key: Cache key
+            value: Computed value (should not hold ORM instances)
+            depends_on: Models, Table objects or table names the value reads
+            ttl: Lifetime in seconds (defaults to the cache TTL)
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = _CacheEntry(value, _table_names(depends_on), expires_at)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any],
+                       depends_on: Iterable = (), ttl: Optional[float] = None) -> Any:
+        """Return the cached value for key, computing and storing it if needed"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value, depends_on=depends_on, ttl=ttl)
+        return value
+
+    def invalidate(self, key: str):
+        """Drop a single entry"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_tables(self, tables: Iterable) -> int:
+        """
+        Drop every entry computed from any of the given tables
+
+        Returns:
+            int: Number of entries dropped
+        """
+        names = _table_names(tables)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.tables & names]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current entry count"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def watch(self, session):
+        """
+        Invalidate entries when commits on session write to their tables
+
+        Tables touched by each flush are collected in session.info and
+        applied on after_commit; a rollback discards them.
+
+        Args:
+            session: A Session, sessionmaker or scoped_session (e.g. db.session)
+        """
+        if event.contains(session, 'after_commit', self._apply_pending):
+            return
+        event.listen(session, 'after_flush', self._collect_flushed_tables)
+        event.listen(session, 'after_commit', self._apply_pending)
+        event.listen(session, 'after_rollback', self._discard_pending)
+
+    @staticmethod
+    def _collect_flushed_tables(session, flush_context):
+        written = session.info.setdefault(PENDING_TABLES_KEY, set())
+        for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+            table = getattr(instance, '__tablename__', None)
+            if table:
+                written.add(table)
+
+    def _apply_pending(self, session):
+        written = session.info.pop(PENDING_TABLES_KEY, None)
+        if written:
+            self.invalidate_tables(written)
+
+    @staticmethod
+    def _discard_pending(session):
+        session.info.pop(PENDING_TABLES_KEY, None)
+
+
+# Process-wide cache shared by the dashboard and the JSON API
+statistics_cache = StatisticsCache()
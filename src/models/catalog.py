@@ -0,0 +1,81 @@
+"""
+InvivoDB Therapy Catalog
+
+This module builds the therapies page: every category, ordered by name,
+with its therapies (optionally only those whose name matches a search
+term). Categories and therapies come from one outer-joined query, ordered
+so a single pass buckets the therapies under their category.
+
+The rendered catalog rarely changes, so the HTML is kept per search term
+in the statistics cache and dropped by any commit that writes therapies
+or therapy_categories. At most MAX_CACHED_TERMS terms are kept; the
+oldest is evicted first.
+"""
+
+import threading
+from itertools import groupby
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import and_, select
+
+from models.cache import statistics_cache
+from models.database import db, TherapyCategory, Therapy
+
+CACHE_KEY = 'therapy_catalog'
+DEPENDS_ON = (Therapy, TherapyCategory)
+MAX_CACHED_TERMS = 64
+
+_lock = threading.Lock()
+
+
+def group_therapies(search: str = '', session=None) -> List[Tuple[TherapyCategory, List[Therapy]]]:
+    """
+    Every category with its therapies, ordered by name
+
+    Args:
+        search: Only list therapies whose name contains this (case-insensitive);
+                categories without a match are still listed, empty
+        session: Session to read with (defaults to db.session)
+
+    Returns:
+        list: (category, therapies) pairs
+    """
+    session = session or db.session
+    joined = Therapy.category_id == TherapyCategory.id
+    if search:
+        joined = and_(joined, Therapy.name.ilike(f'%{search}%'))
+    rows = session.execute(
+        select(TherapyCategory, Therapy)
+        .outerjoin(Therapy, joined)
+        .order_by(TherapyCategory.name, TherapyCategory.id, Therapy.name, Therapy.id)
+    )
+    # Therapy.category resolves from the identity map, so rendering issues no
+    # further queries
+    return [(category, [therapy for _, therapy in pairs if therapy is not None])
+            for category, pairs in groupby(rows, key=lambda row: row[0])]
+
+
+def rendered_catalog(search: str, render: Callable[[List], str]) -> str:
+    """
+    Return the catalog HTML for a search term, rendering it on a miss
+
+    Args:
+        search: Search term ('' for the full catalog)
+        render: Called with group_therapies(search), returns the HTML
+    """
+    with _lock:
+        fragments: Dict[str, str] = statistics_cache.get(CACHE_KEY)
+        html = fragments.get(search) if fragments is not None else None
+    if html is not None:
+        return html
+
+    html = render(group_therapies(search))
+    with _lock:
+        fragments = statistics_cache.get(CACHE_KEY)
+        if fragments is None:
+            fragments = {}
+            statistics_cache.set(CACHE_KEY, fragments, depends_on=DEPENDS_ON)
+        if search not in fragments and len(fragments) >= MAX_CACHED_TERMS:
+            del fragments[next(iter(fragments))]
+        fragments[search] = html
+    return html
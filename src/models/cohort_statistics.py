@@ -0,0 +1,249 @@
+"""
+InvivoDB Cohort Statistics
+
+This module summarizes an experiment's measurements per therapy arm,
+timepoint and parameter: n, mean, SD, SEM, median, quartiles/IQR and a 95%
+confidence interval of the mean. One query fetches the values as columns;
+the groups are then summarized together with vectorized NumPy reductions
+(a plain Python loop over the groups when NumPy is not installed).
+
+The cohort is every animal linked to the experiment's assays (the
+experiment's own animal for assays with no linked animals). An animal's
+arm is the control group or therapy combination of this experiment when it
+is the animal's experiment, otherwise of the animal's own experiments.
+
+Results are kept in the statistics cache with the experiment's version
+and recomputed when a read finds that version changed, so writes to other
+experiments leave them in place.
+"""
+
+import math
+import statistics
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+
+from models.cache import statistics_cache
+from models.conditional import experiment_version
+from models.database import (
+    db, Experiment, Therapy, Assay, AssayMeasurement, animal_assay_association,
+    experiment_therapy_association
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+CONFIDENCE_LEVEL = 0.95
+UNTREATED_ARM = 'Untreated'
+STATS_CACHE_KEY = 'experiment_stats:{}'
+
+# Two-sided 95% Student t critical values for 1..30 degrees of freedom
+_T_CRITICAL_95 = (
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+)
+_Z_95 = 1.959964
+
+
+def t_critical(df: int) -> float:
+    """Two-sided 95% t critical value (Cornish-Fisher expansion above 30 df)"""
+    if df < 1:
+        return math.nan
+    if df <= len(_T_CRITICAL_95):
+        return _T_CRITICAL_95[df - 1]
+    z = _Z_95
+    return z + (z ** 3 + z) / (4 * df) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+
+
+def _arm_labels(session, experiment: Experiment, animal_ids: List[int]) -> Dict[int, str]:
+    """Map each cohort animal to its arm label (one query)"""
+    link = experiment_therapy_association.c
+    rows = session.execute(
+        select(Experiment.id, Experiment.animal_id, Experiment.control_group, Therapy.name)
+        .outerjoin(experiment_therapy_association, link.experiment_id == Experiment.id)
+        .outerjoin(Therapy, Therapy.id == link.therapy_id)
+        .where(Experiment.animal_id.in_(animal_ids))
+    ).all()
+    experiments: Dict[int, dict] = {}
+    for experiment_id, animal_id, control_group, therapy in rows:
+        entry = experiments.setdefault(experiment_id, {'animal_id': animal_id,
+                                                       'control': control_group,
+                                                       'therapies': set()})
+        if therapy:
+            entry['therapies'].add(therapy)
+
+    def label(entry):
+        if entry['control']:
+            return f"{entry['control']} (control)"
+        return ' + '.join(sorted(entry['therapies'])) or UNTREATED_ARM
+
+    labels: Dict[int, set] = {}
+    for experiment_id, entry in experiments.items():
+        labels.setdefault(entry['animal_id'], set()).add(label(entry))
+    arms = {animal_id: ' | '.join(sorted(found)) for animal_id, found in labels.items()}
+    if experiment.id in experiments:
+        arms[experiment.animal_id] = label(experiments[experiment.id])
+    return {animal_id: arms.get(animal_id, UNTREATED_ARM) for animal_id in animal_ids}
+
+
+def _cohort_columns(session, experiment_id: int):
+    """
+    (animal_id, timepoint_hours, parameter_name, value, unit) of every
+    non-null value, in canonical units
+    """
+    link = animal_assay_association.c
+    return session.execute(
+        select(func.coalesce(link.animal_id, Experiment.animal_id), Assay.timepoint_hours,
+               AssayMeasurement.parameter_name,
+               func.coalesce(AssayMeasurement.canonical_value, AssayMeasurement.value),
+               func.coalesce(AssayMeasurement.canonical_unit, AssayMeasurement.unit))
+        .select_from(AssayMeasurement)
+        .join(Assay, Assay.id == AssayMeasurement.assay_id)
+        .join(Experiment, Experiment.id == Assay.experiment_id)
+        .outerjoin(animal_assay_association, link.assay_id == Assay.id)
+        .where(Assay.experiment_id == experiment_id, AssayMeasurement.value.isnot(None))
+    ).all()
+
+
+def _summaries_numpy(group_index, values) -> Dict[str, list]:
+    """Per-group n, mean, sd, median, q1, q3 with whole-array reductions"""
+    order = np.lexsort((values, group_index))  # By group, then value within the group
+    groups = group_index[order]
+    ordered = values[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    n = np.diff(np.r_[starts, len(ordered)])
+
+    mean = np.add.reduceat(ordered, starts) / n
+    squares = np.add.reduceat((ordered - np.repeat(mean, n)) ** 2, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sd = np.where(n > 1, np.sqrt(squares / (n - 1)), np.nan)
+
+    def quantile(q):
+        # Linear interpolation between order statistics (numpy's default method)
+        position = starts + q * (n - 1)
+        low = np.floor(position).astype(np.intp)
+        high = np.ceil(position).astype(np.intp)
+        return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+    return {'group': groups[starts].tolist(), 'n': n.tolist(), 'mean': mean.tolist(),
+            'sd': sd.tolist(), 'median': quantile(0.5).tolist(), 'q1': quantile(0.25).tolist(),
+            'q3': quantile(0.75).tolist()}
+
+
+def _summaries_python(group_index: List[int], values: List[float]) -> Dict[str, list]:
+    grouped: Dict[int, list] = {}
+    for group, value in zip(group_index, values):
+        grouped.setdefault(group, []).append(value)
+
+    def quantile(ordered, q):
+        position = q * (len(ordered) - 1)
+        low, high = math.floor(position), math.ceil(position)
+        return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+    result = {key: [] for key in ('group', 'n', 'mean', 'sd', 'median', 'q1', 'q3')}
+    for group in sorted(grouped):
+        ordered = sorted(grouped[group])
+        result['group'].append(group)
+        result['n'].append(len(ordered))
+        result['mean'].append(statistics.fmean(ordered))
+        result['sd'].append(statistics.stdev(ordered) if len(ordered) > 1 else math.nan)
+        for key, q in (('median', 0.5), ('q1', 0.25), ('q3', 0.75)):
+            result[key].append(quantile(ordered, q))
+    return result
+
+
+def _number(value: float, digits: int = 6) -> Optional[float]:
+    return None if value is None or math.isnan(value) else round(value, digits)
+
+
+def compute_experiment_stats(experiment_id: int, session=None) -> Optional[dict]:
+    """
+    Summarize an experiment's measurements per arm, timepoint and parameter
+
+    Args:
+        experiment_id: Experiment to summarize
+        session: Session to read with (defaults to db.session)
+
+    Returns:
+        dict: experiment_id, confidence_level, arms (label and animal ids)
+              and groups (arm, timepoint_hours, parameter, unit, n, mean,
+              sd, sem, median, q1, q3, iqr, ci_low, ci_high; null where n is
+              too small), or None if the experiment does not exist
+    """
+    session = session or db.session
+    experiment = session.get(Experiment, experiment_id)
+    if experiment is None:
+        return None
+    rows = _cohort_columns(session, experiment_id)
+    animal_ids = sorted({row[0] for row in rows} | {experiment.animal_id})
+    arm_of = _arm_labels(session, experiment, animal_ids)
+
+    # Factorize (arm, timepoint, parameter) into one group number per value
+    keys: Dict[tuple, int] = {}
+    units: Dict[int, set] = {}
+    group_index, values = [], []
+    for animal_id, hours, parameter, value, unit in rows:
+        key = (arm_of[animal_id], hours, parameter)
+        group = keys.setdefault(key, len(keys))
+        units.setdefault(group, set()).add(unit)
+        group_index.append(group)
+        values.append(value)
+    if np is not None and values:
+        summaries = _summaries_numpy(np.array(group_index, dtype=np.intp),
+                                     np.array(values, dtype=np.float64))
+    else:
+        summaries = _summaries_python(group_index, values)
+
+    key_of = {group: key for key, group in keys.items()}
+    groups = []
+    for position, group in enumerate(summaries['group']):
+        arm, hours, parameter = key_of[group]
+        n = summaries['n'][position]
+        mean, sd = summaries['mean'][position], summaries['sd'][position]
+        sem = sd / math.sqrt(n) if not math.isnan(sd) else math.nan
+        margin = t_critical(n - 1) * sem
+        q1, q3 = summaries['q1'][position], summaries['q3'][position]
+        group_units = units[group]
+        groups.append({
+            'arm': arm, 'timepoint_hours': hours, 'parameter': parameter,
+            'unit': next(iter(group_units)) if len(group_units) == 1 else None,
+            'n': n, 'mean': _number(mean), 'sd': _number(sd), 'sem': _number(sem),
+            'median': _number(summaries['median'][position]), 'q1': _number(q1), 'q3': _number(q3),
+            'iqr': _number(q3 - q1), 'ci_low': _number(mean - margin),
+            'ci_high': _number(mean + margin),
+        })
+    groups.sort(key=lambda g: (g['parameter'], g['timepoint_hours'] is None,
+                               g['timepoint_hours'] or 0.0, g['arm']))
+
+    arms: Dict[str, list] = {}
+    for animal_id in animal_ids:
+        arms.setdefault(arm_of[animal_id], []).append(animal_id)
+    return {
+        'experiment_id': experiment_id,
+        'confidence_level': CONFIDENCE_LEVEL,
+        'arms': [{'label': label, 'animal_ids': ids} for label, ids in sorted(arms.items())],
+        'groups': groups,
+    }
+
+
+def get_experiment_stats(experiment_id: int) -> Optional[dict]:
+    """
+    Return an experiment's cohort statistics, served from the statistics cache
+
+    The cached copy is stored with experiment_version (measurements
+    included) and only served while that version is unchanged.
+    """
+    version = experiment_version(experiment_id, measurements=True)
+    if version is None:
+        return None
+    key = STATS_CACHE_KEY.format(experiment_id)
+    cached = statistics_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    stats = compute_experiment_stats(experiment_id)
+    if stats is not None:
+        statistics_cache.set(key, (version, stats))
+    return stats
@@ -0,0 +1,228 @@
+"""
+InvivoDB Conditional Requests
+
+This module lets detail pages and JSON endpoints answer repeat requests
+with 304 Not Modified before loading or rendering anything. A route
+declares a version function returning, from one query, the counts and
+newest updated_at/created_at of the rows its response is built from (the
+entity and its children); the ETag is a digest of those values and the
+request path, and Last-Modified is the newest timestamp among them.
+
+Counts catch deleted children, which leave the newest timestamp unchanged;
+If-None-Match takes precedence over If-Modified-Since, so browsers, which
+send both, see deletions. Bulk jobs that rewrite rows in place without a
+timestamp (reference range re-flagging, unit backfills) call
+touch_validators, whose stamp is part of every version.
+
+Responses are only made conditional for GET/HEAD requests that end in 200,
+and never while flashed messages are waiting to be shown.
+"""
+
+import hashlib
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Optional, Tuple
+
+from flask import Response, current_app, make_response, request, session
+from sqlalchemy import func, literal, select, update
+from werkzeug.http import is_resource_modified
+
+from models.database import (
+    db, Animal, Experiment, ExperimentResult, AssayType, Assay, AssayMeasurement, MeasurementSeries,
+    MigrationCheckpoint, experiment_therapy_association
+)
+
+# Cache-Control per kind of response
+PAGE_CACHE_CONTROL = 'private, no-cache'  # HTML pages: keep, but revalidate every visit
+API_CACHE_CONTROL = 'no-cache'
+SUMMARY_CACHE_CONTROL = 'public, max-age=30'  # Aggregates may be a little stale
+
+# migration_checkpoints row stamped by jobs that rewrite rows in place
+VALIDATORS_STAMP_NAME = 'http_validators'
+
+
+def touch_validators(session=None):
+    """
+    Change every version, so clients revalidate pages built from rewritten rows
+
+    Bulk jobs that UPDATE rows without touching updated_at call this before
+    committing their last batch.
+    """
+    session = session or db.session
+    checkpoints = MigrationCheckpoint.__table__
+    updated = session.execute(update(checkpoints)
+                              .where(checkpoints.c.name == VALIDATORS_STAMP_NAME)
+                              .values(last_id=checkpoints.c.last_id + 1,
+                                      updated_at=datetime.utcnow()))
+    if not updated.rowcount:
+        session.add(MigrationCheckpoint(name=VALIDATORS_STAMP_NAME, last_id=1))
+
+
+def _version(session, exists, *columns) -> Optional[Tuple]:
+    """
+    Run one SELECT of scalar subqueries (plus the validators stamp)
+
+    Returns:
+        tuple: The values, or None when `exists` is NULL (the entity is missing)
+    """
+    stamp = [select(column).where(MigrationCheckpoint.name == VALIDATORS_STAMP_NAME)
+             .scalar_subquery()
+             for column in (MigrationCheckpoint.last_id, MigrationCheckpoint.updated_at)]
+    row = (session or db.session).execute(select(exists, *columns, *stamp)).one()
+    return None if row[0] is None else tuple(row)
+
+
+def _children(model, *where):
+    """Count and newest created_at of the rows of model matching where"""
+    return (select(func.count()).select_from(model).where(*where).scalar_subquery(),
+            select(func.max(model.created_at)).where(*where).scalar_subquery())
+
+
+def _table(model):
+    """Newest id and newest updated_at of a whole table (both from an index)"""
+    columns = [select(func.max(model.id)).scalar_subquery()]
+    if hasattr(model, 'updated_at'):
+        columns.append(select(func.max(model.updated_at)).scalar_subquery())
+    return columns
+
+
+def animal_version(animal_id: int, session=None) -> Optional[Tuple]:
+    """Version of an animal with its experiments"""
+    return _version(
+        session,
+        select(Animal.id).where(Animal.id == animal_id).scalar_subquery(),
+        select(Animal.updated_at).where(Animal.id == animal_id).scalar_subquery(),
+        select(func.count()).select_from(Experiment)
+        .where(Experiment.animal_id == animal_id).scalar_subquery(),
+        select(func.max(Experiment.updated_at))
+        .where(Experiment.animal_id == animal_id).scalar_subquery(),
+    )
+
+
+def experiment_version(experiment_id: int, measurements: bool = False,
+                       session=None) -> Optional[Tuple]:
+    """
+    Version of an experiment with its animal, therapies, assays and results
+
+    Args:
+        experiment_id: Experiment ID
+        measurements: Include the measurements of its assays (for the
+                      profile page and statistics)
+    """
+    link = experiment_therapy_association.c
+    columns = [
+        select(Experiment.updated_at).where(Experiment.id == experiment_id).scalar_subquery(),
+        select(Animal.updated_at).join(Experiment, Experiment.animal_id == Animal.id)
+        .where(Experiment.id == experiment_id).scalar_subquery(),
+        select(func.count()).select_from(experiment_therapy_association)
+        .where(link.experiment_id == experiment_id).scalar_subquery(),
+        *_children(Assay, Assay.experiment_id == experiment_id),
+        *_children(ExperimentResult, ExperimentResult.experiment_id == experiment_id),
+    ]
+    if measurements:
+        assay_ids = select(Assay.id).where(Assay.experiment_id == experiment_id)
+        columns.extend(_children(AssayMeasurement, AssayMeasurement.assay_id.in_(assay_ids)))
+    return _version(session,
+                    select(Experiment.id).where(Experiment.id == experiment_id).scalar_subquery(),
+                    *columns)
+
+
+def assay_version(assay_id: int, session=None) -> Optional[Tuple]:
+    """Version of an assay with its measurements, type and experiment"""
+    return _version(
+        session,
+        select(Assay.id).where(Assay.id == assay_id).scalar_subquery(),
+        select(Assay.created_at).where(Assay.id == assay_id).scalar_subquery(),
+        select(AssayType.created_at).join(Assay, Assay.assay_type_id == AssayType.id)
+        .where(Assay.id == assay_id).scalar_subquery(),
+        select(Experiment.updated_at).join(Assay, Assay.experiment_id == Experiment.id)
+        .where(Assay.id == assay_id).scalar_subquery(),
+        *_children(AssayMeasurement, AssayMeasurement.assay_id == assay_id),
+    )
+
+
+def tables_version(*models, session=None) -> Tuple:
+    """
+    Version of whole tables, for collection endpoints
+
+    Newest id and updated_at only, so no table is scanned: inserts and
+    timestamped updates change it, while deletes and in-place rewrites
+    must call touch_validators. Link rows are written together with the
+    rows they link, so association tables need not be passed. Filters are
+    covered by the query string in the ETag.
+    """
+    columns = [column for model in models for column in _table(model)]
+    return _version(session, literal(1), *columns)
+
+
+def series_version(animal_id: int, parameter_name: Optional[str] = None,
+                   session=None) -> Optional[Tuple]:
+    """
+    Version of an animal's series
+
+    Returns None for a single parameter the animal has no series of.
+    """
+    where = [MeasurementSeries.animal_id == animal_id]
+    if parameter_name is not None:
+        where.append(MeasurementSeries.parameter_name == parameter_name)
+    return _version(
+        session,
+        select(func.max(MeasurementSeries.updated_at)).where(*where).scalar_subquery()
+        if parameter_name is not None else literal(animal_id),
+        select(func.count()).select_from(MeasurementSeries).where(*where).scalar_subquery(),
+        select(func.max(MeasurementSeries.updated_at)).where(*where).scalar_subquery(),
+        select(func.max(MeasurementSeries.max_measurement_id)).where(*where).scalar_subquery(),
+    )
+
+
+def validators(version: Tuple) -> Tuple[str, Optional[datetime]]:
+    """
+    (ETag, Last-Modified) of a response built from data at version
+
+    The ETag also covers the request path and query string, and the
+    ETAG_SALT setting (set it per release so template changes reach clients).
+    """
+    salt = current_app.config.get('ETAG_SALT', '')
+    key = repr((salt, request.full_path, version))
+    timestamps = [value for value in version if isinstance(value, datetime)]
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:24], max(timestamps, default=None)
+
+
+def conditional(version: Callable[..., Optional[Tuple]], cache_control: str = API_CACHE_CONTROL):
+    """
+    Make a view answer If-None-Match/If-Modified-Since before running
+
+    Args:
+        version: Called with the view's URL arguments; returns the version of
+                 the data the response is built from, or None to skip the check
+                 (e.g. the entity does not exist and the view will 404)
+        cache_control: Cache-Control header of 200 and 304 responses
+
+    Usage:
+        @bp.route('/animals/<int:animal_id>')
+        @conditional(animal_version, PAGE_CACHE_CONTROL)
+        def animal_detail(animal_id): ...
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            current = version(**kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+
+            etag, last_modified = validators(current)
+            if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            else:
+                response = Response(status=304)
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
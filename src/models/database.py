@@ -12,20 +12,22 @@ from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean,
 from sqlalchemy.orm import relationship
 import uuid
 
-db = SQLAlchemy()
+from models.engine import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Association table for many-to-many relationship between experiments and therapies
 experiment_therapy_association = db.Table(
     'experiment_therapy',
-    db.Column('experiment_id', db.Integer, db.ForeignKey('experiments.id')),
-    db.Column('therapy_id', db.Integer, db.ForeignKey('therapies.id'))
+    db.Column('experiment_id', db.Integer, db.ForeignKey('experiments.id'), primary_key=True),
+    db.Column('therapy_id', db.Integer, db.ForeignKey('therapies.id'), primary_key=True, index=True)
 )
 
 # Association table for many-to-many relationship between animals and assays
 animal_assay_association = db.Table(
     'animal_assay',
-    db.Column('animal_id', db.Integer, db.ForeignKey('animals.id')),
-    db.Column('assay_id', db.Integer, db.ForeignKey('assays.id'))
+    db.Column('animal_id', db.Integer, db.ForeignKey('animals.id'), primary_key=True),
+    db.Column('assay_id', db.Integer, db.ForeignKey('assays.id'), primary_key=True, index=True)
 )
 
 class Species(db.Model):
@@ -49,7 +51,7 @@ class Animal(db.Model):
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     accession_number = db.Column(db.String(15), unique=True, nullable=False)  # e.g., "MM202500000136" or "MAC202500000136"
-    species_id = db.Column(db.Integer, db.ForeignKey('species.id'), nullable=False)
+    species_id = db.Column(db.Integer, db.ForeignKey('species.id'), nullable=False, index=True)
     strain = db.Column(db.String(100))  # e.g., "C57BL/6", "Sprague-Dawley"
     age_at_start = db.Column(db.Float)  # Age in weeks
     weight_at_start = db.Column(db.Float)  # Weight in grams
@@ -57,8 +59,9 @@ class Animal(db.Model):
     genetic_background = db.Column(db.Text)  # Additional genetic information
     housing_conditions = db.Column(db.Text)  # Housing and environmental conditions
     ethical_approval = db.Column(db.String(100))  # Ethics committee approval number
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           index=True)
     
     # Relationships
     species = db.relationship("Species", back_populates="animals")
@@ -86,7 +89,8 @@ class Therapy(db.Model):
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(200), nullable=False)
-    category_id = db.Column(db.Integer, db.ForeignKey('therapy_categories.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('therapy_categories.id'), nullable=False,
+                            index=True)
     vector_type = db.Column(db.String(100))  # For gene therapy vectors
     dosage = db.Column(db.String(100))  # Dosage information
     administration_route = db.Column(db.String(100))  # IV, IM, oral, etc.
@@ -106,8 +110,8 @@ class Experiment(db.Model):
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(300), nullable=False)
-    animal_id = db.Column(db.Integer, db.ForeignKey('animals.id'), nullable=False)
-    start_date = db.Column(db.DateTime, nullable=False)
+    animal_id = db.Column(db.Integer, db.ForeignKey('animals.id'), nullable=False, index=True)
+    start_date = db.Column(db.DateTime, nullable=False, index=True)
     end_date = db.Column(db.DateTime)
     duration_days = db.Column(db.Integer)  # Calculated field
     study_design = db.Column(db.String(100))  # "Randomized", "Controlled", etc.
@@ -124,8 +128,9 @@ class Experiment(db.Model):
     notes = db.Column(db.Text)
     publication_doi = db.Column(db.String(100))  # Associated publication
     data_availability = db.Column(db.String(50))  # "Public", "Restricted", "Private"
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           index=True)
     
     # Relationships
     animal = db.relationship("Animal", back_populates="experiments")
@@ -155,8 +160,10 @@ class Assay(db.Model):
     __tablename__ = 'assays'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    experiment_id = db.Column(db.Integer, db.ForeignKey('experiments.id'), nullable=False)
-    assay_type_id = db.Column(db.Integer, db.ForeignKey('assay_types.id'), nullable=False)
+    experiment_id = db.Column(db.Integer, db.ForeignKey('experiments.id'), nullable=False,
+                              index=True)
+    assay_type_id = db.Column(db.Integer, db.ForeignKey('assay_types.id'), nullable=False,
+                              index=True)
     timepoint = db.Column(db.String(50))  # "Baseline", "Day 7", "End of study"
     timepoint_hours = db.Column(db.Float)  # Hours from start of experiment
     protocol_deviation = db.Column(db.Text)  # Any deviations from standard protocol
@@ -177,12 +184,18 @@ class Assay(db.Model):
 class AssayMeasurement(db.Model):
     """Individual measurements from assays"""
     __tablename__ = 'assay_measurements'
+    # Also serves lookups by assay_id alone
+    __table_args__ = (
+        db.Index('ix_assay_measurements_assay_id_parameter_name', 'assay_id', 'parameter_name'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     assay_id = db.Column(db.Integer, db.ForeignKey('assays.id'), nullable=False)
     parameter_name = db.Column(db.String(100), nullable=False)  # e.g., "Glucose", "Weight"
     value = db.Column(db.Float)
     unit = db.Column(db.String(50))
+    canonical_value = db.Column(db.Float)  # value converted to canonical_unit (models.units)
+    canonical_unit = db.Column(db.String(50))
     reference_range_min = db.Column(db.Float)
     reference_range_max = db.Column(db.Float)
     is_normal = db.Column(db.Boolean)
@@ -195,12 +208,65 @@ class AssayMeasurement(db.Model):
     assay = db.relationship("Assay", back_populates="measurements")
 
 
+class MeasurementSeries(db.Model):
+    """
+    Derived longitudinal series of one parameter for one animal
+    
+    Rebuilt from assay_measurements by models.series. data holds the
+    timepoint_hours array followed by the values array, each `count`
+    little-endian elements of `dtype`, ordered by timepoint.
+    """
+    __tablename__ = 'measurement_series'
+    
+    animal_id = db.Column(db.Integer, db.ForeignKey('animals.id'), primary_key=True)
+    parameter_name = db.Column(db.String(100), primary_key=True)
+    unit = db.Column(db.String(50))  # None when the measurements disagree
+    dtype = db.Column(db.String(10), nullable=False, default='<f8')
+    count = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    max_measurement_id = db.Column(db.Integer, nullable=False)  # Newest measurement folded in
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ReferenceRange(db.Model):
+    """
+    Normal range of a parameter for a species, optionally narrowed by strain,
+    sex and age
+    
+    Null strain, sex or age bounds match any animal. When several ranges
+    match a measurement, the most specific one applies (strain, then sex,
+    then age band). Age bands are [age_min_weeks, age_max_weeks).
+    """
+    __tablename__ = 'reference_ranges'
+    __table_args__ = (
+        db.Index('ix_reference_ranges_lookup', 'species_id', 'parameter_name', 'unit'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    species_id = db.Column(db.Integer, db.ForeignKey('species.id'), nullable=False)
+    strain = db.Column(db.String(100))
+    sex = db.Column(db.String(10))
+    parameter_name = db.Column(db.String(100), nullable=False)
+    unit = db.Column(db.String(50))
+    age_min_weeks = db.Column(db.Float)
+    age_max_weeks = db.Column(db.Float)
+    range_min = db.Column(db.Float, nullable=False)
+    range_max = db.Column(db.Float, nullable=False)
+    source = db.Column(db.String(200))  # e.g., lab or reference publication
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    species = db.relationship("Species")
+
+
 class ExperimentResult(db.Model):
     """Overall results and conclusions from experiments"""
     __tablename__ = 'experiment_results'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    experiment_id = db.Column(db.Integer, db.ForeignKey('experiments.id'), nullable=False)
+    experiment_id = db.Column(db.Integer, db.ForeignKey('experiments.id'), nullable=False,
+                              index=True)
     primary_outcome = db.Column(db.Text)
     secondary_outcomes = db.Column(db.Text)
     statistical_significance = db.Column(db.Boolean)
@@ -223,7 +289,8 @@ class DataFile(db.Model):
     __tablename__ = 'data_files'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    experiment_id = db.Column(db.Integer, db.ForeignKey('experiments.id'), nullable=False)
+    experiment_id = db.Column(db.Integer, db.ForeignKey('experiments.id'), nullable=False,
+                              index=True)
     filename = db.Column(db.String(255), nullable=False)
     file_type = db.Column(db.String(50))  # "CSV", "Image", "Video", etc.
     file_size = db.Column(db.Integer)  # Size in bytes
@@ -237,6 +304,28 @@ class DataFile(db.Model):
     # Note: We'll add relationship to experiment when needed
 
 
+class AccessionCounter(db.Model):
+    """Last accession sequence issued per species code and year"""
+    __tablename__ = 'accession_counters'
+    
+    species_code = db.Column(db.String(3), primary_key=True)  # e.g., "MM", "MAC"
+    year = db.Column(db.Integer, primary_key=True)
+    last_sequence = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class MigrationCheckpoint(db.Model):
+    """
+    Progress of a batch job (a migration or an incremental rebuild): the last
+    row id it committed
+    """
+    __tablename__ = 'migration_checkpoints'
+    
+    name = db.Column(db.String(100), primary_key=True)  # e.g., "accession_numbers"
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 def generate_accession_number(species_code: str, year: int, sequence: int) -> str:
     """
     Generate standardized accession numbers for animals
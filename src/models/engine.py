@@ -0,0 +1,190 @@
+"""
+InvivoDB Database Engine Profiles
+
+A profile bundles what a deployment needs from its database engine: the
+default database URI, SQLAlchemy engine (pool) options, and for SQLite the
+PRAGMAs applied to every new connection. create_app() selects one by name.
+
+- development: the prototype's local SQLite file, with foreign keys enforced
+- production: SQLite tuned for several worker processes (WAL, busy timeout,
+  relaxed fsync, memory-mapped reads, larger page cache)
+- postgresql: pooled connections with pre-ping and server-side statement
+  and lock timeouts; the URI comes from INVIVODB_DATABASE_URI
+- testing: a private in-memory database
+
+Requests that only read (GET and HEAD) are served from a separate read
+engine when there is one, so a long listing or export never holds up data
+entry and the other way round. For a SQLite file that engine opens the
+same file read-only (mode=ro), which under WAL reads a consistent snapshot
+alongside the writer; for server databases it is the replica named by
+INVIVODB_READ_DATABASE_URI. Everything else, including the POST handlers of
+the add_* pages, and any flush stays on the primary.
+"""
+
+import copy
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',        # Readers no longer block the writer (and vice versa)
+    'busy_timeout': 15000,        # Wait up to 15 s for a lock instead of "database is locked"
+    'synchronous': 'NORMAL',      # Safe with WAL; fsync at checkpoints, not every commit
+    'mmap_size': 268435456,       # Memory-map up to 256 MB of the file for reads
+    'cache_size': -65536,         # 64 MB page cache per connection (negative = KiB)
+    'foreign_keys': 'ON',
+    'temp_store': 'MEMORY',
+}
+
+ENGINE_PROFILES: Dict[str, dict] = {
+    'development': {
+        'database_uri': 'sqlite:///invivodb.db',
+        'engine_options': {},
+        'sqlite_pragmas': {'foreign_keys': 'ON', 'busy_timeout': 5000},
+    },
+    'production': {
+        'database_uri': 'sqlite:///invivodb.db',
+        'engine_options': {'pool_size': 10, 'max_overflow': 10, 'pool_timeout': 30},
+        'sqlite_pragmas': SQLITE_PRODUCTION_PRAGMAS,
+    },
+    'postgresql': {
+        'database_uri': None,
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 30,
+            'pool_recycle': 1800,
+            'pool_pre_ping': True,
+            'connect_args': {
+                'connect_timeout': 10,
+                'options': '-c statement_timeout=30000 -c lock_timeout=5000',
+            },
+        },
+        'sqlite_pragmas': {},
+    },
+    'testing': {
+        'database_uri': 'sqlite://',
+        'engine_options': {},
+        'sqlite_pragmas': {'foreign_keys': 'ON'},
+    },
+}
+
+DEFAULT_PROFILE = 'development'
+
+# app.extensions key holding the read engine, if the app has one
+READ_ENGINE_KEY = 'invivodb_read_engine'
+
+# Requests served from the read engine
+READ_ONLY_METHODS = ('GET', 'HEAD')
+
+# Set by the connection that writes the file; a read-only connection cannot
+# change it
+_WRITER_ONLY_PRAGMAS = ('journal_mode',)
+
+
+def get_profile(name: str) -> dict:
+    """
+    Return a copy of a named engine profile
+
+    Raises:
+        ValueError: If no profile has that name
+    """
+    if name not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown database profile: {name} "
+                         f"(expected one of {', '.join(ENGINE_PROFILES)})")
+    return copy.deepcopy(ENGINE_PROFILES[name])
+
+
+def pragma_statements(pragmas: Dict[str, object]) -> list:
+    """
+    Render PRAGMA statements, journal_mode first so later settings apply to
+    the WAL database
+    """
+    ordered = sorted(pragmas.items(), key=lambda item: item[0] != 'journal_mode')
+    return [f"PRAGMA {name}={value}" for name, value in ordered]
+
+
+def install_sqlite_pragmas(engine, pragmas: Dict[str, object]):
+    """Apply PRAGMAs to every connection the engine opens (SQLite only)"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    statements = pragma_statements(pragmas)
+
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def read_only_url(url) -> Optional[str]:
+    """
+    Read-only URI for a SQLite database file
+
+    Args:
+        url: The primary database URL (relative paths must already be resolved)
+
+    Returns:
+        str: A sqlite:///file:...?mode=ro&uri=true URL, or None for in-memory
+             SQLite and other backends
+    """
+    url = make_url(url)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    query = dict(url.query)
+    if query.get('mode') == 'memory':
+        return None
+    path = url.database[5:] if query.pop('uri', None) else quote(url.database)
+    query.update(mode='ro', uri='true')
+    return str(URL.create(url.drivername, database=f'file:{path}', query=query))
+
+
+def create_read_engine(primary, replica_uri: Optional[str] = None,
+                       engine_options: Optional[dict] = None,
+                       sqlite_pragmas: Optional[Dict[str, object]] = None):
+    """
+    Create the engine GET and HEAD requests read from
+
+    Args:
+        primary: The primary (read/write) engine
+        replica_uri: Replica database URI; defaults to a read-only view of a
+                     SQLite primary
+        engine_options: create_engine() keyword arguments (pool settings)
+        sqlite_pragmas: PRAGMAs for SQLite connections; journal_mode is left
+                        to the writer
+
+    Returns:
+        Engine: The read engine, or None when reads should stay on the primary
+    """
+    uri = replica_uri or read_only_url(primary.url)
+    if uri is None:
+        return None
+    engine = create_engine(uri, **(engine_options or {}))
+    install_sqlite_pragmas(engine, {name: value for name, value in (sqlite_pragmas or {}).items()
+                                    if name not in _WRITER_ONLY_PRAGMAS})
+    return engine
+
+
+class RoutingSession(Session):
+    """
+    Session that sends the statements of read-only requests to the read engine
+
+    A session with pending changes, or one that is flushing, always uses the
+    primary, so an accidental write from a GET handler fails loudly on
+    SQLite instead of being lost on a replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() \
+                and request.method in READ_ONLY_METHODS and self._is_clean():
+            engine = current_app.extensions.get(READ_ENGINE_KEY)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
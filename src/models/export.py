@@ -0,0 +1,229 @@
+"""
+InvivoDB Columnar Measurement Export
+
+This module streams AssayMeasurement rows joined with their assay, assay
+type, experiment, animal, species and therapies into a typed columnar file
+(Parquet or an Arrow IPC stream) for ML training. Rows are fetched in
+chunks with yield_per and each chunk becomes one record batch, so memory
+use is bounded by the chunk size rather than the table size. Repetitive
+text columns are dictionary-encoded.
+
+Requires the optional pyarrow dependency.
+"""
+
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy import select
+
+from models.database import (
+    db, Species, Animal, Therapy, Experiment, AssayType, Assay, AssayMeasurement,
+    experiment_therapy_association
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without pyarrow
+    pa = None
+    pq = None
+
+DEFAULT_CHUNK_SIZE = 50000
+EXPORT_FORMATS = ('parquet', 'arrow')
+
+# (column name, SQL expression, arrow type name); "category" means a
+# dictionary-encoded string
+EXPORT_COLUMNS = (
+    ('measurement_id', AssayMeasurement.id, 'int64'),
+    ('parameter_name', AssayMeasurement.parameter_name, 'category'),
+    ('value', AssayMeasurement.value, 'float64'),
+    ('unit', AssayMeasurement.unit, 'category'),
+    ('canonical_value', AssayMeasurement.canonical_value, 'float64'),
+    ('canonical_unit', AssayMeasurement.canonical_unit, 'category'),
+    ('reference_range_min', AssayMeasurement.reference_range_min, 'float64'),
+    ('reference_range_max', AssayMeasurement.reference_range_max, 'float64'),
+    ('is_normal', AssayMeasurement.is_normal, 'bool'),
+    ('below_detection_limit', AssayMeasurement.below_detection_limit, 'bool'),
+    ('dilution_factor', AssayMeasurement.dilution_factor, 'float64'),
+    ('assay_id', Assay.id, 'int64'),
+    ('timepoint', Assay.timepoint, 'category'),
+    ('timepoint_hours', Assay.timepoint_hours, 'float64'),
+    ('quality_control_passed', Assay.quality_control_passed, 'bool'),
+    ('assay_type', AssayType.name, 'category'),
+    ('assay_category', AssayType.category, 'category'),
+    ('experiment_id', Experiment.id, 'int64'),
+    ('animal_id', Animal.id, 'int64'),
+    ('accession_number', Animal.accession_number, 'string'),
+    ('species', Species.scientific_name, 'category'),
+    ('strain', Animal.strain, 'category'),
+    ('sex', Animal.sex, 'category'),
+    ('age_at_start', Animal.age_at_start, 'float64'),
+    ('weight_at_start', Animal.weight_at_start, 'float64'),
+)
+THERAPY_COLUMN = 'therapies'
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Columnar export requires pyarrow (pip install pyarrow)")
+
+
+def export_schema():
+    """Return the Arrow schema of exported measurement files"""
+    _require_pyarrow()
+    types = {
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'bool': pa.bool_(),
+        'string': pa.string(),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+    }
+    fields = [pa.field(name, types[kind]) for name, _, kind in EXPORT_COLUMNS]
+    fields.append(pa.field(THERAPY_COLUMN, types['category']))
+    return pa.schema(fields)
+
+
+def _therapy_labels(session) -> Dict[int, str]:
+    """Map experiment id to its therapy names joined with '; ' (one query)"""
+    rows = session.execute(
+        select(experiment_therapy_association.c.experiment_id, Therapy.name)
+        .join(Therapy, Therapy.id == experiment_therapy_association.c.therapy_id)
+        .order_by(experiment_therapy_association.c.experiment_id, Therapy.name)
+    )
+    labels: Dict[int, list] = {}
+    for experiment_id, name in rows:
+        labels.setdefault(experiment_id, []).append(name)
+    return {experiment_id: '; '.join(names) for experiment_id, names in labels.items()}
+
+
+def measurement_export_query(experiment_id: Optional[int] = None,
+                             assay_type_id: Optional[int] = None):
+    """Build the SELECT feeding the export, optionally filtered"""
+    statement = (select(*[expression for _, expression, _ in EXPORT_COLUMNS])
+                 .select_from(AssayMeasurement)
+                 .join(Assay, Assay.id == AssayMeasurement.assay_id)
+                 .join(AssayType, AssayType.id == Assay.assay_type_id)
+                 .join(Experiment, Experiment.id == Assay.experiment_id)
+                 .join(Animal, Animal.id == Experiment.animal_id)
+                 .join(Species, Species.id == Animal.species_id)
+                 .order_by(AssayMeasurement.id))
+    if experiment_id is not None:
+        statement = statement.where(Assay.experiment_id == experiment_id)
+    if assay_type_id is not None:
+        statement = statement.where(Assay.assay_type_id == assay_type_id)
+    return statement
+
+
+def iter_record_batches(experiment_id: Optional[int] = None, assay_type_id: Optional[int] = None,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE, session=None) -> Iterator:
+    """
+    Yield the export as Arrow record batches of at most chunk_size rows
+
+    Rows are streamed with yield_per (a server-side cursor where supported),
+    so only one chunk is ever materialized.
+    """
+    _require_pyarrow()
+    session = session or db.session
+    schema = export_schema()
+    therapies = _therapy_labels(session)
+    experiment_index = [name for name, _, _ in EXPORT_COLUMNS].index('experiment_id')
+
+    result = session.execute(
+        measurement_export_query(experiment_id, assay_type_id)
+        .execution_options(yield_per=chunk_size, stream_results=True)
+    )
+    for rows in result.partitions():
+        columns = list(zip(*rows))
+        arrays = []
+        for (name, _, kind), values in zip(EXPORT_COLUMNS, columns):
+            field_type = schema.field(name).type
+            if kind == 'category':
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=field_type))
+        labels = [therapies.get(experiment) for experiment in columns[experiment_index]]
+        arrays.append(pa.array(labels, type=pa.string()).dictionary_encode())
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _open_writer(sink, fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt} (expected one of {EXPORT_FORMATS})")
+    if fmt == 'parquet':
+        return pq.ParquetWriter(sink, export_schema(), compression='zstd')
+    # The IPC stream format (unlike the file format) allows a new dictionary
+    # per batch
+    return pa.ipc.new_stream(sink, export_schema())
+
+
+def write_measurements(sink, fmt: str = 'parquet', **filters) -> int:
+    """
+    Write the measurement export to a path or writable binary file object
+
+    Args:
+        sink: Output path or file-like object
+        fmt: 'parquet' or 'arrow' (Arrow IPC stream)
+        filters: experiment_id, assay_type_id and chunk_size for
+                 iter_record_batches
+
+    Returns:
+        int: Number of measurements written
+    """
+    _require_pyarrow()
+    written = 0
+    with _open_writer(sink, fmt) as writer:
+        for batch in iter_record_batches(**filters):
+            writer.write_batch(batch)
+            written += batch.num_rows
+    return written
+
+
+class _ChunkSink:
+    """Write-only file object handing written bytes to a streaming response"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_measurements(fmt: str = 'parquet', **filters) -> Iterator[bytes]:
+    """
+    Generate the export file as byte chunks for a streaming HTTP response
+
+    pyarrow and the format are checked up front, so errors surface before the
+    response starts. Each record batch is sent as soon as it is encoded.
+    """
+    _require_pyarrow()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt} (expected one of {EXPORT_FORMATS})")
+
+    def generate():
+        sink = _ChunkSink()
+        writer = _open_writer(sink, fmt)
+        for batch in iter_record_batches(**filters):
+            writer.write_batch(batch)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    return generate()
@@ -0,0 +1,346 @@
+"""
+InvivoDB Feature Matrix
+
+This module builds the wide table ML work starts from: one row per animal
+(or per animal and timepoint), one float64 column per measured parameter,
+plus species, strain, sex, age and weight covariates and a 0/1 column per
+therapy the animal received. Measurements are pivoted from the
+per-animal series blobs of models.series rather than from measurement rows.
+
+Built matrices are cached in process together with the data version they
+were built from (series, animals, experiments and therapy links). While the
+version is unchanged the cached matrix is returned as is; when it changes,
+only animals whose series were rewritten are decoded again before the
+matrix is reassembled.
+
+Requires NumPy. Parquet export also requires pyarrow.
+"""
+
+import csv
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from models.database import (
+    db, Species, Animal, Experiment, Therapy, MeasurementSeries, experiment_therapy_association
+)
+from models.series import decode_series, refresh_series
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without NumPy
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without pyarrow
+    pa = None
+    pq = None
+
+ROW_MODES = ('animal', 'timepoint')
+FEATURE_EXPORT_FORMATS = ('csv', 'npz', 'parquet')
+ANIMALS_PER_BATCH = 500  # Animals whose series are loaded per query
+THERAPY_PREFIX = 'therapy:'
+HOURS_PER_WEEK = 168.0
+COVARIATE_UNITS = {'age_weeks': 'weeks', 'weight_at_start': 'g'}
+
+
+class FeatureMatrix(NamedTuple):
+    """
+    A built feature matrix
+
+    Rows are ordered by animal id, then timepoint (NaN last). Per-animal
+    rows hold the mean of the animal's values of each parameter and a NaN
+    timepoint; per-timepoint rows the mean of the values at that timepoint.
+    Parameters an animal was not measured for are NaN.
+    """
+    animal_ids: 'np.ndarray'         # int64, one per row
+    timepoint_hours: 'np.ndarray'    # float64, one per row
+    values: 'np.ndarray'             # float64 (rows, parameters)
+    parameters: List[str]
+    units: List[Optional[str]]       # Per parameter; None when animals disagree
+    # species, strain, sex (object), age_weeks, weight_at_start (float64)
+    covariates: Dict[str, 'np.ndarray']
+    therapies: List[str]
+    therapy_matrix: 'np.ndarray'     # uint8 (rows, therapies)
+    version: Tuple
+
+    def columns(self) -> List[Dict]:
+        """Describe every column in export order: name, kind, dtype and unit"""
+        columns = [{'name': 'animal_id', 'kind': 'index', 'dtype': 'int64', 'unit': None},
+                   {'name': 'timepoint_hours', 'kind': 'index', 'dtype': 'float64', 'unit': 'h'}]
+        for name, values in self.covariates.items():
+            columns.append({'name': name, 'kind': 'covariate', 'dtype': str(values.dtype),
+                            'unit': COVARIATE_UNITS.get(name)})
+        columns.extend({'name': name, 'kind': 'measurement', 'dtype': 'float64', 'unit': unit}
+                       for name, unit in zip(self.parameters, self.units))
+        columns.extend({'name': THERAPY_PREFIX + name, 'kind': 'therapy', 'dtype': 'uint8',
+                        'unit': None} for name in self.therapies)
+        return columns
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Feature matrices require NumPy (pip install numpy)")
+
+
+def _data_version(session) -> Tuple:
+    """Counts and newest timestamps of the tables the matrix is built from"""
+    link = experiment_therapy_association
+    return tuple(session.execute(select(
+        select(func.count()).select_from(MeasurementSeries).scalar_subquery(),
+        select(func.max(MeasurementSeries.updated_at)).scalar_subquery(),
+        select(func.count(Animal.id)).scalar_subquery(),
+        select(func.max(Animal.updated_at)).scalar_subquery(),
+        select(func.count(Experiment.id)).scalar_subquery(),
+        select(func.max(Experiment.updated_at)).scalar_subquery(),
+        select(func.count()).select_from(link).scalar_subquery(),
+    )).one())
+
+
+class FeatureMatrixBuilder:
+    """
+    Builds feature matrices and keeps the decoded series between builds
+
+    Usage:
+        matrix = feature_matrices.build(by='timepoint')
+        model.fit(matrix.values, ...)
+    """
+
+    def __init__(self):
+        self.builds = 0
+        self.animals_decoded = 0
+        # animal id -> (series count, newest series updated_at)
+        self._stamps: Dict[int, Tuple] = {}
+        # animal id -> parameter -> (hours, values, unit)
+        self._series: Dict[int, Dict[str, Tuple]] = {}
+        self._matrices: Dict[str, FeatureMatrix] = {}
+        self._lock = threading.Lock()
+
+    def build(self, by: str = 'animal', session=None) -> FeatureMatrix:
+        """
+        Return the feature matrix, rebuilding it only if the data changed
+
+        Args:
+            by: 'animal' (one row per animal) or 'timepoint' (one row per
+                animal and timepoint)
+            session: Session to read with (defaults to db.session); the
+                     series store is refreshed in its transaction, which
+                     the caller commits to keep the refreshed series
+        """
+        _require_numpy()
+        if by not in ROW_MODES:
+            raise ValueError(f"Unsupported row mode: {by} (expected one of {ROW_MODES})")
+        session = session or db.session
+        refresh_series(session.connection())
+        version = _data_version(session)
+
+        with self._lock:
+            cached = self._matrices.get(by)
+            if cached is not None and cached.version == version:
+                return cached
+            self._load_changed_series(session)
+            matrix = self._assemble(session, by, version)
+            if any(m.version != version for m in self._matrices.values()):
+                self._matrices.clear()
+            self._matrices[by] = matrix
+            self.builds += 1
+            return matrix
+
+    def clear(self):
+        """Forget every decoded series and built matrix"""
+        with self._lock:
+            self._stamps.clear()
+            self._series.clear()
+            self._matrices.clear()
+
+    def _load_changed_series(self, session):
+        rows = session.execute(select(MeasurementSeries.animal_id, func.count(),
+                                      func.max(MeasurementSeries.updated_at))
+                               .group_by(MeasurementSeries.animal_id))
+        stamps = {animal_id: (count, updated_at) for animal_id, count, updated_at in rows}
+        for animal_id in set(self._stamps) - set(stamps):
+            del self._stamps[animal_id]
+            del self._series[animal_id]
+        changed = sorted(animal_id for animal_id, stamp in stamps.items()
+                         if self._stamps.get(animal_id) != stamp)
+
+        for start in range(0, len(changed), ANIMALS_PER_BATCH):
+            batch = changed[start:start + ANIMALS_PER_BATCH]
+            loaded = {animal_id: {} for animal_id in batch}
+            rows = session.execute(select(MeasurementSeries.animal_id,
+                                          MeasurementSeries.parameter_name,
+                                          MeasurementSeries.unit, MeasurementSeries.count,
+                                          MeasurementSeries.data)
+                                   .where(MeasurementSeries.animal_id.in_(batch)))
+            for animal_id, parameter_name, unit, count, data in rows:
+                hours, values = decode_series(data, count)
+                loaded[animal_id][parameter_name] = (hours, values, unit)
+            for animal_id in batch:
+                self._series[animal_id] = loaded[animal_id]
+                self._stamps[animal_id] = stamps[animal_id]
+        self.animals_decoded += len(changed)
+
+    def _assemble(self, session, by: str, version: Tuple) -> FeatureMatrix:
+        animal_ids = sorted(self._series)
+        parameters = sorted({name for series in self._series.values() for name in series})
+        column = {name: index for index, name in enumerate(parameters)}
+        units: Dict[str, set] = {name: set() for name in parameters}
+
+        row_animals, row_hours, blocks = [], [], []
+        for animal_id in animal_ids:
+            series = self._series[animal_id]
+            for name, (_, _, unit) in series.items():
+                units[name].add(unit)
+            if by == 'animal':
+                keys = np.array([np.nan])
+                positions = {name: np.zeros(len(values), dtype=np.intp)
+                             for name, (_, values, _) in series.items()}
+            else:
+                # np.unique sorts NaN last and keeps one; searchsorted finds it
+                keys = np.unique(np.concatenate([hours for hours, _, _ in series.values()]))
+                positions = {name: np.searchsorted(keys, hours)
+                             for name, (hours, _, _) in series.items()}
+            sums = np.zeros((len(keys), len(parameters)))
+            counts = np.zeros((len(keys), len(parameters)))
+            for name, (_, values, _) in series.items():
+                present = ~np.isnan(values)
+                np.add.at(sums[:, column[name]], positions[name][present], values[present])
+                np.add.at(counts[:, column[name]], positions[name][present], 1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                blocks.append(sums / counts)
+            row_animals.append(np.full(len(keys), animal_id, dtype=np.int64))
+            row_hours.append(keys)
+
+        animal_index = np.concatenate(row_animals) if row_animals else np.zeros(0, dtype=np.int64)
+        hours_index = np.concatenate(row_hours) if row_hours else np.zeros(0)
+        values = np.vstack(blocks) if blocks else np.zeros((0, len(parameters)))
+        therapies, therapy_matrix = _therapy_matrix(session, animal_index)
+        return FeatureMatrix(
+            animal_ids=animal_index,
+            timepoint_hours=hours_index,
+            values=values,
+            parameters=parameters,
+            units=[next(iter(units[name])) if len(units[name]) == 1 else None
+                   for name in parameters],
+            covariates=_covariates(session, animal_index, hours_index),
+            therapies=therapies,
+            therapy_matrix=therapy_matrix,
+            version=version,
+        )
+
+
+def _covariates(session, animal_index, hours_index) -> Dict[str, 'np.ndarray']:
+    """Animal covariates broadcast to the matrix rows (one query)"""
+    rows = session.execute(select(Animal.id, Species.scientific_name, Animal.strain, Animal.sex,
+                                  Animal.age_at_start, Animal.weight_at_start)
+                           .join(Species, Species.id == Animal.species_id)).all()
+    by_id = {row[0]: row for row in rows}
+    unique_ids, inverse = np.unique(animal_index, return_inverse=True)
+    found = [by_id.get(int(animal_id), (animal_id, None, None, None, None, None))
+             for animal_id in unique_ids]
+
+    def column(position, dtype):
+        values = np.array([row[position] for row in found], dtype=dtype)
+        return values[inverse] if len(found) else np.zeros(0, dtype=dtype)
+
+    age_at_start = column(4, np.float64)
+    # Per-timepoint rows carry the age at that timepoint; rows without one keep
+    # the age at start
+    age_weeks = np.where(np.isnan(hours_index), age_at_start,
+                         age_at_start + hours_index / HOURS_PER_WEEK)
+    return {
+        'species': column(1, object),
+        'strain': column(2, object),
+        'sex': column(3, object),
+        'age_weeks': age_weeks,
+        'weight_at_start': column(5, np.float64),
+    }
+
+
+def _therapy_matrix(session, animal_index) -> Tuple[List[str], 'np.ndarray']:
+    """One 0/1 column per therapy any of the animal's experiments used"""
+    link = experiment_therapy_association.c
+    pairs = session.execute(
+        select(Experiment.animal_id, Therapy.name).distinct()
+        .join(experiment_therapy_association, link.experiment_id == Experiment.id)
+        .join(Therapy, Therapy.id == link.therapy_id)).all()
+    therapies = sorted({name for _, name in pairs})
+    matrix = np.zeros((len(animal_index), len(therapies)), dtype=np.uint8)
+    if not pairs or not len(animal_index):
+        return therapies, matrix
+    column = {name: index for index, name in enumerate(therapies)}
+    animals = np.array([animal_id for animal_id, _ in pairs], dtype=np.int64)
+    columns = np.array([column[name] for _, name in pairs], dtype=np.intp)
+    # Rows are sorted by animal id, so each animal's rows are contiguous
+    starts = np.searchsorted(animal_index, animals, side='left')
+    ends = np.searchsorted(animal_index, animals, side='right')
+    for start, end, therapy in zip(starts, ends, columns):
+        matrix[start:end, therapy] = 1
+    return therapies, matrix
+
+
+def _cell(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    return value
+
+
+def write_feature_matrix(sink, fmt: str = 'csv', by: str = 'animal') -> int:
+    """
+    Export the feature matrix
+
+    Args:
+        sink: Output path, or a file object (text for csv, binary otherwise)
+        fmt: 'csv', 'npz' (NumPy archive with a columns manifest) or 'parquet'
+        by: 'animal' or 'timepoint' rows
+
+    Returns:
+        int: Number of rows written
+    """
+    if fmt not in FEATURE_EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt} "
+                         f"(expected one of {FEATURE_EXPORT_FORMATS})")
+    if fmt == 'parquet' and pa is None:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+    matrix = feature_matrices.build(by=by)
+    db.session.commit()  # Keep the series refreshed by the build
+    names = [column['name'] for column in matrix.columns()]
+    columns = ([matrix.animal_ids, matrix.timepoint_hours] + list(matrix.covariates.values())
+               + list(matrix.values.T) + list(matrix.therapy_matrix.T))
+
+    if fmt == 'npz':
+        covariates = {f'covariate_{name}': values.astype(str) if values.dtype == object else values
+                      for name, values in matrix.covariates.items()}
+        np.savez_compressed(sink, animal_ids=matrix.animal_ids,
+                            timepoint_hours=matrix.timepoint_hours, values=matrix.values,
+                            therapy_matrix=matrix.therapy_matrix, columns=np.array(names),
+                            parameters=np.array(matrix.parameters, dtype=str),
+                            therapies=np.array(matrix.therapies, dtype=str), **covariates)
+    elif fmt == 'parquet':
+        table = pa.table({name: pa.array(values) for name, values in zip(names, columns)})
+        pq.write_table(table, sink)
+    elif isinstance(sink, str):
+        with open(sink, 'w', encoding='utf-8', newline='') as stream:
+            _write_csv(stream, names, columns)
+    else:
+        _write_csv(sink, names, columns)
+    return len(matrix.animal_ids)
+
+
+def _write_csv(stream, names, columns):
+    writer = csv.writer(stream)
+    writer.writerow(names)
+    for row in zip(*[column.tolist() for column in columns]):
+        writer.writerow([_cell(value) for value in row])
+
+
+# Process-wide builder, so repeated builds reuse decoded series
+feature_matrices = FeatureMatrixBuilder()
+
+
+def build_feature_matrix(by: str = 'animal', session=None) -> FeatureMatrix:
+    """Return the (cached) feature matrix; see FeatureMatrixBuilder.build"""
+    return feature_matrices.build(by=by, session=session)
@@ -0,0 +1,103 @@
+"""
+InvivoDB Index Migration
+
+The index plan lives on the models in database.py: every foreign key used in
+joins, the created_at/start_date columns behind dashboard windows and keyset
+listings, the updated_at columns behind HTTP validators, a composite
+assay_measurements(assay_id, parameter_name) index, and composite primary
+keys on the association tables.
+
+db.create_all() builds all of that for new databases but never alters
+existing tables. migrate_indexes() brings an existing database up to the
+plan: it creates missing indexes and gives the association tables their
+composite key after dropping duplicate and incomplete link rows. It is
+idempotent.
+"""
+
+from typing import List
+
+from sqlalchemy import inspect, text
+
+from models.database import db, experiment_therapy_association, animal_assay_association
+
+ASSOCIATION_TABLES = (experiment_therapy_association, animal_assay_association)
+
+
+def association_key_name(table) -> str:
+    """Unique index replacing an association table's primary key on SQLite"""
+    return f"ux_{table.name}_pk"
+
+
+def _has_composite_key(inspector, table) -> bool:
+    columns = [column.name for column in table.primary_key.columns]
+    if inspector.get_pk_constraint(table.name).get('constrained_columns') == columns:
+        return True
+    return any(index['unique'] and index['column_names'] == columns
+               for index in inspector.get_indexes(table.name))
+
+
+def _add_association_key(connection, table) -> int:
+    """
+    Remove duplicate and NULL links, then enforce (left, right) uniqueness
+
+    SQLite cannot add a primary key to an existing table, so there it is
+    emulated with a unique index on the same columns, which the planner
+    uses in exactly the same way.
+
+    Returns:
+        int: Number of link rows removed
+    """
+    left, right = [column.name for column in table.primary_key.columns]
+    removed = connection.execute(text(
+        f"DELETE FROM {table.name} WHERE {left} IS NULL OR {right} IS NULL"
+    )).rowcount
+
+    if connection.dialect.name == 'sqlite':
+        removed += connection.execute(text(
+            f"DELETE FROM {table.name} WHERE rowid NOT IN "
+            f"(SELECT min(rowid) FROM {table.name} GROUP BY {left}, {right})"
+        )).rowcount
+        connection.execute(text(
+            f"CREATE UNIQUE INDEX {association_key_name(table)} ON {table.name} ({left}, {right})"
+        ))
+    else:
+        removed += connection.execute(text(
+            f"DELETE FROM {table.name} a USING {table.name} b "
+            f"WHERE a.ctid > b.ctid AND a.{left} = b.{left} AND a.{right} = b.{right}"
+        )).rowcount
+        connection.execute(text(f"ALTER TABLE {table.name} ADD PRIMARY KEY ({left}, {right})"))
+    return removed
+
+
+def migrate_indexes(connection) -> List[str]:
+    """
+    Create every index of the index plan missing from an existing database
+
+    Args:
+        connection: Connection inside a transaction (e.g. engine.begin())
+
+    Returns:
+        list: Description of each change made (empty if already up to date)
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    changes = []
+
+    for table in ASSOCIATION_TABLES:
+        if table.name in existing_tables and not _has_composite_key(inspector, table):
+            removed = _add_association_key(connection, table)
+            changes.append(f"Added composite key to {table.name} ({removed} bad link rows removed)")
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in present:
+                index.create(connection)
+                changes.append(f"Created index {index.name}")
+
+    if changes and connection.dialect.name == 'sqlite':
+        # Refresh planner statistics so the new indexes are costed correctly
+        connection.execute(text("ANALYZE"))
+    return changes
@@ -0,0 +1,296 @@
+"""
+InvivoDB Request Metrics
+
+This module records, per endpoint, how many requests were served, how long
+they took, how many SQL statements they issued and how long those took, as
+well as the time spent rendering each template. Statements slower than a
+threshold are logged together with the route; their bound parameters,
+which may hold user data, only when LOG_QUERY_PARAMETERS is set.
+Everything is kept in process memory and rendered in the Prometheus text
+format for /metrics, which only answers clients in METRICS_ALLOWED_IPS
+(loopback by default).
+
+SQL timing hooks before/after_cursor_execute on every Engine, so it also
+covers additional engines (read replicas and the like). Statements run
+outside a request (CLI commands, startup) are only checked against the
+slow-query threshold.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from ipaddress import ip_address, ip_network
+from typing import Dict, Optional, Sequence, Tuple
+
+from flask import (
+    before_render_template, current_app, g, has_app_context, has_request_context, request,
+    template_rendered
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('invivodb.sql')
+
+DEFAULT_SLOW_QUERY_MS = 100.0
+MAX_LOGGED_PARAMETERS = 500  # Characters of parameters included in a slow-query log line
+DEFAULT_METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+EXTENSION_KEY = 'invivodb_metrics'
+
+# Connection.info key holding the start times of the statements in flight
+_QUERY_START_KEY = 'invivodb_query_start'
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Thread-safe store of request, SQL and template metrics"""
+
+    def __init__(self, latency_buckets: Sequence[float] = LATENCY_BUCKETS,
+                 statement_buckets: Sequence[float] = STATEMENT_BUCKETS):
+        self.latency_buckets = latency_buckets
+        self.statement_buckets = statement_buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests: Dict[Tuple[str, str, int], int] = {}
+            self.latency: Dict[str, Histogram] = {}
+            self.statements_per_request: Dict[str, Histogram] = {}
+            self.sql_statements: Dict[str, int] = {}
+            self.sql_seconds: Dict[str, float] = {}
+            self.slow_queries: Dict[str, int] = {}
+            self.templates: Dict[str, Histogram] = {}
+
+    def record_request(self, endpoint: str, method: str, status: int, seconds: float,
+                       statements: int, sql_seconds: float):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.setdefault(endpoint, Histogram(self.latency_buckets)).observe(seconds)
+            self.statements_per_request.setdefault(
+                endpoint, Histogram(self.statement_buckets)).observe(statements)
+            self.sql_statements[endpoint] = self.sql_statements.get(endpoint, 0) + statements
+            self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + sql_seconds
+
+    def record_template(self, template: str, seconds: float):
+        with self._lock:
+            self.templates.setdefault(template, Histogram(self.latency_buckets)).observe(seconds)
+
+    def record_slow_query(self, endpoint: str):
+        with self._lock:
+            self.slow_queries[endpoint] = self.slow_queries.get(endpoint, 0) + 1
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, label, histograms):
+            for value, observed in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(observed.buckets + ('+Inf',), observed.counts):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _number(bound)
+                    lines.append(f'{name}_bucket{_labels(**{label: value}, le=le)} {cumulative}')
+                lines.append(f'{name}_sum{_labels(**{label: value})} {_number(observed.sum)}')
+                lines.append(f'{name}_count{_labels(**{label: value})} {observed.count}')
+
+        with self._lock:
+            header('invivodb_http_requests_total', 'counter', 'Requests served')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'invivodb_http_requests_total'
+                             f'{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+            header('invivodb_http_request_duration_seconds', 'histogram', 'Request latency')
+            histogram('invivodb_http_request_duration_seconds', 'endpoint', self.latency)
+
+            header('invivodb_sql_statements_per_request', 'histogram',
+                   'SQL statements issued per request')
+            histogram('invivodb_sql_statements_per_request', 'endpoint',
+                      self.statements_per_request)
+
+            header('invivodb_sql_statements_total', 'counter', 'SQL statements issued')
+            for endpoint, count in sorted(self.sql_statements.items()):
+                lines.append(f'invivodb_sql_statements_total{_labels(endpoint=endpoint)} {count}')
+
+            header('invivodb_sql_duration_seconds_total', 'counter', 'Time spent executing SQL')
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'invivodb_sql_duration_seconds_total{_labels(endpoint=endpoint)} '
+                             f'{_number(seconds)}')
+
+            header('invivodb_sql_slow_queries_total', 'counter',
+                   'Statements slower than the slow-query threshold')
+            for endpoint, count in sorted(self.slow_queries.items()):
+                lines.append(f'invivodb_sql_slow_queries_total{_labels(endpoint=endpoint)} {count}')
+
+            header('invivodb_template_render_seconds', 'histogram', 'Template render time')
+            histogram('invivodb_template_render_seconds', 'template', self.templates)
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry()
+
+
+def _endpoint() -> str:
+    return request.endpoint or 'unmatched'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_QUERY_START_KEY)
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    in_request = has_request_context()
+    if in_request and 'metrics_start' in g:
+        g.metrics_statements += 1
+        g.metrics_sql_seconds += elapsed
+
+    threshold = (current_app.config.get('SLOW_QUERY_THRESHOLD_MS', DEFAULT_SLOW_QUERY_MS)
+                 if has_app_context() else DEFAULT_SLOW_QUERY_MS)
+    if elapsed * 1000 >= threshold:
+        route = f'{request.method} {request.path}' if in_request else '-'
+        registry = current_app.extensions.get(EXTENSION_KEY) if in_request else None
+        if registry is not None:
+            registry.record_slow_query(_endpoint())
+        if has_app_context() and current_app.config.get('LOG_QUERY_PARAMETERS'):
+            logger.warning('Slow query (%.1f ms) on %s: %s | parameters: %s', elapsed * 1000, route,
+                           ' '.join(statement.split()), repr(parameters)[:MAX_LOGGED_PARAMETERS])
+        else:
+            logger.warning('Slow query (%.1f ms) on %s: %s', elapsed * 1000, route,
+                           ' '.join(statement.split()))
+
+
+def _handle_error(conn_context):
+    # A failed statement never reaches after_cursor_execute
+    starts = conn_context.connection.info.get(_QUERY_START_KEY) if conn_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def metrics_allowed(remote_addr: Optional[str]) -> bool:
+    """
+    Whether a client may read /metrics
+
+    METRICS_ALLOWED_IPS lists addresses or networks (e.g. 10.0.0.0/8);
+    '*' allows everyone. Behind a proxy, remote_addr is the proxy's unless
+    the app is wrapped in ProxyFix.
+    """
+    allowed = current_app.config.get('METRICS_ALLOWED_IPS', DEFAULT_METRICS_ALLOWED_IPS)
+    if '*' in allowed:
+        return True
+    try:
+        address = ip_address(remote_addr or '')
+    except ValueError:
+        return False
+    for entry in allowed:
+        try:
+            if address in ip_network(entry, strict=False):
+                return True
+        except ValueError:  # A malformed entry allows nobody
+            continue
+    return False
+
+
+def install_sql_timing():
+    """Time statements on every Engine (idempotent)"""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+
+def init_app(app, registry: Optional[MetricsRegistry] = None):
+    """
+    Instrument a Flask app
+
+    The slow-query threshold is read from app.config['SLOW_QUERY_THRESHOLD_MS'];
+    LOG_QUERY_PARAMETERS (off by default) adds bound parameters to slow-query
+    lines and METRICS_ALLOWED_IPS limits who may read /metrics. Latency
+    covers the view and template rendering, not the time spent sending a
+    streamed response body.
+
+    Args:
+        app: The Flask application
+        registry: Registry to record into (defaults to metrics_registry)
+    """
+    registry = registry or metrics_registry
+    app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', DEFAULT_SLOW_QUERY_MS)
+    app.config.setdefault('LOG_QUERY_PARAMETERS', False)
+    app.config.setdefault('METRICS_ALLOWED_IPS', DEFAULT_METRICS_ALLOWED_IPS)
+    app.extensions[EXTENSION_KEY] = registry
+    install_sql_timing()
+
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_statements = 0
+        g.metrics_sql_seconds = 0.0
+
+    @app.after_request
+    def _record_request_metrics(response):
+        _record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _record_failed_request(exception):
+        if exception is not None:
+            _record(500)
+
+    def _record(status: int):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        registry.record_request(_endpoint(), request.method, status, time.perf_counter() - start,
+                                g.metrics_statements, g.metrics_sql_seconds)
+
+    def _start_template(sender, template, context, **extra):
+        g.setdefault('metrics_template_starts', []).append(time.perf_counter())
+
+    def _finish_template(sender, template, context, **extra):
+        starts = g.get('metrics_template_starts')
+        if starts:
+            registry.record_template(template.name or 'inline', time.perf_counter() - starts.pop())
+
+    before_render_template.connect(_start_template, app, weak=False)
+    template_rendered.connect(_finish_template, app, weak=False)
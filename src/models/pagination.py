@@ -0,0 +1,207 @@
+"""
+InvivoDB Keyset Pagination
+
+This module pages through listings by remembering the sort key of the last
+row shown instead of counting rows with OFFSET, so page 5,000 costs the same
+as page 1. Position is carried in an opaque cursor passed in the query
+string, and counting the total is optional.
+
+KeysetPagination exposes the attributes templates already use with
+Flask-SQLAlchemy's Pagination (items, page, pages, has_prev, has_next,
+prev_num, next_num, total, iter_pages) plus prev_cursor and next_cursor.
+"""
+
+import base64
+import binascii
+import json
+import math
+from datetime import date, datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import and_, literal, or_, tuple_
+
+# A sort key is (column expression, descending)
+SortKey = Tuple[Any, bool]
+
+DIRECTION_NEXT = 'n'
+DIRECTION_PREV = 'p'
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+    return value
+
+
+def encode_cursor(values: Sequence, direction: str, page: int) -> str:
+    """
+    Encode a keyset position as an opaque, URL-safe cursor
+
+    Args:
+        values: Sort key values of the boundary row
+        direction: DIRECTION_NEXT (rows after) or DIRECTION_PREV (rows before)
+        page: Page number the cursor leads to (for display only)
+    """
+    payload = json.dumps({'k': [_encode_value(v) for v in values], 'd': direction, 'p': page},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[List, str, int]]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Returns:
+        tuple: (values, direction, page), or None if the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_decode_value(v) for v in payload['k']]
+        direction = payload['d']
+        page = int(payload['p'])
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        return None
+    if direction not in (DIRECTION_NEXT, DIRECTION_PREV) or page < 1:
+        return None
+    return values, direction, page
+
+
+def _after(sort_keys: Sequence[SortKey], values: Sequence, reverse: bool = False):
+    """
+    Build the WHERE clause selecting rows that sort after values
+
+    Uniform directions use a row-value comparison; mixed directions expand
+    to (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...
+    """
+    directions = {descending != reverse for _, descending in sort_keys}
+    columns = [column for column, _ in sort_keys]
+    # Bind with the column types so values compare in their stored format
+    values = [literal(value, column.type) for column, value in zip(columns, values)]
+    if len(directions) == 1:
+        descending = directions.pop()
+        left, right = tuple_(*columns), tuple_(*values)
+        return left < right if descending else left > right
+
+    clauses = []
+    for i, (column, descending) in enumerate(sort_keys):
+        descending = descending != reverse
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*[columns[j] == values[j] for j in range(i)], step))
+    return or_(*clauses)
+
+
+def _ordering(sort_keys: Sequence[SortKey], reverse: bool = False):
+    return [column.desc() if descending != reverse else column.asc()
+            for column, descending in sort_keys]
+
+
+class KeysetPagination:
+    """One page of a keyset-paginated listing"""
+
+    def __init__(self, items: List, page: int, per_page: int,
+                 prev_cursor: Optional[str], next_cursor: Optional[str],
+                 total: Optional[int] = None):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.total = total
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def prev_num(self) -> Optional[int]:
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self) -> Optional[int]:
+        return self.page + 1 if self.has_next else None
+
+    @property
+    def pages(self) -> int:
+        """Page count when the total is known, else the pages reached so far"""
+        if self.total is not None:
+            return max(1, math.ceil(self.total / self.per_page))
+        return self.page + (1 if self.has_next else 0)
+
+    def iter_pages(self, *args, **kwargs):
+        """Only the current page is addressable without a cursor"""
+        yield self.page
+
+
+def paginate_keyset(query, sort_keys: Sequence[SortKey], cursor: Optional[str] = None,
+                    per_page: int = 20, page: int = 1,
+                    total: Union[None, int, Callable[[], Optional[int]]] = None
+                    ) -> KeysetPagination:
+    """
+    Fetch one page of query ordered by sort_keys
+
+    Args:
+        query: ORM query selecting a single entity (filtered, not ordered)
+        sort_keys: (column, descending) pairs; the last must be unique (e.g. id)
+        cursor: Cursor from a previous page's prev_cursor/next_cursor
+        per_page: Rows per page
+        page: Legacy page number, honoured with OFFSET only without a cursor
+        total: Known row count, or a callable returning one (None skips
+               counting)
+
+    Returns:
+        KeysetPagination: The page, with cursors to its neighbours
+    """
+    decoded = decode_cursor(cursor) if cursor else None
+    keyed_query = query.order_by(None).add_columns(
+        *[column.label(f'_keyset_{i}') for i, (column, _) in enumerate(sort_keys)])
+
+    backwards = False
+    if decoded:
+        values, direction, page = decoded
+        backwards = direction == DIRECTION_PREV
+        keyed_query = keyed_query.filter(_after(sort_keys, values, reverse=backwards))
+        offset = 0
+    else:
+        page = max(page or 1, 1)
+        offset = (page - 1) * per_page
+
+    rows = (keyed_query
+            .order_by(*_ordering(sort_keys, reverse=backwards))
+            .offset(offset or None)
+            .limit(per_page + 1)
+            .all())
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    keys = [list(row[1:]) for row in rows]
+
+    if backwards and not has_more:
+        page = 1
+    has_prev = has_more if backwards else page > 1
+    has_next = True if backwards else has_more
+    prev_cursor = encode_cursor(keys[0], DIRECTION_PREV, page - 1) if has_prev and keys else None
+    next_cursor = encode_cursor(keys[-1], DIRECTION_NEXT, page + 1) if has_next and keys else None
+
+    if callable(total):
+        total = total()
+    return KeysetPagination(items, page, per_page, prev_cursor, next_cursor, total)
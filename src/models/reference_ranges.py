@@ -0,0 +1,216 @@
+"""
+InvivoDB Reference Ranges
+
+This module applies the reference_ranges table to stored measurements.
+A range is keyed by species, parameter and unit (spelling variants such as
+mg/dl resolved through models.units.normalize_unit_name, on both the range
+and the measurement) and may be narrowed to a strain, a sex and an age
+band; a measurement takes the most specific range matching its animal (age
+at the assay's timepoint when known, else the age at start).
+
+reflag_measurements re-evaluates reference_range_min/max and is_normal
+after ranges are added or revised. Measurements of parameters with a range
+are read in id order a batch at a time, matched against the ranges held in
+memory, and only rows whose range or flag changed are written, with one
+executemany UPDATE per batch. Each batch is committed with a checkpoint,
+so an interrupted run resumes where it stopped. Measurements no range
+matches keep the range they were entered with.
+"""
+
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, select, update
+
+from models.assay_ingest import compute_is_normal
+from models.cache import mark_tables_written
+from models.conditional import touch_validators
+from models.database import (
+    db, Animal, Experiment, Assay, AssayMeasurement, MigrationCheckpoint, ReferenceRange
+)
+from models.units import normalize_unit_name
+
+CHECKPOINT_NAME = 'reference_ranges'
+DEFAULT_BATCH_SIZE = 5000
+HOURS_PER_WEEK = 168.0
+
+# (specificity, id, strain, sex, age_min_weeks, age_max_weeks,
+#  range_min, range_max)
+Candidate = Tuple[int, int, Optional[str], Optional[str], Optional[float], Optional[float],
+                  float, float]
+
+
+def load_reference_ranges(session=None, species_id: Optional[int] = None,
+                          parameter_name: Optional[str] = None) -> Dict[Tuple, List[Candidate]]:
+    """
+    Group reference ranges by (species_id, parameter_name, unit), most specific
+    first
+
+    Units are keyed by their normalized spelling. Ties go to the most
+    recently added range.
+    """
+    session = session or db.session
+    statement = select(ReferenceRange.species_id, ReferenceRange.parameter_name,
+                       ReferenceRange.unit, ReferenceRange.id, ReferenceRange.strain,
+                       ReferenceRange.sex, ReferenceRange.age_min_weeks,
+                       ReferenceRange.age_max_weeks, ReferenceRange.range_min,
+                       ReferenceRange.range_max)
+    if species_id is not None:
+        statement = statement.where(ReferenceRange.species_id == species_id)
+    if parameter_name is not None:
+        statement = statement.where(ReferenceRange.parameter_name == parameter_name)
+
+    ranges: Dict[Tuple, List[Candidate]] = {}
+    rows = session.execute(statement)
+    for species, parameter, unit, range_id, strain, sex, age_min, age_max, low, high in rows:
+        has_age = age_min is not None or age_max is not None
+        specificity = (strain is not None) * 4 + (sex is not None) * 2 + has_age
+        ranges.setdefault((species, parameter, normalize_unit_name(unit)), []).append(
+            (specificity, range_id, strain, sex, age_min, age_max, low, high))
+    for candidates in ranges.values():
+        candidates.sort(reverse=True)
+    return ranges
+
+
+def match_reference_range(candidates: List[Candidate], strain: Optional[str], sex: Optional[str],
+                          age_weeks: Optional[float]) -> Optional[Tuple[float, float]]:
+    """(range_min, range_max) of the first matching candidate, or None"""
+    for _, _, range_strain, range_sex, age_min, age_max, low, high in candidates:
+        if range_strain is not None and range_strain != strain:
+            continue
+        if range_sex is not None and range_sex != sex:
+            continue
+        if age_min is not None or age_max is not None:
+            if age_weeks is None:
+                continue
+            if ((age_min is not None and age_weeks < age_min)
+                    or (age_max is not None and age_weeks >= age_max)):
+                continue
+        return low, high
+    return None
+
+
+def _age_weeks(age_at_start: Optional[float], timepoint_hours: Optional[float]) -> Optional[float]:
+    if age_at_start is None or timepoint_hours is None:
+        return age_at_start
+    return age_at_start + timepoint_hours / HOURS_PER_WEEK
+
+
+def _checkpoint(session, name: str) -> int:
+    return session.execute(select(MigrationCheckpoint.last_id)
+                           .where(MigrationCheckpoint.name == name)).scalar() or 0
+
+
+def _save_checkpoint(session, name: str, last_id: int):
+    updated = session.execute(update(MigrationCheckpoint).where(MigrationCheckpoint.name == name)
+                              .values(last_id=last_id, updated_at=datetime.utcnow()))
+    if not updated.rowcount:
+        session.add(MigrationCheckpoint(name=name, last_id=last_id))
+
+
+def _finish(result: Dict, start: float):
+    result['seconds'] = time.perf_counter() - start
+    result['rows_per_second'] = result['scanned'] / result['seconds'] if result['seconds'] else 0.0
+
+
+def reflag_measurements(session=None, batch_size: int = DEFAULT_BATCH_SIZE,
+                        species_id: Optional[int] = None,
+                        parameter_name: Optional[str] = None, restart: bool = False,
+                        progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Re-evaluate reference ranges and is_normal of stored measurements in
+    resumable batches
+
+    Args:
+        session: Session to use (defaults to db.session)
+        batch_size: Measurements read and written per committed batch
+        species_id: Only measurements of animals of this species
+        parameter_name: Only measurements of this parameter
+        restart: Ignore a checkpoint left by an interrupted run
+        progress: Called with the running totals after every batch
+
+    Returns:
+        dict: Totals (scanned, matched, updated, unmatched, batches),
+              resumed_from, seconds and rows_per_second
+    """
+    session = session or db.session
+    # Runs limited to a species or parameter keep their own checkpoint
+    name = ':'.join(str(part) for part in (CHECKPOINT_NAME, species_id, parameter_name)
+                    if part is not None)
+    ranges = load_reference_ranges(session, species_id, parameter_name)
+    resumed_from = 0 if restart else _checkpoint(session, name)
+    session.commit()
+
+    result = {'resumed_from': resumed_from, 'scanned': 0, 'matched': 0, 'updated': 0,
+              'unmatched': 0, 'batches': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+    start = time.perf_counter()
+    parameters = sorted({parameter for _, parameter, _ in ranges})
+    if not parameters:
+        return result
+
+    query = (select(AssayMeasurement.id, AssayMeasurement.value, AssayMeasurement.parameter_name,
+                    AssayMeasurement.unit, AssayMeasurement.reference_range_min,
+                    AssayMeasurement.reference_range_max, AssayMeasurement.is_normal,
+                    Animal.species_id, Animal.strain, Animal.sex, Animal.age_at_start,
+                    Assay.timepoint_hours)
+             .join(Assay, Assay.id == AssayMeasurement.assay_id)
+             .join(Experiment, Experiment.id == Assay.experiment_id)
+             .join(Animal, Animal.id == Experiment.animal_id)
+             .where(AssayMeasurement.parameter_name.in_(parameters)))
+    if species_id is not None:
+        query = query.where(Animal.species_id == species_id)
+    table = AssayMeasurement.__table__
+    statement = update(table).where(table.c.id == bindparam('measurement_id')).values(
+        reference_range_min=bindparam('low'), reference_range_max=bindparam('high'),
+        is_normal=bindparam('flag'))
+
+    last_id = resumed_from
+    while True:
+        rows = session.execute(query.where(AssayMeasurement.id > last_id)
+                               .order_by(AssayMeasurement.id).limit(batch_size)).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        matched = []
+        for row in rows:
+            candidates = ranges.get((row.species_id, row.parameter_name,
+                                     normalize_unit_name(row.unit)))
+            found = None
+            if candidates:
+                found = match_reference_range(candidates, row.strain, row.sex,
+                                              _age_weeks(row.age_at_start, row.timepoint_hours))
+            if found is None:
+                result['unmatched'] += 1
+            else:
+                matched.append((row, found))
+        flags = compute_is_normal([row.value for row, _ in matched],
+                                  [low for _, (low, _) in matched],
+                                  [high for _, (_, high) in matched])
+        changes = [{'measurement_id': row.id, 'low': low, 'high': high, 'flag': flag}
+                   for (row, (low, high)), flag in zip(matched, flags)
+                   if (row.reference_range_min, row.reference_range_max, row.is_normal)
+                   != (low, high, flag)]
+
+        if changes:
+            session.execute(statement, changes)
+            mark_tables_written(session, AssayMeasurement)
+        _save_checkpoint(session, name, last_id)
+        session.commit()
+
+        result['scanned'] += len(rows)
+        result['matched'] += len(matched)
+        result['updated'] += len(changes)
+        result['batches'] += 1
+        _finish(result, start)
+        if progress:
+            progress(result)
+
+    # A finished run leaves no checkpoint, so the next one re-checks everything
+    session.execute(delete(MigrationCheckpoint).where(MigrationCheckpoint.name == name))
+    if result['updated'] or resumed_from:  # An interrupted run may have rewritten rows too
+        touch_validators(session)
+    session.commit()
+    _finish(result, start)
+    return result
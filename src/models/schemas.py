@@ -283,6 +283,8 @@ class AssayMeasurementUpdate(BaseSchema):
 class AssayMeasurement(AssayMeasurementBase):
     id: int
     assay_id: int
+    canonical_value: Optional[float] = None
+    canonical_unit: Optional[str] = None
     created_at: datetime
 
 
@@ -301,7 +303,14 @@ class AssayBase(BaseSchema):
 
 
 class AssayCreate(AssayBase):
-    measurements: Optional[List[AssayMeasurementCreate]] = Field(default_factory=list)
+    animal_ids: List[int] = Field(
+        default_factory=list, description="Animals assayed (defaults to the experiment's animal)")
+    measurements: List[AssayMeasurementCreate] = Field(default_factory=list)
+
+    @validator('animal_ids', 'measurements', pre=True)
+    def null_as_empty(cls, v):
+        # An explicit null means the same as leaving the list out
+        return [] if v is None else v
 
 
 class AssayUpdate(BaseSchema):
@@ -0,0 +1,198 @@
+"""
+InvivoDB Full-Text Search
+
+This module maintains an SQLite FTS5 index over experiments and builds the
+ranked queries behind /search. Each indexed row carries an experiment's
+title, notes and primary endpoint, the names and molecular targets of its
+therapies, and its animal's accession number. The index is kept current by
+triggers, so every writer (ORM, bulk imports, migration scripts) updates it.
+
+Databases without FTS5 (or non-SQLite backends) fall back to LIKE filters.
+"""
+
+import re
+from typing import List
+
+from sqlalchemy import event, false, literal_column, column, table, text
+
+from models.database import db, Species, Animal, Experiment
+
+SEARCH_TABLE = 'experiment_search'
+
+# Indexed columns and their BM25 weights (title matches rank highest)
+SEARCH_COLUMNS = (
+    ('title', 10.0),
+    ('notes', 2.0),
+    ('primary_endpoint', 4.0),
+    ('therapy_names', 5.0),
+    ('molecular_targets', 3.0),
+    ('accession_number', 8.0),
+)
+
+_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+search_index = table(SEARCH_TABLE, column('rowid'))
+
+# Rebuilds the index rows of the experiments selected by {where}
+_REFRESH_SQL = """
+    DELETE FROM {table} WHERE rowid IN (SELECT e.id FROM experiments e WHERE {where});
+    INSERT INTO {table} (rowid, {columns})
+    SELECT e.id, e.title, e.notes, e.primary_endpoint,
+           (SELECT group_concat(t.name, ' ') FROM therapies t
+              JOIN experiment_therapy et ON et.therapy_id = t.id
+             WHERE et.experiment_id = e.id),
+           (SELECT group_concat(t.molecular_target, ' ') FROM therapies t
+              JOIN experiment_therapy et ON et.therapy_id = t.id
+             WHERE et.experiment_id = e.id),
+           (SELECT a.accession_number FROM animals a WHERE a.id = e.animal_id)
+      FROM experiments e
+     WHERE {where};
+"""
+
+
+def _refresh(where: str) -> str:
+    columns = ', '.join(name for name, _ in SEARCH_COLUMNS)
+    return _REFRESH_SQL.format(table=SEARCH_TABLE, columns=columns, where=where)
+
+
+def _trigger(name: str, event_clause: str, body: str) -> str:
+    return f"CREATE TRIGGER IF NOT EXISTS {name} {event_clause} BEGIN {body} END"
+
+
+def search_index_ddl() -> List[str]:
+    """Return the statements creating the FTS5 table and its triggers"""
+    columns = ', '.join(name for name, _ in SEARCH_COLUMNS)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        f"{columns}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+        _trigger('experiment_search_ai', 'AFTER INSERT ON experiments',
+                 _refresh('e.id = NEW.id')),
+        _trigger('experiment_search_au', 'AFTER UPDATE ON experiments',
+                 _refresh('e.id = NEW.id')),
+        _trigger('experiment_search_ad', 'AFTER DELETE ON experiments',
+                 f"DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id;"),
+        _trigger('experiment_search_eti', 'AFTER INSERT ON experiment_therapy',
+                 _refresh('e.id = NEW.experiment_id')),
+        _trigger('experiment_search_etd', 'AFTER DELETE ON experiment_therapy',
+                 _refresh('e.id = OLD.experiment_id')),
+        _trigger('experiment_search_tu', 'AFTER UPDATE OF name, molecular_target ON therapies',
+                 _refresh('e.id IN (SELECT experiment_id FROM experiment_therapy '
+                          'WHERE therapy_id = NEW.id)')),
+        _trigger('experiment_search_anu', 'AFTER UPDATE OF accession_number ON animals',
+                 _refresh('e.animal_id = NEW.id')),
+    ]
+
+
+def _supports_fts5(connection) -> bool:
+    options = {row[0] for row in connection.exec_driver_sql("PRAGMA compile_options")}
+    return 'ENABLE_FTS5' in options
+
+
+def fts_available(connection) -> bool:
+    """Whether the connection is SQLite with the search index installed"""
+    if connection.dialect.name != 'sqlite':
+        return False
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': SEARCH_TABLE}
+    ).first() is not None
+
+
+def install_search_index(connection):
+    """Create the FTS5 table and triggers if they do not exist yet"""
+    for statement in search_index_ddl():
+        connection.exec_driver_sql(statement)
+
+
+def rebuild_search_index(connection) -> int:
+    """
+    Install the search index if needed and repopulate it from scratch
+
+    Args:
+        connection: An SQLite connection (inside a transaction)
+
+    Returns:
+        int: Number of experiments indexed
+    """
+    install_search_index(connection)
+    connection.exec_driver_sql(f"DELETE FROM {SEARCH_TABLE}")
+    for statement in _refresh('1 = 1').split(';'):
+        if statement.strip():
+            connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return connection.execute(text(f"SELECT count(*) FROM {SEARCH_TABLE}")).scalar()
+
+
+def build_match_expression(query: str) -> str:
+    """
+    Translate free text into an FTS5 MATCH expression
+
+    Every word becomes a quoted prefix term, so user input can never inject
+    FTS5 operators and partial words still match ("gluc" finds "glucose").
+
+    Returns:
+        str: The MATCH expression, or '' if the query has no searchable words
+    """
+    tokens = _TOKEN_PATTERN.findall(query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _rank_expression():
+    weights = ', '.join(str(weight) for _, weight in SEARCH_COLUMNS)
+    return literal_column(f"bm25({SEARCH_TABLE}, {weights})")
+
+
+def search_sort_keys(use_index: bool) -> list:
+    """Return the (column, descending) ordering of search results, best first"""
+    if use_index:
+        return [(_rank_expression(), False), (Experiment.start_date, True), (Experiment.id, True)]
+    return [(Experiment.start_date, True), (Experiment.id, True)]
+
+
+def search_experiments(query: str, ordered: bool = True):
+    """
+    Build the ranked experiment query for a /search request
+
+    Args:
+        query: Free-text search string
+        ordered: Apply search_sort_keys() ordering (keyset pagination orders
+                 itself)
+
+    Returns:
+        tuple: (Experiment query joined to Animal and Species, its sort keys)
+    """
+    experiments_query = Experiment.query.join(Animal).join(Species)
+    use_index = fts_available(db.session.connection())
+    sort_keys = search_sort_keys(use_index)
+
+    if use_index:
+        match_expression = build_match_expression(query)
+        if not match_expression:
+            experiments_query = experiments_query.filter(false())
+        else:
+            matches = literal_column(SEARCH_TABLE).op('MATCH')(match_expression)
+            experiments_query = (experiments_query
+                                 .join(search_index, search_index.c.rowid == Experiment.id)
+                                 .filter(matches))
+    else:
+        search_filter = f'%{query}%'
+        experiments_query = experiments_query.filter(
+            (Experiment.title.like(search_filter)) |
+            (Experiment.notes.like(search_filter)) |
+            (Animal.accession_number.like(search_filter))
+        )
+
+    if ordered:
+        experiments_query = experiments_query.order_by(
+            *[column.desc() if descending else column for column, descending in sort_keys])
+    return experiments_query, sort_keys
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _install_on_create(target, connection, tables=(), **kw):
+    """New SQLite databases get the index as part of db.create_all()"""
+    # Existing databases are migrated with rebuild_search_index(), which also
+    # backfills
+    if 'experiments' not in {created.name for created in tables}:
+        return
+    if connection.dialect.name == 'sqlite' and _supports_fts5(connection):
+        install_search_index(connection)
@@ -0,0 +1,293 @@
+"""
+InvivoDB Measurement Series
+
+This module keeps a compact copy of every animal's longitudinal data: one
+measurement_series row per (animal, parameter) holding the timepoint_hours
+and values arrays back to back in a single blob of little-endian float64,
+ordered by timepoint, plus the unit and element count. Values are stored
+in their canonical units (models.units). Reading a series is one
+primary-key lookup and np.frombuffer over the blob; no measurement rows are
+loaded.
+
+Measurements belong to the animals linked to their assay, or to the
+experiment's animal when the assay has no linked animals (assays entered
+through the web form).
+
+The store is derived from assay_measurements. Writers that add
+measurements refresh it incrementally in their own transaction: a
+watermark records the newest measurement id already folded in, and a
+refresh rebuilds only the series of animals that gained measurements since
+then, so reads never write. Ids are handed out before commit, so a
+transaction can commit rows below a watermark another one already saved.
+The rebuild-series command (run it periodically) also builds a store that
+was never built and recounts the animals measured in the WATERMARK_WINDOW
+ids below the watermark, rebuilding those whose series miss rows; writers
+leave that work to it. Missing timepoints and values are stored as NaN
+(timepoint NaN sorts last). Edited or deleted measurements, and canonical
+values backfilled onto existing rows, are picked up by rebuild_series.
+"""
+
+import sys
+from array import array
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import delete, exists, func, insert, select, union_all, update
+
+from models.database import (
+    db, Experiment, Assay, AssayMeasurement, MeasurementSeries, MigrationCheckpoint,
+    animal_assay_association
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+SERIES_DTYPE = '<f8'
+WATERMARK_NAME = 'measurement_series'
+ANIMALS_PER_BATCH = 500  # Animals whose series are rebuilt per query
+WATERMARK_WINDOW = 10000  # Measurement ids below the watermark re-checked for late commits
+
+_NAN = float('nan')
+
+
+class Series(NamedTuple):
+    """One animal's values of one parameter, ordered by timepoint"""
+    animal_id: int
+    parameter_name: str
+    unit: Optional[str]
+    timepoint_hours: Sequence[float]
+    values: Sequence[float]
+
+
+def encode_series(timepoint_hours: Sequence[Optional[float]],
+                  values: Sequence[Optional[float]]) -> bytes:
+    """Pack two equal-length sequences into a series blob (None becomes NaN)"""
+    data = array('d', (_NAN if hours is None else hours for hours in timepoint_hours))
+    data.extend(_NAN if value is None else value for value in values)
+    if sys.byteorder == 'big':  # pragma: no cover
+        data.byteswap()
+    return data.tobytes()
+
+
+def decode_series(data: bytes, count: int):
+    """
+    Unpack a series blob
+
+    Returns:
+        tuple: (timepoint_hours, values) as read-only NumPy views of the
+               blob, or array('d') copies without NumPy
+    """
+    if np is not None:
+        arrays = np.frombuffer(data, dtype=SERIES_DTYPE, count=2 * count).reshape(2, count)
+        return arrays[0], arrays[1]
+    numbers = array('d')
+    numbers.frombytes(data[:16 * count])
+    if sys.byteorder == 'big':  # pragma: no cover
+        numbers.byteswap()
+    return numbers[:count], numbers[count:]
+
+
+def _assay_animals():
+    """
+    (animal_id, assay_id) of every assay: its linked animals, else its
+    experiment's animal
+    """
+    link = animal_assay_association.c
+    linked = select(link.animal_id.label('animal_id'), link.assay_id.label('assay_id'))
+    unlinked = (select(Experiment.animal_id, Assay.id)
+                .join(Experiment, Experiment.id == Assay.experiment_id)
+                .where(~exists().where(link.assay_id == Assay.id)))
+    return union_all(linked, unlinked).subquery('assay_animals')
+
+
+def _measured_animals(*where):
+    """SELECT of the animals with measurements matching where"""
+    owners = _assay_animals()
+    return (select(owners.c.animal_id).select_from(AssayMeasurement)
+            .join(owners, owners.c.assay_id == AssayMeasurement.assay_id).where(*where))
+
+
+def _series_rows(connection, animal_ids: List[int]) -> List[Dict]:
+    """Build the measurement_series rows of the given animals with one query"""
+    owners = _assay_animals()
+    statement = (
+        select(owners.c.animal_id, AssayMeasurement.parameter_name, Assay.timepoint_hours,
+               func.coalesce(AssayMeasurement.canonical_value, AssayMeasurement.value),
+               func.coalesce(AssayMeasurement.canonical_unit, AssayMeasurement.unit),
+               AssayMeasurement.id)
+        .select_from(AssayMeasurement)
+        .join(Assay, Assay.id == AssayMeasurement.assay_id)
+        .join(owners, owners.c.assay_id == AssayMeasurement.assay_id)
+        .where(owners.c.animal_id.in_(animal_ids))
+        .order_by(owners.c.animal_id, AssayMeasurement.parameter_name,
+                  Assay.timepoint_hours.is_(None), Assay.timepoint_hours, AssayMeasurement.id)
+    )
+    now = datetime.utcnow()
+    rows = []
+    for (animal_id, parameter_name), points in groupby(connection.execute(statement),
+                                                       key=lambda row: (row[0], row[1])):
+        points = list(points)
+        units = {point[4] for point in points}
+        rows.append({
+            'animal_id': animal_id,
+            'parameter_name': parameter_name,
+            'unit': units.pop() if len(units) == 1 else None,
+            'dtype': SERIES_DTYPE,
+            'count': len(points),
+            'data': encode_series([point[2] for point in points], [point[3] for point in points]),
+            'max_measurement_id': max(point[5] for point in points),
+            'updated_at': now,
+        })
+    return rows
+
+
+def _rebuild_animals(connection, animal_ids: List[int]) -> int:
+    series = MeasurementSeries.__table__
+    written = 0
+    for start in range(0, len(animal_ids), ANIMALS_PER_BATCH):
+        batch = animal_ids[start:start + ANIMALS_PER_BATCH]
+        rows = _series_rows(connection, batch)
+        connection.execute(delete(series).where(series.c.animal_id.in_(batch)))
+        if rows:
+            connection.execute(insert(series), rows)
+        written += len(rows)
+    return written
+
+
+def _watermark(connection) -> Optional[int]:
+    return connection.execute(select(MigrationCheckpoint.last_id)
+                              .where(MigrationCheckpoint.name == WATERMARK_NAME)).scalar()
+
+
+def _save_watermark(connection, last_id: int):
+    checkpoints = MigrationCheckpoint.__table__
+    values = {'last_id': last_id, 'updated_at': datetime.utcnow()}
+    updated = connection.execute(update(checkpoints)
+                                 .where(checkpoints.c.name == WATERMARK_NAME).values(**values))
+    if not updated.rowcount:
+        connection.execute(insert(checkpoints).values(name=WATERMARK_NAME, **values))
+
+
+def _late_animals(connection, low: int, high: int) -> List[int]:
+    """
+    Animals measured in ids (low, high] whose series miss measurements
+
+    Compares each animal's measurement count with the counts of its
+    stored series, so rows committed after a later id was folded in are
+    found.
+    """
+    window = _measured_animals(AssayMeasurement.id > low, AssayMeasurement.id <= high)
+    owners = _assay_animals()
+    measured = connection.execute(
+        select(owners.c.animal_id, func.count()).select_from(AssayMeasurement)
+        .join(owners, owners.c.assay_id == AssayMeasurement.assay_id)
+        .where(owners.c.animal_id.in_(window))
+        .group_by(owners.c.animal_id)
+    ).all()
+    stored = dict(connection.execute(
+        select(MeasurementSeries.animal_id, func.sum(MeasurementSeries.count))
+        .where(MeasurementSeries.animal_id.in_(window))
+        .group_by(MeasurementSeries.animal_id)
+    ).all())
+    return [animal_id for animal_id, count in measured if stored.get(animal_id) != count]
+
+
+def refresh_series(connection=None, recheck: bool = True) -> int:
+    """
+    Bring the series store up to date with measurements added since the last
+    refresh
+
+    Writers call it with recheck=False on the connection of their
+    transaction, so the series are committed with the rows and a request
+    only rebuilds the animals it measured.
+
+    Args:
+        connection: Connection to run on, inside a transaction the caller
+                    commits (defaults to a transaction on db.engine)
+        recheck: Also build a store that was never built and re-check the
+                 WATERMARK_WINDOW ids below the watermark for late commits
+                 (the rebuild-series command; too slow for a request)
+
+    Returns:
+        int: Number of series rewritten (0 when nothing changed)
+    """
+    if connection is None:
+        with db.engine.begin() as connection:
+            return refresh_series(connection, recheck)
+
+    saved = _watermark(connection)
+    if saved is None and not recheck:
+        return 0  # Never built: the rebuild-series command folds these rows in
+    watermark = saved or 0
+    latest = connection.execute(select(func.max(AssayMeasurement.id))).scalar() or 0
+
+    # Bounded by `latest` so measurements committed meanwhile are seen by the
+    # next refresh
+    animal_ids = set(connection.execute(
+        _measured_animals(AssayMeasurement.id > watermark, AssayMeasurement.id <= latest).distinct()
+    ).scalars())
+    if watermark and recheck:
+        animal_ids.update(_late_animals(connection, max(watermark - WATERMARK_WINDOW, 0),
+                                        watermark))
+    if not animal_ids and saved is not None and watermark >= latest:
+        return 0
+    written = _rebuild_animals(connection, sorted(animal_ids))
+    _save_watermark(connection, max(latest, watermark))
+    return written
+
+
+def rebuild_series(connection=None) -> int:
+    """
+    Rebuild every series from scratch
+
+    Needed after measurements are edited or deleted, which the incremental
+    refresh does not see.
+
+    Returns:
+        int: Number of series written
+    """
+    if connection is None:
+        with db.engine.begin() as connection:
+            return rebuild_series(connection)
+
+    latest = connection.execute(select(func.max(AssayMeasurement.id))).scalar() or 0
+    connection.execute(delete(MeasurementSeries.__table__))
+    animal_ids = connection.execute(_measured_animals().distinct()).scalars().all()
+    written = _rebuild_animals(connection, sorted(animal_ids))
+    _save_watermark(connection, latest)
+    return written
+
+
+def _to_series(row) -> Series:
+    timepoint_hours, values = decode_series(row.data, row.count)
+    return Series(row.animal_id, row.parameter_name, row.unit, timepoint_hours, values)
+
+
+def get_series(animal_id: int, parameter_name: str, session=None) -> Optional[Series]:
+    """
+    Look up one animal's series for a parameter
+
+    Args:
+        animal_id: Animal ID
+        parameter_name: Measured parameter, e.g. "Glucose"
+        session: Session to read with (defaults to db.session)
+
+    Returns:
+        Series, or None if the animal has no measurements of the parameter
+    """
+    session = session or db.session
+    row = session.execute(select(MeasurementSeries)
+                          .where(MeasurementSeries.animal_id == animal_id,
+                                 MeasurementSeries.parameter_name == parameter_name)).scalar()
+    return _to_series(row) if row is not None else None
+
+
+def get_animal_series(animal_id: int, session=None) -> Dict[str, Series]:
+    """Return every series of an animal keyed by parameter name"""
+    session = session or db.session
+    rows = session.execute(select(MeasurementSeries).where(MeasurementSeries.animal_id == animal_id)
+                           .order_by(MeasurementSeries.parameter_name)).scalars()
+    return {row.parameter_name: _to_series(row) for row in rows}
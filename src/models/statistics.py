@@ -0,0 +1,198 @@
+"""
+InvivoDB Summary Statistics
+
+This module computes the database overview shown on the dashboard and
+returned by /api/summary. Every figure is produced by a handful of
+aggregate statements instead of one COUNT(*) per number.
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional, List
+
+from sqlalchemy import case, exists, func, select
+from sqlalchemy.orm import aliased
+
+from models.database import (
+    db, Species, Animal, Therapy, Experiment, AssayType, Assay, AssayMeasurement
+)
+from models.cache import statistics_cache
+
+# Monthly activity window: 12 buckets of 30 days ending now
+MONTH_BUCKETS = 12
+MONTH_BUCKET_DAYS = 30
+RECENT_DAYS = 30
+
+# Tables the summary is computed from; a commit to any of them drops the
+# cached copy
+SUMMARY_CACHE_KEY = 'summary'
+SUMMARY_TABLES = (Species, Animal, Therapy, Experiment, AssayType, Assay)
+
+
+def _month_boundaries(now: datetime) -> List[datetime]:
+    """Return the MONTH_BUCKETS + 1 edges of the monthly activity buckets"""
+    return [now - timedelta(days=MONTH_BUCKET_DAYS * (MONTH_BUCKETS - i))
+            for i in range(MONTH_BUCKETS + 1)]
+
+
+def _monthly_counts(column, boundaries: List[datetime]) -> List[int]:
+    """
+    Count rows per monthly bucket with a single grouped query
+
+    Args:
+        column: The created_at column of the table to bucket
+        boundaries: Bucket edges as returned by _month_boundaries
+
+    Returns:
+        list: One count per bucket, oldest first
+    """
+    bucket = case(
+        *[(column < edge, index) for index, edge in enumerate(boundaries[1:-1])],
+        else_=MONTH_BUCKETS - 1
+    ).label('bucket')
+
+    rows = db.session.execute(
+        select(bucket, func.count())
+        .where(column >= boundaries[0], column < boundaries[-1])
+        .group_by(bucket)
+    ).all()
+
+    counts = [0] * MONTH_BUCKETS
+    for index, count in rows:
+        counts[index] = count
+    return counts
+
+
+def _totals(now: datetime) -> dict:
+    """Fetch every scalar count of the summary in one statement"""
+    thirty_days_ago = now - timedelta(days=RECENT_DAYS)
+
+    def count_of(model, *criteria):
+        return select(func.count(model.id)).where(*criteria).scalar_subquery()
+
+    row = db.session.execute(select(
+        count_of(Animal).label('total_animals'),
+        count_of(Experiment).label('total_experiments'),
+        count_of(Therapy).label('total_therapies'),
+        count_of(Assay).label('total_assays'),
+        count_of(Experiment, Experiment.created_at >= thirty_days_ago).label('recent_experiments'),
+        count_of(Experiment, Experiment.end_date.isnot(None)).label('complete_experiments'),
+        count_of(Experiment, exists().where(Assay.experiment_id == Experiment.id))
+        .label('experiments_with_assays'),
+        count_of(Animal,
+                 Animal.strain.isnot(None),
+                 Animal.age_at_start.isnot(None),
+                 Animal.weight_at_start.isnot(None)).label('animals_with_metadata'),
+    )).one()
+    return dict(row._mapping)
+
+
+def compute_summary(now: Optional[datetime] = None) -> dict:
+    """
+    Compute the database overview used by the dashboard and /api/summary
+
+    The whole summary costs five statements regardless of table sizes:
+    one for the scalar totals, one each for the species breakdown and the
+    assay distribution, and one grouped query per table for the monthly
+    activity buckets.
+
+    Args:
+        now: Reference time for the recent/monthly windows (defaults to utcnow)
+
+    Returns:
+        dict: Summary in the shape returned by /api/summary
+    """
+    now = now or datetime.utcnow()
+    totals = _totals(now)
+
+    species_data = (db.session.query(Species.common_name, func.count(Animal.id))
+                    .join(Animal)
+                    .group_by(Species.id)
+                    .all())
+
+    assay_type_data = (db.session.query(AssayType.category, func.count(Assay.id))
+                       .join(Assay)
+                       .group_by(AssayType.category)
+                       .all())
+
+    boundaries = _month_boundaries(now)
+    animal_counts = _monthly_counts(Animal.created_at, boundaries)
+    experiment_counts = _monthly_counts(Experiment.created_at, boundaries)
+    monthly_data = [{
+        'month': boundaries[i].strftime('%b'),
+        'animals': animal_counts[i],
+        'experiments': experiment_counts[i]
+    } for i in range(MONTH_BUCKETS)]
+
+    return {
+        'total_animals': totals['total_animals'],
+        'total_experiments': totals['total_experiments'],
+        'total_therapies': totals['total_therapies'],
+        'total_assays': totals['total_assays'],
+        'species_breakdown': {name: count for name, count in species_data},
+        'recent_experiments': totals['recent_experiments'],
+        'monthly_data': monthly_data,
+        'assay_distribution': {category: count for category, count in assay_type_data},
+        'data_quality': {
+            'complete_experiments': totals['complete_experiments'],
+            'experiments_with_assays': totals['experiments_with_assays'],
+            'animals_with_metadata': totals['animals_with_metadata']
+        }
+    }
+
+
+def compute_measurement_insights(experiment_id: int, limit: Optional[int] = None) -> List[dict]:
+    """
+    Summarize an experiment's measurements per parameter in one grouped query
+
+    Values are averaged in their canonical units (models.units). Parameters
+    with any missing value are skipped. The unit reported for a parameter is
+    the canonical unit of its first recorded measurement.
+
+    Args:
+        experiment_id: Experiment whose assays' measurements are summarized
+        limit: Keep only the most measured parameters
+
+    Returns:
+        list: Dicts with parameter, value (mean, 2 d.p.), unit, count, min, max,
+              most measured parameters first
+    """
+    # Canonical values, so a parameter entered in mg/dL and mmol/L averages
+    # correctly
+    value = func.coalesce(AssayMeasurement.canonical_value, AssayMeasurement.value)
+    grouped = (select(AssayMeasurement.parameter_name,
+                      func.count().label('count'),
+                      func.avg(value).label('mean'),
+                      func.min(value).label('min'),
+                      func.max(value).label('max'),
+                      func.min(AssayMeasurement.id).label('first_id'))
+               .join(Assay, Assay.id == AssayMeasurement.assay_id)
+               .where(Assay.experiment_id == experiment_id)
+               .group_by(AssayMeasurement.parameter_name)
+               .having(func.count(AssayMeasurement.value) == func.count())
+               .subquery())
+
+    first = aliased(AssayMeasurement)
+    statement = (select(grouped, func.coalesce(first.canonical_unit, first.unit).label('unit'))
+                 .join(first, first.id == grouped.c.first_id)
+                 .order_by(grouped.c.count.desc(), grouped.c.first_id)
+                 .limit(limit))
+
+    return [{
+        'parameter': row.parameter_name,
+        'value': round(row.mean, 2),
+        'unit': row.unit,
+        'count': row.count,
+        'min': row.min,
+        'max': row.max
+    } for row in db.session.execute(statement)]
+
+
+def get_summary() -> dict:
+    """
+    Return the database overview, served from the statistics cache
+
+    The cached copy is dropped when a commit writes to any of SUMMARY_TABLES,
+    so it is recomputed only after data entry (or when the TTL expires).
+    """
+    return statistics_cache.get_or_compute(SUMMARY_CACHE_KEY, compute_summary,
+                                           depends_on=SUMMARY_TABLES)
@@ -0,0 +1,360 @@
+"""
+InvivoDB Synthetic Dataset Generator
+
+This module fills every table with a reproducible, realistic-looking dataset
+for benchmarks and load tests. The same seed and scale always produce the
+same rows. One unit of scale is SCALE_UNIT_ANIMALS animals, which comes to
+roughly 1,300 experiments, 15,000 assays and 60,000 measurements; scale 165
+is about 10 million measurements.
+
+Distributions follow typical preclinical work: mostly mice, then rats, with
+a few macaques, dogs and hamsters. Studies run 2 to 13 weeks and are sampled
+at standard timepoints. Each timepoint gets a body-weight check and a
+chemistry panel, with hematology, cytokine and terminal histology panels
+added some of the time. Treated animals drift away from normal values.
+
+Reference rows (species, categories, therapies, assay types) are reused by
+name. Accession numbers come from the regular allocator, so counters stay
+consistent. Rows are written with bulk INSERTs in chunks, so memory stays
+flat at any scale.
+"""
+
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import func, insert, select
+
+from models.database import (
+    db, Species, Animal, TherapyCategory, Therapy, Experiment, AssayType, Assay, AssayMeasurement,
+    ExperimentResult, DataFile, ReferenceRange, experiment_therapy_association,
+    animal_assay_association, generate_accession_number, get_species_code
+)
+from models.accession import reserve_sequences
+from models.assay_ingest import compute_is_normal
+from models.cache import mark_tables_written
+from models.units import add_canonical_values
+
+SCALE_UNIT_ANIMALS = 1000
+DEFAULT_SEED = 42
+CHUNK_SIZE = 20000
+
+# Data is laid out over the STUDY_YEARS before this date, so runs are
+# reproducible
+REFERENCE_DATE = datetime(2025, 6, 1)
+STUDY_YEARS = 3
+
+# (common name, scientific name, taxonomy id, share of animals, strains,
+#  weight g, age weeks)
+SPECIES = (
+    ('Mouse', 'Mus musculus', '10090', 0.62,
+     ('C57BL/6', 'BALB/c', 'CD-1', 'NSG', 'FVB/N'), (18, 32), (6, 14)),
+    ('Rat', 'Rattus norvegicus', '10116', 0.24,
+     ('Sprague-Dawley', 'Wistar', 'Long-Evans'), (200, 420), (7, 12)),
+    ('Rhesus macaque', 'Macaca mulatta', '9544', 0.04,
+     ('Indian-origin', 'Chinese-origin'), (4000, 11000), (150, 420)),
+    ('Dog', 'Canis lupus familiaris', '9615', 0.04, ('Beagle',), (8000, 14000), (26, 104)),
+    ('Golden hamster', 'Mesocricetus auratus', '10036', 0.06, ('LVG',), (90, 150), (6, 10)),
+)
+
+# Category -> (description, mechanism of action,
+#              [(therapy, molecular target, route, vector)])
+THERAPY_CATALOG = {
+    'Gene Therapy': ('Therapeutic delivery of genetic material', 'Gene expression modulation', [
+        ('AAV9-SMN1', 'SMN1', 'IV', 'AAV9'), ('AAV8-FIX', 'Factor IX', 'IV', 'AAV8'),
+        ('LV-CAR19', 'CD19', 'IV', 'Lentivirus'), ('AAV2-RPE65', 'RPE65', 'Subretinal', 'AAV2'),
+    ]),
+    'Immunotherapy': ('Treatments that use the immune system', 'Immune system enhancement', [
+        ('Anti-PD-1 mAb', 'PD-1', 'IP', None), ('Anti-CTLA-4 mAb', 'CTLA-4', 'IP', None),
+        ('IL-2 immunocytokine', 'IL-2R', 'IV', None), ('Anti-TNF mAb', 'TNF-alpha', 'SC', None),
+    ]),
+    'Small Molecules': ('Low molecular weight drugs', 'Enzyme or receptor modulation', [
+        ('Metformin', 'AMPK', 'Oral', None), ('Rapamycin', 'mTOR', 'Oral', None),
+        ('Dexamethasone', 'Glucocorticoid receptor', 'IP', None),
+        ('Sorafenib', 'RAF/VEGFR', 'Oral', None),
+    ]),
+    'RNA Therapeutics': ('Oligonucleotide-based treatments', 'Transcript knockdown or splicing', [
+        ('siRNA-PCSK9', 'PCSK9', 'SC', 'LNP'), ('ASO-SOD1', 'SOD1', 'Intrathecal', None),
+        ('mRNA-EPO', 'EPO', 'IV', 'LNP'),
+    ]),
+}
+
+# Assay type -> (category, units,
+#                [(parameter, unit, reference min, reference max, mean, SD)])
+ASSAY_PANELS = {
+    'Body Weight': ('Physiological', 'g', [('Weight change', '%', -10.0, 10.0, 1.5, 4.0)]),
+    'Blood Chemistry': ('Biochemical', 'Various', [
+        ('Glucose', 'mg/dL', 70.0, 150.0, 110.0, 18.0), ('ALT', 'U/L', 20.0, 80.0, 45.0, 12.0),
+        ('AST', 'U/L', 50.0, 150.0, 95.0, 22.0), ('Creatinine', 'mg/dL', 0.2, 0.8, 0.45, 0.1),
+        ('BUN', 'mg/dL', 15.0, 30.0, 22.0, 3.5), ('Albumin', 'g/dL', 2.5, 4.8, 3.6, 0.35),
+        ('Cholesterol', 'mg/dL', 40.0, 130.0, 85.0, 16.0),
+    ]),
+    'Hematology': ('Hematological', 'Various', [
+        ('WBC', '10^3/uL', 2.0, 10.0, 6.0, 1.6), ('RBC', '10^6/uL', 7.0, 10.5, 8.8, 0.6),
+        ('Hemoglobin', 'g/dL', 12.0, 17.0, 14.5, 1.0), ('Hematocrit', '%', 36.0, 50.0, 43.0, 2.8),
+        ('Platelets', '10^3/uL', 600.0, 1500.0, 1000.0, 180.0),
+    ]),
+    'Cytokine Panel': ('Immunological', 'pg/mL', [
+        ('IL-6', 'pg/mL', 0.0, 25.0, 14.0, 9.0), ('TNF-alpha', 'pg/mL', 0.0, 20.0, 11.0, 7.0),
+        ('IFN-gamma', 'pg/mL', 0.0, 30.0, 15.0, 10.0), ('IL-10', 'pg/mL', 0.0, 40.0, 18.0, 11.0),
+    ]),
+    'Histology': ('Morphological', 'Score', [('Inflammation score', 'score', 0.0, 1.0, 0.8, 0.9)]),
+}
+CYTOKINE_DETECTION_LIMIT = 2.0
+
+# (label, hours from start); the final assessment is placed at the end of the
+# study
+TIMEPOINTS = (('Baseline', 0.0), ('Day 7', 168.0), ('Day 14', 336.0), ('Day 28', 672.0))
+FINAL_TIMEPOINT = 'End of study'
+
+STUDY_DESIGNS = ('Randomized', 'Controlled', 'Randomized controlled', 'Dose escalation',
+                 'Observational')
+ENDPOINTS = ('Tumor volume', 'Survival', 'Body weight', 'Serum biomarker', 'Behavioral score',
+             'Histopathology')
+STATISTICAL_METHODS = ('t-test', 'ANOVA', 'Mann-Whitney U', 'Mixed-effects model',
+                       'Log-rank test')
+DATA_AVAILABILITY = ('Public', 'Restricted', 'Private')
+OPERATORS = ('A. Smith', 'B. Chen', 'C. Okafor', 'D. Novak', 'E. Garcia', 'F. Tanaka')
+FILE_TYPES = (('CSV', '.csv'), ('Image', '.tiff'), ('Report', '.pdf'))
+
+
+class _BulkWriter:
+    """Buffers rows per table, flushed parent-first with executemany INSERTs"""
+
+    def __init__(self, session, tables: List, chunk_size: int = CHUNK_SIZE):
+        self.session = session
+        self.buffers = {table: [] for table in tables}
+        self.chunk_size = chunk_size
+        self.pending = 0
+        self.counts = Counter()
+
+    def add(self, table, row: dict):
+        self.buffers[table].append(row)
+        self.pending += 1
+        if self.pending >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        for table, rows in self.buffers.items():
+            if rows:
+                self.session.execute(insert(table), rows)
+                self.counts[getattr(table, '__tablename__', None) or table.name] += len(rows)
+                rows.clear()
+        self.pending = 0
+
+
+def _next_id(session, model) -> int:
+    return (session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _reference_ids(session, model, key_column, rows: List[dict]) -> Dict[str, int]:
+    """Return name -> id for reference rows, inserting the missing ones"""
+    existing = dict(session.execute(select(key_column, model.id)).tuples().all())
+    missing = [row for row in rows if row[key_column.key] not in existing]
+    if missing:
+        session.execute(insert(model), missing)
+        existing = dict(session.execute(select(key_column, model.id)).tuples().all())
+    return {row[key_column.key]: existing[row[key_column.key]] for row in rows}
+
+
+def _seed_reference_data(session, created_at: datetime) -> dict:
+    species_ids = _reference_ids(session, Species, Species.scientific_name, [
+        {'common_name': common, 'scientific_name': scientific, 'taxonomy_id': taxonomy_id,
+         'created_at': created_at}
+        for common, scientific, taxonomy_id, *_ in SPECIES])
+    category_ids = _reference_ids(session, TherapyCategory, TherapyCategory.name, [
+        {'name': name, 'description': description, 'mechanism_of_action': moa,
+         'created_at': created_at}
+        for name, (description, moa, _) in THERAPY_CATALOG.items()])
+    therapy_ids = _reference_ids(session, Therapy, Therapy.name, [
+        {'name': name, 'category_id': category_ids[category], 'molecular_target': target,
+         'administration_route': route, 'vector_type': vector, 'dosage': '1 mg/kg',
+         'description': f'{category} agent acting on {target}', 'created_at': created_at}
+        for category, (_, _, therapies) in THERAPY_CATALOG.items()
+        for name, target, route, vector in therapies])
+    assay_type_ids = _reference_ids(session, AssayType, AssayType.name, [
+        {'name': name, 'category': category, 'units': units, 'description': f'{name} panel',
+         'created_at': created_at}
+        for name, (category, units, _) in ASSAY_PANELS.items()])
+    # Species-level ranges matching the ones copied onto generated measurements
+    if not session.execute(select(func.count(ReferenceRange.id))).scalar():
+        session.execute(insert(ReferenceRange), [
+            {'species_id': species_id, 'parameter_name': parameter, 'unit': unit, 'range_min': low,
+             'range_max': high, 'source': 'Synthetic panel', 'created_at': created_at,
+             'updated_at': created_at}
+            for species_id in species_ids.values()
+            for _, _, panel in ASSAY_PANELS.values()
+            for parameter, unit, low, high, _, _ in panel])
+    return {'species': species_ids, 'therapies': list(therapy_ids.values()),
+            'assay_types': assay_type_ids}
+
+
+def _measurement_rows(rng: random.Random, assay_id: int, panel: list, effect: float,
+                      created_at: datetime) -> List[dict]:
+    rows = []
+    for parameter, unit, low, high, mean, sd in panel:
+        if low >= 0:
+            value = max(0.0, rng.gauss(mean * (1 + effect), sd))
+        else:
+            value = rng.gauss(mean + effect * 20, sd)
+        below_limit = unit == 'pg/mL' and value < CYTOKINE_DETECTION_LIMIT
+        value = round(value, 2)
+        rows.append({
+            'assay_id': assay_id, 'parameter_name': parameter, 'value': value, 'unit': unit,
+            'reference_range_min': low, 'reference_range_max': high,
+            'is_normal': compute_is_normal([value], [low], [high])[0],
+            'detection_limit': CYTOKINE_DETECTION_LIMIT if unit == 'pg/mL' else None,
+            'below_detection_limit': below_limit,
+            'dilution_factor': 1.0, 'created_at': created_at,
+        })
+    return add_canonical_values(rows)
+
+
+def generate_dataset(scale: float = 1.0, seed: int = DEFAULT_SEED, session=None,
+                     chunk_size: int = CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Generate a deterministic synthetic dataset and commit it
+
+    Args:
+        scale: Dataset size in units of SCALE_UNIT_ANIMALS animals
+        seed: Random seed; equal seeds and scales give identical data
+        session: Session to write with (defaults to db.session)
+        chunk_size: Rows buffered before each bulk INSERT
+
+    Returns:
+        dict: Rows inserted per table
+    """
+    session = session or db.session
+    rng = random.Random(seed)
+    start = REFERENCE_DATE - timedelta(days=365 * STUDY_YEARS)
+    window_minutes = int((REFERENCE_DATE - start).total_seconds() // 60)
+    reference = _seed_reference_data(session, start)
+
+    # Draw animals first so accession blocks can be reserved once per species
+    # and year
+    animal_count = max(1, round(SCALE_UNIT_ANIMALS * scale))
+    species_weights = [share for _, _, _, share, *_ in SPECIES]
+    animals = []
+    for _ in range(animal_count):
+        species = rng.choices(SPECIES, weights=species_weights)[0]
+        created_at = start + timedelta(minutes=rng.randrange(window_minutes))
+        animals.append((species, created_at))
+    animals.sort(key=lambda animal: animal[1])
+
+    blocks = Counter((get_species_code(species[1]), created_at.year)
+                     for species, created_at in animals)
+    sequences = {key: iter(reserve_sequences(*key, count, session=session))
+                 for key, count in blocks.items()}
+
+    writer = _BulkWriter(session, [Animal, Experiment, experiment_therapy_association, Assay,
+                                   animal_assay_association, AssayMeasurement, ExperimentResult,
+                                   DataFile], chunk_size)
+    animal_id = _next_id(session, Animal)
+    experiment_id = _next_id(session, Experiment)
+    assay_id = _next_id(session, Assay)
+    panels = [(reference['assay_types'][name], panel)
+              for name, (_, _, panel) in ASSAY_PANELS.items()]
+    weight, chemistry, hematology, cytokines, histology = panels
+
+    for (common, scientific, _, _, strains, weight_range, age_range), created_at in animals:
+        code = get_species_code(scientific)
+        writer.add(Animal, {
+            'id': animal_id,
+            'accession_number': generate_accession_number(code, created_at.year,
+                                                          next(sequences[(code, created_at.year)])),
+            'species_id': reference['species'][scientific],
+            'strain': rng.choice(strains),
+            'sex': rng.choice(('Male', 'Female')),
+            'age_at_start': round(rng.uniform(*age_range), 1),
+            'weight_at_start': round(rng.uniform(*weight_range), 1),
+            'housing_conditions': '12h light/dark cycle, ad libitum food and water',
+            'ethical_approval': f'IACUC-{created_at.year}-{rng.randint(1, 60):03d}',
+            'created_at': created_at, 'updated_at': created_at,
+        })
+
+        for _ in range(1 if rng.random() < 0.7 else 2):
+            start_date = created_at + timedelta(days=rng.randint(0, 21))
+            duration = rng.randint(14, 90)
+            ongoing = start_date + timedelta(days=duration) > REFERENCE_DATE or rng.random() < 0.08
+            therapies = rng.sample(reference['therapies'], rng.choice((1, 1, 2, 3)))
+            control = rng.random() < 0.25
+            effect = 0.0 if control else rng.uniform(-0.15, 0.35)
+            writer.add(Experiment, {
+                'id': experiment_id, 'animal_id': animal_id,
+                'title': f'{common} {rng.choice(ENDPOINTS).lower()} study {experiment_id}',
+                'start_date': start_date,
+                'end_date': None if ongoing else start_date + timedelta(days=duration),
+                'duration_days': duration,
+                'study_design': rng.choice(STUDY_DESIGNS),
+                'primary_endpoint': rng.choice(ENDPOINTS),
+                'statistical_method': rng.choice(STATISTICAL_METHODS),
+                'sample_size': rng.choice((6, 8, 10, 12, 16, 20)),
+                'blinding': rng.random() < 0.4, 'randomization': rng.random() < 0.6,
+                'control_group': 'Vehicle' if control else None,
+                'notes': f'Cohort {rng.randint(1, 40)}; '
+                         f'{"control arm" if control else "treatment arm"}',
+                'data_availability': rng.choice(DATA_AVAILABILITY),
+                'created_at': start_date, 'updated_at': start_date,
+            })
+            for therapy_id in therapies:
+                writer.add(experiment_therapy_association,
+                           {'experiment_id': experiment_id, 'therapy_id': therapy_id})
+
+            timepoints = list(TIMEPOINTS[:rng.randint(2, len(TIMEPOINTS))])
+            if not ongoing:
+                timepoints.append((FINAL_TIMEPOINT, duration * 24.0))
+            for index, (timepoint, hours) in enumerate(timepoints):
+                assayed_at = start_date + timedelta(hours=hours)
+                drift = effect * index / len(timepoints)
+                selected = [weight, chemistry]
+                if rng.random() < 0.6:
+                    selected.append(hematology)
+                if rng.random() < 0.3:
+                    selected.append(cytokines)
+                if timepoint == FINAL_TIMEPOINT and rng.random() < 0.5:
+                    selected.append(histology)
+                for assay_type_id, panel in selected:
+                    writer.add(Assay, {
+                        'id': assay_id, 'experiment_id': experiment_id,
+                        'assay_type_id': assay_type_id,
+                        'timepoint': timepoint, 'timepoint_hours': hours,
+                        'operator': rng.choice(OPERATORS),
+                        'batch_id': f'B{assayed_at:%y%m}-{rng.randint(1, 9)}',
+                        'quality_control_passed': rng.random() > 0.03, 'created_at': assayed_at,
+                    })
+                    writer.add(animal_assay_association,
+                               {'animal_id': animal_id, 'assay_id': assay_id})
+                    for row in _measurement_rows(rng, assay_id, panel, drift, assayed_at):
+                        writer.add(AssayMeasurement, row)
+                    assay_id += 1
+
+            if not ongoing and rng.random() < 0.8:
+                p_value = round(rng.betavariate(0.6, 3.0), 4)
+                writer.add(ExperimentResult, {
+                    'experiment_id': experiment_id,
+                    'primary_outcome': ('Endpoint improved versus control' if effect > 0.1
+                                        else 'No significant change'),
+                    'statistical_significance': p_value < 0.05, 'p_value': p_value,
+                    'effect_size': round(effect * 2, 3),
+                    'mortality_rate': round(rng.uniform(0, 15), 1),
+                    'efficacy_score': round(max(0.0, min(10.0, 5 + effect * 12
+                                                         + rng.gauss(0, 1))), 2),
+                    'created_at': start_date + timedelta(days=duration),
+                })
+            for file_type, extension in rng.sample(FILE_TYPES, rng.randint(0, 2)):
+                writer.add(DataFile, {
+                    'experiment_id': experiment_id,
+                    'filename': f'experiment_{experiment_id}_{file_type.lower()}{extension}',
+                    'file_type': file_type, 'file_size': rng.randint(10_000, 50_000_000),
+                    'checksum': f'{rng.getrandbits(256):064x}', 'is_processed': rng.random() < 0.7,
+                    'uploaded_at': start_date,
+                })
+            experiment_id += 1
+        animal_id += 1
+
+    writer.flush()
+    mark_tables_written(session, Species, TherapyCategory, Therapy, AssayType, ReferenceRange,
+                        *writer.buffers)
+    session.commit()
+    return dict(writer.counts)
@@ -0,0 +1,257 @@
+"""
+InvivoDB Unit Normalization
+
+This module maps the free-text units measurements are entered with to a
+canonical unit per parameter, so values of the same parameter can be
+compared and aggregated across experiments. Units are grouped by dimension
+with a factor to the dimension's base unit; mass and molar concentrations
+convert into each other for parameters with a known molar mass. Spelling
+variants (mg/dl, umol/L, 10^3/uL, IU/L) are resolved through aliases.
+
+Conversions are cached per (parameter, unit). Units the registry does not
+know, and parameters measured in a unit of another dimension, are kept as
+entered (factor 1).
+
+canonical_value/canonical_unit are stored on every measurement by the
+write paths; backfill_canonical_values converts existing rows in batches.
+"""
+
+import time
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, or_, select, update
+
+from models.cache import mark_tables_written
+from models.conditional import touch_validators
+from models.database import db, AssayMeasurement
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+DEFAULT_BATCH_SIZE = 20000
+
+# Dimension -> {unit: factor to the dimension's base unit}; the first unit is
+# the default canonical unit
+DIMENSIONS = {
+    'mass_concentration': {'mg/dL': 1e-2, 'g/L': 1.0, 'g/dL': 10.0, 'mg/L': 1e-3, 'mg/mL': 1.0,
+                           'µg/mL': 1e-3, 'µg/dL': 1e-5, 'µg/L': 1e-6, 'ng/mL': 1e-6, 'ng/L': 1e-9,
+                           'pg/mL': 1e-9},
+    'molar_concentration': {'mmol/L': 1e-3, 'mol/L': 1.0, 'µmol/L': 1e-6, 'nmol/L': 1e-9,
+                            'pmol/L': 1e-12},
+    'cell_concentration': {'10^3/µL': 1.0, '10^9/L': 1.0, '10^6/µL': 1e3, '10^12/L': 1e3,
+                           '/µL': 1e-3},
+    'enzyme_activity': {'U/L': 1.0, 'µkat/L': 60.0, 'U/mL': 1e3},
+    'mass': {'g': 1.0, 'kg': 1e3, 'mg': 1e-3},
+    'time': {'h': 1.0, 'min': 1 / 60, 'd': 24.0},
+}
+
+UNIT_ALIASES = {
+    'mg/dl': 'mg/dL', 'g/l': 'g/L', 'g/dl': 'g/dL', 'mg/l': 'mg/L', 'mg/ml': 'mg/mL',
+    'ug/mL': 'µg/mL', 'μg/mL': 'µg/mL', 'ug/ml': 'µg/mL', 'ug/dL': 'µg/dL', 'ug/L': 'µg/L',
+    'ng/ml': 'ng/mL', 'pg/ml': 'pg/mL',
+    'mmol/l': 'mmol/L', 'mM': 'mmol/L', 'umol/L': 'µmol/L', 'μmol/L': 'µmol/L', 'umol/l': 'µmol/L',
+    'µM': 'µmol/L', 'uM': 'µmol/L', 'nmol/l': 'nmol/L', 'nM': 'nmol/L', 'pmol/l': 'pmol/L',
+    '10^3/uL': '10^3/µL', '10^3/μL': '10^3/µL', 'K/uL': '10^3/µL', 'K/µL': '10^3/µL',
+    'x10^9/L': '10^9/L',
+    '10^6/uL': '10^6/µL', '10^6/μL': '10^6/µL', 'M/uL': '10^6/µL', 'M/µL': '10^6/µL',
+    'x10^12/L': '10^12/L',
+    'cells/uL': '/µL', 'cells/µL': '/µL',
+    'IU/L': 'U/L', 'u/l': 'U/L', 'U/l': 'U/L', 'ukat/L': 'µkat/L',
+    'grams': 'g', 'gram': 'g', 'hours': 'h', 'hr': 'h', 'days': 'd',
+}
+
+# Molar masses (g/mol) of parameters reported in both mass and molar units
+MOLAR_MASSES = {
+    'Glucose': 180.16,
+    'Cholesterol': 386.65,
+    'Triglycerides': 885.7,
+    'Creatinine': 113.12,
+    'BUN': 28.014,  # Urea nitrogen: reported per mol of urea, two N atoms
+    'Urea': 60.06,
+    'Calcium': 40.08,
+    'Bilirubin': 584.66,
+    'Uric acid': 168.11,
+}
+
+# Canonical unit of parameters whose convention differs from their
+# dimension's default
+CANONICAL_UNITS = {
+    'Albumin': 'g/dL',
+    'Hemoglobin': 'g/dL',
+    'Total protein': 'g/dL',
+    'RBC': '10^6/µL',
+    'IL-6': 'pg/mL', 'IL-10': 'pg/mL', 'TNF-alpha': 'pg/mL', 'IFN-gamma': 'pg/mL',
+}
+
+_UNIT_DIMENSIONS = {unit: dimension for dimension, units in DIMENSIONS.items() for unit in units}
+
+
+def normalize_unit_name(unit: Optional[str]) -> Optional[str]:
+    """Registry spelling of a unit (unknown units are only stripped)"""
+    if unit is None:
+        return None
+    unit = unit.strip()
+    return UNIT_ALIASES.get(unit, unit) or None
+
+
+def conversion_factor(parameter_name: Optional[str], from_unit: Optional[str],
+                      to_unit: Optional[str]) -> Optional[float]:
+    """
+    Factor converting values of a parameter from one unit to another
+
+    Returns:
+        float: value_in_to_unit = value_in_from_unit * factor, or None if the
+               units are not convertible for this parameter
+    """
+    return _conversion_factor(parameter_name, normalize_unit_name(from_unit),
+                              normalize_unit_name(to_unit))
+
+
+@lru_cache(maxsize=None)
+def _conversion_factor(parameter_name, from_unit, to_unit) -> Optional[float]:
+    if from_unit == to_unit:
+        return 1.0
+    from_dimension, to_dimension = _UNIT_DIMENSIONS.get(from_unit), _UNIT_DIMENSIONS.get(to_unit)
+    if from_dimension is None or to_dimension is None:
+        return None
+    factor = DIMENSIONS[from_dimension][from_unit] / DIMENSIONS[to_dimension][to_unit]
+    if from_dimension == to_dimension:
+        return factor
+    molar_mass = MOLAR_MASSES.get(parameter_name)
+    if molar_mass is None:
+        return None
+    # Base units are g/L and mol/L: 1 mol/L of the analyte is molar_mass g/L
+    if (from_dimension, to_dimension) == ('molar_concentration', 'mass_concentration'):
+        return factor * molar_mass
+    if (from_dimension, to_dimension) == ('mass_concentration', 'molar_concentration'):
+        return factor / molar_mass
+    return None
+
+
+@lru_cache(maxsize=None)
+def canonical_conversion(parameter_name: Optional[str],
+                         unit: Optional[str]) -> Tuple[float, Optional[str]]:
+    """
+    (factor, canonical unit) for values of a parameter entered in unit
+
+    The canonical unit is the parameter's entry in CANONICAL_UNITS, else the
+    mass concentration default for parameters with a molar mass, else the
+    default unit of the unit's dimension; unknown units stay as entered.
+    """
+    unit = normalize_unit_name(unit)
+    dimension = _UNIT_DIMENSIONS.get(unit)
+    targets = [CANONICAL_UNITS.get(parameter_name)]
+    if parameter_name in MOLAR_MASSES:
+        targets.append(next(iter(DIMENSIONS['mass_concentration'])))
+    if dimension is not None:
+        targets.append(next(iter(DIMENSIONS[dimension])))
+    for target in targets:
+        if target is not None:
+            factor = _conversion_factor(parameter_name, unit, target)
+            if factor is not None:
+                return factor, target
+    return 1.0, unit
+
+
+def canonical_values(parameter_names: Sequence[Optional[str]],
+                     values: Sequence[Optional[float]],
+                     units: Sequence[Optional[str]]
+                     ) -> Tuple[List[Optional[float]], List[Optional[str]]]:
+    """
+    Convert many values to their parameters' canonical units at once
+
+    Returns:
+        tuple: (canonical values, canonical units); missing values stay None
+    """
+    conversions = [canonical_conversion(parameter, unit)
+                   for parameter, unit in zip(parameter_names, units)]
+    canonical_units = [unit for _, unit in conversions]
+    if np is not None and len(values):
+        raw = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        converted = raw * np.array([factor for factor, _ in conversions], dtype=np.float64)
+        return [None if value != value else value for value in converted.tolist()], canonical_units
+    return ([None if value is None else value * factor
+             for value, (factor, _) in zip(values, conversions)], canonical_units)
+
+
+def add_canonical_values(rows: List[dict]) -> List[dict]:
+    """Fill canonical_value/canonical_unit of measurement row dicts in place"""
+    converted, units = canonical_values([row.get('parameter_name') for row in rows],
+                                        [row.get('value') for row in rows],
+                                        [row.get('unit') for row in rows])
+    for row, value, unit in zip(rows, converted, units):
+        row['canonical_value'] = value
+        row['canonical_unit'] = unit
+    return rows
+
+
+def _finish(result: Dict, start: float):
+    result['seconds'] = time.perf_counter() - start
+    result['rows_per_second'] = result['scanned'] / result['seconds'] if result['seconds'] else 0.0
+
+
+def backfill_canonical_values(session=None, batch_size: int = DEFAULT_BATCH_SIZE,
+                              full: bool = False,
+                              progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Store canonical values on existing measurements in committed batches
+
+    Rows are read in id order, converted together and written with one
+    executemany UPDATE per batch. Rows already converted are skipped, so an
+    interrupted run simply continues; full=True converts every row again
+    (after the registry changed).
+
+    Args:
+        session: Session to use (defaults to db.session)
+        batch_size: Measurements converted per committed batch
+        full: Convert rows that already have a canonical value too
+        progress: Called with the running totals after every batch
+
+    Returns:
+        dict: scanned, converted (value changed by the conversion), batches,
+              seconds and rows_per_second
+    """
+    session = session or db.session
+    table = AssayMeasurement.__table__
+    query = select(table.c.id, table.c.parameter_name, table.c.value, table.c.unit)
+    if not full:
+        query = query.where(table.c.canonical_unit.is_(None), table.c.canonical_value.is_(None),
+                            or_(table.c.unit.isnot(None), table.c.value.isnot(None)))
+    statement = (update(table).where(table.c.id == bindparam('measurement_id'))
+                 .values(canonical_value=bindparam('new_value'),
+                         canonical_unit=bindparam('new_unit')))
+
+    result = {'scanned': 0, 'converted': 0, 'batches': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+    start = time.perf_counter()
+    last_id = 0
+    while True:
+        rows = session.execute(query.where(table.c.id > last_id)
+                               .order_by(table.c.id).limit(batch_size)).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        ids, parameters, values, units = zip(*rows)
+        converted, canonical_units = canonical_values(parameters, values, units)
+        session.execute(statement, [
+            {'measurement_id': measurement_id, 'new_value': value, 'new_unit': unit}
+            for measurement_id, value, unit in zip(ids, converted, canonical_units)
+        ])
+        mark_tables_written(session, AssayMeasurement)
+        session.commit()
+
+        result['scanned'] += len(rows)
+        result['converted'] += sum(1 for before, after in zip(values, converted) if before != after)
+        result['batches'] += 1
+        _finish(result, start)
+        if progress:
+            progress(result)
+
+    if result['scanned']:
+        # Pages showing the converted rows must not be answered with 304
+        touch_validators(session)
+        session.commit()
+    _finish(result, start)
+    return result
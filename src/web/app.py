@@ -6,9 +6,17 @@ Provides a user-friendly interface for browsing and managing
 in vivo experimental data.
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import (
+    Blueprint, Flask, Response, render_template, request, jsonify, redirect, url_for, flash,
+    stream_with_context
+)
+import click
 from flask_sqlalchemy import SQLAlchemy
+from markupsafe import Markup
+from sqlalchemy.orm import contains_eager, joinedload
 from datetime import datetime, timedelta
+import io
+import json
 import os
 import sys
 
@@ -21,47 +29,47 @@ from models.database import (
     ExperimentResult, generate_accession_number, get_species_code, 
     validate_accession_number, parse_accession_number
 )
+from models.statistics import get_summary, compute_measurement_insights
+from models.cache import statistics_cache
+from models.autocomplete import autocomplete_index
+from models.catalog import rendered_catalog
+from models.conditional import (
+    conditional, animal_version, experiment_version, assay_version, tables_version,
+    PAGE_CACHE_CONTROL, SUMMARY_CACHE_CONTROL
+)
+from models.search import search_experiments, rebuild_search_index
+from models.series import refresh_series, rebuild_series
+from models.features import write_feature_matrix, FEATURE_EXPORT_FORMATS, ROW_MODES
+from models.reference_ranges import reflag_measurements
+from models.units import canonical_values, backfill_canonical_values
+from models.pagination import paginate_keyset
+from models.accession import allocate_accession_number
+from models.bulk_import import import_animals, SUPPORTED_FORMATS
+from models.assay_ingest import ingest_assays, AssayIngestError
+from models.export import stream_measurements, write_measurements, EXPORT_FORMATS
+from models.synthetic import generate_dataset, DEFAULT_SEED
+from models import metrics
+from models.engine import (
+    DEFAULT_PROFILE, READ_ENGINE_KEY, create_read_engine, get_profile, install_sqlite_pragmas
+)
+from api.rest import api_bp
 
-# Initialize Flask app
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'dev-secret-key-change-in-production'
-
-# Database configuration - using SQLite for the prototype
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///invivodb.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize SQLAlchemy
-db.init_app(app)
-
-# Configure the database to use our models
-with app.app_context():
-    # Import models to ensure they're registered with SQLAlchemy
-    db.create_all()
+# Routes, error handlers and CLI commands; create_app() registers them on an app
+bp = Blueprint('main', __name__, cli_group=None)
 
 
-@app.route('/')
+@bp.route('/')
 def landing():
     """Application landing page with a prominent search bar."""
     return render_template('landing.html')
 
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 def dashboard():
     """Home page with database overview (formerly the index)."""
     try:
         # Get summary statistics
-        total_animals = Animal.query.count()
-        total_experiments = Experiment.query.count()
-        total_therapies = Therapy.query.count()
-        total_assays = Assay.query.count()
-        
-        # Get species breakdown
-        species_data = db.session.query(Species.common_name, db.func.count(Animal.id)).join(Animal).group_by(Species.id).all()
-        species_breakdown = {name: count for name, count in species_data}
-        
-        # Get recent experiments (last 30 days)
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_experiments = Experiment.query.filter(Experiment.created_at >= thirty_days_ago).count()
+        summary = get_summary()
         
         # Get recent experiments for display
         recent_exp_list = (Experiment.query
@@ -72,12 +80,12 @@ def dashboard():
                           .all())
         
         return render_template('index.html',
-                             total_animals=total_animals,
-                             total_experiments=total_experiments,
-                             total_therapies=total_therapies,
-                             total_assays=total_assays,
-                             species_breakdown=species_breakdown,
-                             recent_experiments=recent_experiments,
+                             total_animals=summary['total_animals'],
+                             total_experiments=summary['total_experiments'],
+                             total_therapies=summary['total_therapies'],
+                             total_assays=summary['total_assays'],
+                             species_breakdown=summary['species_breakdown'],
+                             recent_experiments=summary['recent_experiments'],
                              recent_exp_list=recent_exp_list)
     except Exception as e:
         flash(f'Error loading dashboard: {str(e)}', 'error')
@@ -91,21 +99,25 @@ def dashboard():
                              recent_exp_list=[])
 
 
-@app.route('/animals')
+@bp.route('/animals')
 def animals():
     """List all animals"""
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 20
     
-    animals_query = Animal.query.join(Species).order_by(Animal.created_at.desc())
-    animals_paginated = animals_query.paginate(
-        page=page, per_page=per_page, error_out=False
+    animals_query = Animal.query.join(Species)
+    animals_paginated = paginate_keyset(
+        animals_query, [(Animal.created_at, True), (Animal.id, True)],
+        cursor=cursor, per_page=per_page, page=page,
+        total=lambda: get_summary()['total_animals']
     )
     
     return render_template('animals.html', animals=animals_paginated)
 
 
-@app.route('/animals/<int:animal_id>')
+@bp.route('/animals/<int:animal_id>')
+@conditional(animal_version, PAGE_CACHE_CONTROL)
 def animal_detail(animal_id):
     """Show detailed information about a specific animal"""
     animal = Animal.query.get_or_404(animal_id)
@@ -114,23 +126,27 @@ def animal_detail(animal_id):
     return render_template('animal_detail.html', animal=animal, experiments=experiments)
 
 
-@app.route('/experiments')
+@bp.route('/experiments')
 def experiments():
     """List all experiments with filtering options"""
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     species_filter = request.args.get('species_id', type=int)
     per_page = 20
     
     experiments_query = (Experiment.query
                         .join(Animal)
-                        .join(Species)
-                        .order_by(Experiment.start_date.desc()))
+                        .join(Species))
     
     if species_filter:
         experiments_query = experiments_query.filter(Species.id == species_filter)
     
-    experiments_paginated = experiments_query.paginate(
-        page=page, per_page=per_page, error_out=False
+    # The unfiltered total comes from the statistics cache; filtered totals
+    # are skipped
+    experiments_paginated = paginate_keyset(
+        experiments_query, [(Experiment.start_date, True), (Experiment.id, True)],
+        cursor=cursor, per_page=per_page, page=page,
+        total=None if species_filter else lambda: get_summary()['total_experiments']
     )
     
     # Get species for filter dropdown
@@ -142,7 +158,8 @@ def experiments():
                          selected_species=species_filter)
 
 
-@app.route('/experiments/<int:experiment_id>')
+@bp.route('/experiments/<int:experiment_id>')
+@conditional(experiment_version, PAGE_CACHE_CONTROL)
 def experiment_detail(experiment_id):
     """Show detailed information about a specific experiment"""
     experiment = Experiment.query.get_or_404(experiment_id)
@@ -155,24 +172,20 @@ def experiment_detail(experiment_id):
                          results=results)
 
 
-@app.route('/therapies')
+@bp.route('/therapies')
 def therapies():
     """Innovative catalogue of all therapies grouped by category"""
     search_query = request.args.get('q', '').strip()
-    categories = TherapyCategory.query.order_by(TherapyCategory.name).all()
-    grouped_therapies = {}
-    for category in categories:
-        therapies_query = Therapy.query.filter_by(category_id=category.id).order_by(Therapy.name)
-        if search_query:
-            therapies_query = therapies_query.filter(Therapy.name.ilike(f'%{search_query}%'))
-        grouped_therapies[category] = therapies_query.all()
+    # Rendered once per search term; therapy and category commits drop the
+    # cached HTML
+    catalog_html = rendered_catalog(
+        search_query, lambda catalog: render_template('therapy_catalog.html', catalog=catalog))
     return render_template('therapies.html',
-                          grouped_therapies=grouped_therapies,
-                          categories=categories,
+                          catalog_html=Markup(catalog_html),
                           search_query=search_query)
 
 
-@app.route('/add_animal', methods=['GET', 'POST'])
+@bp.route('/add_animal', methods=['GET', 'POST'])
 def add_animal():
     """Add a new animal to the database"""
     if request.method == 'POST':
@@ -190,28 +203,13 @@ def add_animal():
             species = Species.query.get(species_id)
             if not species:
                 flash('Invalid species selected', 'error')
-                return redirect(url_for('add_animal'))
+                return redirect(url_for('main.add_animal'))
             
             species_code = get_species_code(species.scientific_name)
             current_year = datetime.now().year
             
-            # Find the next sequence number for this species and year
-            last_animal = Animal.query.filter(
-                Animal.accession_number.like(f"{species_code}{current_year}%")
-            ).order_by(Animal.accession_number.desc()).first()
-            
-            if last_animal:
-                # Parse the last accession number to get the sequence
-                try:
-                    parsed = parse_accession_number(last_animal.accession_number)
-                    sequence = parsed['sequence'] + 1
-                except ValueError:
-                    # Fallback: start from 1 if parsing fails
-                    sequence = 1
-            else:
-                sequence = 1
-            
-            accession_number = generate_accession_number(species_code, current_year, sequence)
+            # Reserve the next sequence for this species and year
+            accession_number = allocate_accession_number(species_code, current_year)
             
             # Create new animal
             animal = Animal(
@@ -230,40 +228,56 @@ def add_animal():
             db.session.commit()
             
             flash(f'Animal {accession_number} added successfully!', 'success')
-            return redirect(url_for('animals'))
+            return redirect(url_for('main.animals'))
             
         except Exception as e:
             db.session.rollback()
             flash(f'Error adding animal: {str(e)}', 'error')
-            return redirect(url_for('add_animal'))
+            return redirect(url_for('main.add_animal'))
     
     # GET request - show form
     species_list = Species.query.all()
     return render_template('add_animal.html', species_list=species_list)
 
 
-@app.route('/search')
+@bp.route('/api/animals/import', methods=['POST'])
+def api_import_animals():
+    """Bulk-import animals from an uploaded CSV or JSONL file"""
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'No file uploaded (expected form field "file")'}), 400
+    
+    fmt = (request.form.get('format')
+           or os.path.splitext(upload.filename or '')[1].lstrip('.').lower())
+    if fmt not in SUPPORTED_FORMATS:
+        expected = ', '.join(SUPPORTED_FORMATS)
+        return jsonify({'error': f'Unsupported format "{fmt}", expected one of {expected}'}), 400
+    
+    try:
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        report = import_animals(stream, fmt=fmt,
+                                batch_size=request.form.get('batch_size', 5000, type=int))
+        return jsonify(report.to_dict())
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/search')
 def search():
     """Search functionality across experiments"""
     query = request.args.get('q', '')
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 20
     
     if query:
-        # Search in experiment titles, notes, and animal accession numbers
-        search_filter = f'%{query}%'
-        experiments_query = (Experiment.query
-                           .join(Animal)
-                           .join(Species)
-                           .filter(
-                               (Experiment.title.like(search_filter)) |
-                               (Experiment.notes.like(search_filter)) |
-                               (Animal.accession_number.like(search_filter))
-                           )
-                           .order_by(Experiment.start_date.desc()))
+        # Ranked full-text search over experiments, therapies and accession
+        # numbers
+        experiments_query, sort_keys = search_experiments(query, ordered=False)
         
-        experiments_paginated = experiments_query.paginate(
-            page=page, per_page=per_page, error_out=False
+        experiments_paginated = paginate_keyset(
+            experiments_query, sort_keys, cursor=cursor, per_page=per_page, page=page
         )
     else:
         experiments_paginated = None
@@ -273,86 +287,25 @@ def search():
                          query=query)
 
 
-@app.route('/api/summary')
+def _summary_version():
+    """The summary is cached, so its own JSON serves as its version"""
+    try:
+        return (json.dumps(get_summary(), sort_keys=True, default=str),)
+    except Exception:
+        return None  # api_summary reports the error
+
+
+@bp.route('/api/summary')
+@conditional(_summary_version, SUMMARY_CACHE_CONTROL)
 def api_summary():
     """API endpoint for dashboard summary data"""
     try:
-        total_animals = Animal.query.count()
-        total_experiments = Experiment.query.count()
-        total_therapies = Therapy.query.count()
-        total_assays = Assay.query.count()
-        
-        # Species breakdown
-        species_data = db.session.query(Species.common_name, db.func.count(Animal.id)).join(Animal).group_by(Species.id).all()
-        species_breakdown = {name: count for name, count in species_data}
-        
-        # Recent experiments
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_experiments = Experiment.query.filter(Experiment.created_at >= thirty_days_ago).count()
-        
-        # Monthly activity data (last 12 months)
-        monthly_data = []
-        for i in range(12):
-            month_start = datetime.utcnow() - timedelta(days=30*(12-i))
-            month_end = month_start + timedelta(days=30)
-            
-            animals_count = Animal.query.filter(
-                Animal.created_at >= month_start,
-                Animal.created_at < month_end
-            ).count()
-            
-            experiments_count = Experiment.query.filter(
-                Experiment.created_at >= month_start,
-                Experiment.created_at < month_end
-            ).count()
-            
-            monthly_data.append({
-                'month': month_start.strftime('%b'),
-                'animals': animals_count,
-                'experiments': experiments_count
-            })
-        
-        # Assay type distribution
-        assay_type_data = db.session.query(
-            AssayType.category, 
-            db.func.count(Assay.id)
-        ).join(Assay).group_by(AssayType.category).all()
-        
-        assay_distribution = {category: count for category, count in assay_type_data}
-        
-        # Data quality metrics
-        complete_experiments = Experiment.query.filter(
-            Experiment.end_date.isnot(None)
-        ).count()
-        
-        experiments_with_assays = Experiment.query.join(Assay).distinct().count()
-        
-        animals_with_metadata = Animal.query.filter(
-            Animal.strain.isnot(None),
-            Animal.age_at_start.isnot(None),
-            Animal.weight_at_start.isnot(None)
-        ).count()
-        
-        return jsonify({
-            'total_animals': total_animals,
-            'total_experiments': total_experiments,
-            'total_therapies': total_therapies,
-            'total_assays': total_assays,
-            'species_breakdown': species_breakdown,
-            'recent_experiments': recent_experiments,
-            'monthly_data': monthly_data,
-            'assay_distribution': assay_distribution,
-            'data_quality': {
-                'complete_experiments': complete_experiments,
-                'experiments_with_assays': experiments_with_assays,
-                'animals_with_metadata': animals_with_metadata
-            }
-        })
+        return jsonify(get_summary())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/add_experiment', methods=['GET', 'POST'])
+@bp.route('/add_experiment', methods=['GET', 'POST'])
 def add_experiment():
     """Add a new experiment to the database"""
     if request.method == 'POST':
@@ -412,32 +365,36 @@ def add_experiment():
             db.session.commit()
             
             flash(f'Experiment "{title}" added successfully!', 'success')
-            return redirect(url_for('experiments'))
+            return redirect(url_for('main.experiments'))
             
         except Exception as e:
             db.session.rollback()
             flash(f'Error adding experiment: {str(e)}', 'error')
-            return redirect(url_for('add_experiment'))
+            return redirect(url_for('main.add_experiment'))
     
     # GET request - show form
     species_list = Species.query.all()
     return render_template('add_experiment.html', species_list=species_list)
 
 
-@app.route('/assay_types')
+@bp.route('/assay_types')
 def assay_types():
     """List all assay types"""
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     category_filter = request.args.get('category', '')
     per_page = 20
     
-    assay_types_query = AssayType.query.order_by(AssayType.name)
+    assay_types_query = AssayType.query
     
     if category_filter:
         assay_types_query = assay_types_query.filter(AssayType.category == category_filter)
     
-    assay_types_paginated = assay_types_query.paginate(
-        page=page, per_page=per_page, error_out=False
+    # The assay type catalogue is small, so an exact total stays cheap
+    assay_types_paginated = paginate_keyset(
+        assay_types_query, [(AssayType.name, False), (AssayType.id, False)],
+        cursor=cursor, per_page=per_page, page=page,
+        total=assay_types_query.count
     )
     
     # Get unique categories for filter
@@ -450,7 +407,7 @@ def assay_types():
                          selected_category=category_filter)
 
 
-@app.route('/add_assay_type', methods=['GET', 'POST'])
+@bp.route('/add_assay_type', methods=['GET', 'POST'])
 def add_assay_type():
     """Add a new assay type"""
     if request.method == 'POST':
@@ -465,7 +422,7 @@ def add_assay_type():
             existing = AssayType.query.filter_by(name=name).first()
             if existing:
                 flash(f'Assay type "{name}" already exists', 'error')
-                return redirect(url_for('add_assay_type'))
+                return redirect(url_for('main.add_assay_type'))
             
             assay_type = AssayType(
                 name=name,
@@ -479,18 +436,18 @@ def add_assay_type():
             db.session.commit()
             
             flash(f'Assay type "{name}" added successfully!', 'success')
-            return redirect(url_for('assay_types'))
+            return redirect(url_for('main.assay_types'))
             
         except Exception as e:
             db.session.rollback()
             flash(f'Error adding assay type: {str(e)}', 'error')
-            return redirect(url_for('add_assay_type'))
+            return redirect(url_for('main.add_assay_type'))
     
     # GET request - show form
     return render_template('add_assay_type.html')
 
 
-@app.route('/add_assay/<int:experiment_id>', methods=['GET', 'POST'])
+@bp.route('/add_assay/<int:experiment_id>', methods=['GET', 'POST'])
 def add_assay(experiment_id):
     """Add a new assay to an experiment"""
     experiment = Experiment.query.get_or_404(experiment_id)
@@ -525,19 +482,19 @@ def add_assay(experiment_id):
             db.session.commit()
             
             flash(f'Assay added successfully!', 'success')
-            return redirect(url_for('experiment_detail', experiment_id=experiment_id))
+            return redirect(url_for('main.experiment_detail', experiment_id=experiment_id))
             
         except Exception as e:
             db.session.rollback()
             flash(f'Error adding assay: {str(e)}', 'error')
-            return redirect(url_for('add_assay', experiment_id=experiment_id))
+            return redirect(url_for('main.add_assay', experiment_id=experiment_id))
     
     # GET request - show form
     assay_types = AssayType.query.order_by(AssayType.name).all()
     return render_template('add_assay.html', experiment=experiment, assay_types=assay_types)
 
 
-@app.route('/add_measurement/<int:assay_id>', methods=['GET', 'POST'])
+@bp.route('/add_measurement/<int:assay_id>', methods=['GET', 'POST'])
 def add_measurement(assay_id):
     """Add measurements to an assay"""
     assay = Assay.query.get_or_404(assay_id)
@@ -555,14 +512,19 @@ def add_measurement(assay_id):
             
             # Determine if value is normal
             is_normal = None
-            if reference_range_min is not None and reference_range_max is not None and value is not None:
+            if (reference_range_min is not None and reference_range_max is not None
+                    and value is not None):
                 is_normal = reference_range_min <= value <= reference_range_max
+            (canonical_value,), (canonical_unit,) = canonical_values([parameter_name], [value],
+                                                                     [unit])
             
             measurement = AssayMeasurement(
                 assay_id=assay_id,
                 parameter_name=parameter_name,
                 value=value,
                 unit=unit,
+                canonical_value=canonical_value,
+                canonical_unit=canonical_unit,
                 reference_range_min=reference_range_min,
                 reference_range_max=reference_range_max,
                 is_normal=is_normal,
@@ -572,21 +534,70 @@ def add_measurement(assay_id):
             )
             
             db.session.add(measurement)
+            db.session.flush()
+            refresh_series(db.session.connection(), recheck=False)
             db.session.commit()
             
             flash(f'Measurement "{parameter_name}" added successfully!', 'success')
-            return redirect(url_for('assay_detail', assay_id=assay_id))
+            return redirect(url_for('main.assay_detail', assay_id=assay_id))
             
         except Exception as e:
             db.session.rollback()
             flash(f'Error adding measurement: {str(e)}', 'error')
-            return redirect(url_for('add_measurement', assay_id=assay_id))
+            return redirect(url_for('main.add_measurement', assay_id=assay_id))
     
     # GET request - show form
     return render_template('add_measurement.html', assay=assay)
 
 
-@app.route('/assay/<int:assay_id>')
+@bp.route('/api/assays', methods=['POST'])
+def api_create_assays():
+    """Create one or many assays (with measurements) from AssayCreate JSON"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, (dict, list)):
+        return jsonify({'error': 'Expected a JSON object or array of AssayCreate payloads'}), 400
+    
+    try:
+        return jsonify(ingest_assays(payload)), 201
+    except AssayIngestError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'details': e.errors}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/export/measurements')
+@conditional(lambda: tables_version(AssayMeasurement, Assay, AssayType, Experiment, Animal,
+                                    Species))
+def api_export_measurements():
+    """Download measurements with their context as a Parquet or Arrow file"""
+    fmt = request.args.get('format', 'parquet')
+    if fmt not in EXPORT_FORMATS:
+        expected = ', '.join(EXPORT_FORMATS)
+        return jsonify({'error': f'Unsupported format "{fmt}", expected one of {expected}'}), 400
+    
+    filters = {
+        'experiment_id': request.args.get('experiment_id', type=int),
+        'assay_type_id': request.args.get('assay_type_id', type=int),
+    }
+    mimetypes = {
+        'parquet': 'application/vnd.apache.parquet',
+        'arrow': 'application/vnd.apache.arrow.stream',
+    }
+    extensions = {'parquet': 'parquet', 'arrow': 'arrows'}
+    try:
+        chunks = stream_measurements(fmt, **filters)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 501
+    return Response(stream_with_context(chunks),
+                    mimetype=mimetypes[fmt],
+                    headers={'Content-Disposition':
+                             f'attachment; filename=measurements.{extensions[fmt]}'})
+
+
+@bp.route('/assay/<int:assay_id>')
+@conditional(assay_version, PAGE_CACHE_CONTROL)
 def assay_detail(assay_id):
     """Show detailed information about a specific assay"""
     assay = Assay.query.get_or_404(assay_id)
@@ -595,42 +606,45 @@ def assay_detail(assay_id):
     return render_template('assay_detail.html', assay=assay, measurements=measurements)
 
 
-@app.route('/api/assay_types')
+AUTOCOMPLETE_CACHE_CONTROL = 'no-cache'  # Browsers keep lookups but revalidate them with the ETag
+
+
+def _autocomplete_response(etag, lookup):
+    """304 if the browser's copy is current, else the result of lookup()"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(lookup())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = AUTOCOMPLETE_CACHE_CONTROL
+    return response
+
+
+@bp.route('/api/assay_types')
 def api_assay_types():
     """API endpoint for assay types (for autocomplete)"""
     category = request.args.get('category', '')
     search = request.args.get('search', '')
+    # match=prefix only matches the start of names and categories
+    prefix = request.args.get('match') == 'prefix'
     
-    query = AssayType.query
-    
-    if category:
-        query = query.filter(AssayType.category == category)
-    
-    if search:
-        query = query.filter(AssayType.name.ilike(f'%{search}%'))
-    
-    assay_types = query.order_by(AssayType.name).limit(20).all()
-    
-    return jsonify([{
-        'id': at.id,
-        'name': at.name,
-        'category': at.category,
-        'description': at.description,
-        'units': at.units
-    } for at in assay_types])
+    snapshot = autocomplete_index.snapshot()
+    return _autocomplete_response(
+        snapshot.etag('assay_types', category, search, prefix),
+        lambda: snapshot.find_assay_types(search, category=category, prefix=prefix))
 
 
-@app.route('/select_experiment_for_assay')
+@bp.route('/select_experiment_for_assay')
 def select_experiment_for_assay():
     """Select an existing experiment to add assays to"""
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     search = request.args.get('search', '')
     per_page = 20
     
     experiments_query = (Experiment.query
                         .join(Animal)
-                        .join(Species)
-                        .order_by(Experiment.start_date.desc()))
+                        .join(Species))
     
     if search:
         experiments_query = experiments_query.filter(
@@ -638,8 +652,9 @@ def select_experiment_for_assay():
             (Animal.accession_number.like(f'%{search}%'))
         )
     
-    experiments_paginated = experiments_query.paginate(
-        page=page, per_page=per_page, error_out=False
+    experiments_paginated = paginate_keyset(
+        experiments_query, [(Experiment.start_date, True), (Experiment.id, True)],
+        cursor=cursor, per_page=per_page, page=page
     )
     
     return render_template('select_experiment_for_assay.html', 
@@ -647,30 +662,38 @@ def select_experiment_for_assay():
                          search=search)
 
 
-@app.route('/api/assay_parameters')
+@bp.route('/api/assay_parameters')
 def api_assay_parameters():
     """API endpoint for common parameters by assay type"""
     assay_type_id = request.args.get('assay_type_id', type=int)
+    search = request.args.get('search', '')
+    prefix = request.args.get('match') == 'prefix'
     
     if not assay_type_id:
         return jsonify([])
     
-    # Get existing parameters for this assay type
-    parameters = db.session.query(AssayMeasurement.parameter_name, AssayMeasurement.unit).join(Assay).filter(
-        Assay.assay_type_id == assay_type_id
-    ).distinct().all()
-    
-    return jsonify([{
-        'parameter_name': param[0],
-        'unit': param[1]
-    } for param in parameters])
+    # Parameters already measured with this assay type, from the in-memory index
+    snapshot = autocomplete_index.snapshot()
+    return _autocomplete_response(
+        snapshot.etag('assay_parameters', assay_type_id, search, prefix),
+        lambda: snapshot.find_parameters(assay_type_id, search, prefix=prefix))
 
 
-@app.route('/experiment_profile/<int:experiment_id>')
+@bp.route('/experiment_profile/<int:experiment_id>')
+@conditional(lambda experiment_id: experiment_version(experiment_id, measurements=True),
+             PAGE_CACHE_CONTROL)
 def experiment_profile(experiment_id):
     """Show comprehensive experiment profile with insights and analytics"""
-    experiment = Experiment.query.get_or_404(experiment_id)
-    assays = Assay.query.filter_by(experiment_id=experiment_id).join(AssayType).all()
+    experiment = (Experiment.query
+                  .options(joinedload(Experiment.animal).joinedload(Animal.species))
+                  .filter_by(id=experiment_id)
+                  .first_or_404())
+    assays = (Assay.query
+              .filter_by(experiment_id=experiment_id)
+              .join(AssayType)
+              .options(contains_eager(Assay.assay_type))
+              .order_by(Assay.id)
+              .all())
     results = ExperimentResult.query.filter_by(experiment_id=experiment_id).first()
     
     # Calculate assay type distribution
@@ -679,41 +702,8 @@ def experiment_profile(experiment_id):
         category = assay.assay_type.category or 'Other'
         assay_type_counts[category] = assay_type_counts.get(category, 0) + 1
     
-    # Generate measurement insights
-    measurement_insights = []
-    all_measurements = []
-    
-    for assay in assays:
-        for measurement in assay.measurements:
-            all_measurements.append({
-                'parameter': measurement.parameter_name,
-                'value': measurement.value,
-                'unit': measurement.unit,
-                'assay_type': assay.assay_type.name
-            })
-    
-    # Group measurements by parameter and calculate insights
-    parameter_groups = {}
-    for measurement in all_measurements:
-        param = measurement['parameter']
-        if param not in parameter_groups:
-            parameter_groups[param] = []
-        parameter_groups[param].append(measurement['value'])
-    
-    for param, values in parameter_groups.items():
-        if values and all(v is not None for v in values):
-            avg_value = sum(values) / len(values)
-            measurement_insights.append({
-                'parameter': param,
-                'value': round(avg_value, 2),
-                'unit': next((m['unit'] for m in all_measurements if m['parameter'] == param), ''),
-                'count': len(values),
-                'min': min(values),
-                'max': max(values)
-            })
-    
-    # Sort insights by count (most measured parameters first)
-    measurement_insights.sort(key=lambda x: x['count'], reverse=True)
+    # Per-parameter insights, most measured parameters first (top 8)
+    measurement_insights = compute_measurement_insights(experiment_id, limit=8)
     
     # Get data files (placeholder for future implementation)
     data_files = []  # This would be populated from DataFile model when implemented
@@ -723,11 +713,11 @@ def experiment_profile(experiment_id):
                          assays=assays,
                          results=results,
                          assay_type_counts=assay_type_counts,
-                         measurement_insights=measurement_insights[:8],  # Top 8 insights
+                         measurement_insights=measurement_insights,
                          data_files=data_files)
 
 
-@app.route('/species')
+@bp.route('/species')
 def species_profiles():
     """Show big cards for each species with photo, description, and hashtags."""
     species_list = Species.query.all()
@@ -758,18 +748,156 @@ def species_profiles():
     return render_template('species_profiles.html', species_list=species_list, species_hashtags=species_hashtags)
 
 
+@bp.route('/metrics')
+def prometheus_metrics():
+    """
+    Request, SQL and template metrics in Prometheus text format
+
+    Only clients in METRICS_ALLOWED_IPS may read them.
+    """
+    if not metrics.metrics_allowed(request.remote_addr):
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(metrics.metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
 # Error handlers
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('errors/500.html'), 500
 
 
+@bp.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Create (if needed) and repopulate the experiment full-text index"""
+    with db.engine.begin() as connection:
+        indexed = rebuild_search_index(connection)
+    print(f"Indexed {indexed} experiments")
+
+
+@bp.cli.command('rebuild-series')
+@click.option('--full', is_flag=True,
+              help='Rebuild every series, not just animals with new measurements')
+def rebuild_series_command(full):
+    """
+    Bring the per-animal series store up to date
+
+    Schedule it to catch late commits.
+    """
+    written = rebuild_series() if full else refresh_series()
+    print(f"Wrote {written} series")
+
+
+@bp.cli.command('reflag-measurements')
+@click.option('--species-id', type=int, help='Only animals of this species')
+@click.option('--parameter', help='Only this parameter')
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Measurements per committed batch')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint of an interrupted run')
+def reflag_measurements_command(species_id, parameter, batch_size, restart):
+    """Re-apply reference ranges and is_normal to stored measurements"""
+    def report(totals):
+        print(f"  batch {totals['batches']}: {totals['scanned']} scanned, "
+              f"{totals['updated']} updated, {totals['unmatched']} without a range "
+              f"({totals['rows_per_second']:.0f} rows/s)")
+
+    result = reflag_measurements(batch_size=batch_size, species_id=species_id,
+                                 parameter_name=parameter, restart=restart, progress=report)
+    if result['resumed_from']:
+        print(f"Resumed after measurement {result['resumed_from']}")
+    print(f"Updated {result['updated']} of {result['scanned']} measurements "
+          f"in {result['seconds']:.2f}s")
+
+
+@bp.cli.command('normalize-units')
+@click.option('--batch-size', default=20000, show_default=True,
+              help='Measurements per committed batch')
+@click.option('--full', is_flag=True,
+              help='Convert every measurement again, not only unconverted ones')
+def normalize_units_command(batch_size, full):
+    """Store canonical values and units on measurements, then rebuild series"""
+    def report(totals):
+        print(f"  batch {totals['batches']}: {totals['scanned']} scanned, "
+              f"{totals['converted']} converted ({totals['rows_per_second']:.0f} rows/s)")
+
+    result = backfill_canonical_values(batch_size=batch_size, full=full, progress=report)
+    print(f"Normalized {result['scanned']} measurements in {result['seconds']:.2f}s")
+    if result['scanned']:
+        # Series hold canonical values and are only refreshed for new
+        # measurements
+        print(f"Rebuilt {rebuild_series()} series")
+
+
+@bp.cli.command('import-animals')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(SUPPORTED_FORMATS),
+              help='Defaults to the file extension')
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Rows inserted per transaction')
+def import_animals_command(path, fmt, batch_size):
+    """Bulk-import animals from a CSV or JSONL file"""
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = import_animals(stream, fmt=fmt, batch_size=batch_size)
+    print(f"Imported {report.inserted} of {report.processed} rows "
+          f"in {report.duration_seconds:.2f}s")
+    for error in report.errors:
+        print(f"  line {error['line']}: {error['error']}")
+    if report.failed > len(report.errors):
+        print(f"  ... {report.failed - len(report.errors)} more errors not shown")
+
+
+@bp.cli.command('export-measurements')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='parquet',
+              show_default=True)
+@click.option('--experiment-id', type=int, help='Only export this experiment')
+@click.option('--assay-type-id', type=int, help='Only export this assay type')
+@click.option('--chunk-size', default=50000, show_default=True,
+              help='Rows fetched and written per batch')
+def export_measurements_command(path, fmt, experiment_id, assay_type_id, chunk_size):
+    """Export measurements with their context to a Parquet or Arrow file"""
+    written = write_measurements(path, fmt, experiment_id=experiment_id,
+                                 assay_type_id=assay_type_id, chunk_size=chunk_size)
+    print(f"Exported {written} measurements to {path}")
+
+
+@bp.cli.command('export-features')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'fmt', type=click.Choice(FEATURE_EXPORT_FORMATS), default='csv',
+              show_default=True)
+@click.option('--by', type=click.Choice(ROW_MODES), default='animal', show_default=True,
+              help='One row per animal, or per animal and timepoint')
+def export_features_command(path, fmt, by):
+    """Export the animal x parameter feature matrix with covariates"""
+    written = write_feature_matrix(path, fmt, by=by)
+    print(f"Exported {written} rows to {path}")
+
+
+@bp.cli.command('generate-data')
+@click.option('--scale', default=1.0, show_default=True,
+              help='Dataset size in units of 1000 animals')
+@click.option('--seed', default=DEFAULT_SEED, show_default=True,
+              help='Random seed (same seed, same data)')
+def generate_data_command(scale, seed):
+    """Fill the database with a deterministic synthetic dataset"""
+    counts = generate_dataset(scale=scale, seed=seed)
+    for table, count in counts.items():
+        print(f"  {table}: {count}")
+
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and add the sample reference data"""
+    db.create_all()
+    init_sample_data()
+
+
 # Initialize sample data
 def init_sample_data():
     """Initialize the database with sample data for demonstration"""
@@ -817,7 +945,85 @@ def init_sample_data():
         print("Sample data initialized!")
 
 
+def create_app(config=None):
+    """
+    Create and configure the web application
+    
+    The schema is not touched here; run `flask init-db` (or `python app.py`,
+    which does it before starting the development server).
+    
+    Args:
+        config: Engine profile name ('development', 'production',
+                'postgresql', 'testing'), or a mapping of config values that
+                may name the profile as DATABASE_PROFILE. Defaults to the
+                INVIVODB_CONFIG environment variable, then 'development'.
+    
+    Returns:
+        Flask: The configured application
+    """
+    overrides = {'DATABASE_PROFILE': config} if isinstance(config, str) else dict(config or {})
+    profile_name = (overrides.get('DATABASE_PROFILE')
+                    or os.environ.get('INVIVODB_CONFIG', DEFAULT_PROFILE))
+    profile = get_profile(profile_name)
+    
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('INVIVODB_SECRET_KEY',
+                                              'dev-secret-key-change-in-production')
+    app.config['DATABASE_PROFILE'] = profile_name
+    # INVIVODB_DATABASE_URI overrides the profile's default database
+    app.config['SQLALCHEMY_DATABASE_URI'] = (os.environ.get('INVIVODB_DATABASE_URI')
+                                             or profile['database_uri'])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = profile['engine_options']
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Replica for GET/HEAD requests; SQLite files get a read-only connection to
+    # the same file. Set READ_DATABASE_URI to False to keep every request on the
+    # primary.
+    app.config['READ_DATABASE_URI'] = os.environ.get('INVIVODB_READ_DATABASE_URI')
+    # Comma-separated addresses/networks allowed to read /metrics ('*' for
+    # anyone); loopback by default
+    if os.environ.get('INVIVODB_METRICS_ALLOWED_IPS'):
+        entries = os.environ['INVIVODB_METRICS_ALLOWED_IPS'].split(',')
+        app.config['METRICS_ALLOWED_IPS'] = [entry.strip() for entry in entries if entry.strip()]
+    app.config.update(overrides)
+    if not app.config['SQLALCHEMY_DATABASE_URI']:
+        raise ValueError(f"The {profile_name} profile needs INVIVODB_DATABASE_URI to be set")
+    
+    db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine, profile['sqlite_pragmas'])
+        if app.config['READ_DATABASE_URI'] is not False:
+            read_engine = create_read_engine(db.engine, app.config['READ_DATABASE_URI'],
+                                             app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+                                             profile['sqlite_pragmas'])
+            if read_engine is not None:
+                app.extensions[READ_ENGINE_KEY] = read_engine
+    
+    # Drop cached statistics when a commit writes to the tables they were
+    # computed from
+    statistics_cache.watch(db.session)
+    
+    # Build the autocomplete index now rather than on the first lookup
+    # (skipped if there is no schema yet)
+    if app.config.get('AUTOCOMPLETE_WARM', True):
+        with app.app_context():
+            autocomplete_index.warm()
+            db.session.remove()
+    
+    # Per-endpoint request, SQL and template metrics, served at /metrics
+    metrics.init_app(app)
+    
+    app.register_blueprint(bp)
+    # Streaming collection endpoints (/api/animals, /api/experiments,
+    # /api/assays, /api/measurements)
+    app.register_blueprint(api_bp)
+    return app
+
+
+# No app is built on import: `flask` finds create_app, scripts call it
+# themselves, and production servers name the factory, e.g.
+# gunicorn 'app:create_app("production")'
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
         init_sample_data()
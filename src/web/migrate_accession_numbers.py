@@ -8,124 +8,78 @@ This script will:
 1. Convert existing accession numbers to the new format
 2. Update the database schema
 3. Validate the conversion
+
+Animals are migrated in committed batches with a checkpoint, so an
+interrupted run picks up where it stopped. Use --dry-run to see what would
+change and how fast.
+
+Usage:
+    python migrate_accession_numbers.py [--dry-run] [--batch-size N] [--restart]
 """
 
+import argparse
 import os
 import sys
-from datetime import datetime
 
 # Add the parent directory to the path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
+from sqlalchemy import select
+
 from models.database import (
-    db, Animal, Species, generate_accession_number, get_species_code,
-    validate_accession_number, parse_accession_number
+    db, Animal, generate_accession_number, validate_accession_number, parse_accession_number
 )
-from app import app
+from models.accession_codec import validate_many
+from models.accession_migration import DEFAULT_BATCH_SIZE, migrate_accession_numbers as migrate
+from app import create_app
 
+app = create_app()
 
-def convert_old_accession_number(old_number: str) -> str:
-    """
-    Convert old accession number format to new format
-    
-    Old: MM-001-2024
-    New: MM2024000001A5
-    """
-    if not old_number or '-' not in old_number:
-        return old_number
+
+def migrate_accession_numbers(batch_size: int = DEFAULT_BATCH_SIZE, dry_run: bool = False,
+                              restart: bool = False):
+    """Migrate accession numbers to the new format, resuming interrupted runs"""
+    def report(totals):
+        print(f"  batch {totals['batches']}: {totals['scanned']} scanned, "
+              f"{totals['migrated']} migrated, "
+              f"{totals['conflicts']} conflicts, {totals['unconvertible']} unconvertible "
+              f"({totals['rows_per_second']:.0f} rows/s)")
     
-    try:
-        parts = old_number.split('-')
-        if len(parts) != 3:
-            return old_number
-        
-        species_code = parts[0]
-        sequence = int(parts[1])
-        year = int(parts[2])
+    with app.app_context():
+        result = migrate(batch_size=batch_size, dry_run=dry_run, restart=restart, progress=report)
         
-        # Generate new accession number
-        new_number = generate_accession_number(species_code, year, sequence)
+        if result['resumed_from']:
+            print(f"Resumed after animal id {result['resumed_from']}")
+        for animal_id, old_number, new_number in result['conflict_examples']:
+            print(f"✗ Conflict: {old_number} → {new_number} already exists (animal {animal_id})")
+        for animal_id, old_number in result['unconvertible_examples']:
+            print(f"✗ Could not convert {old_number} (animal {animal_id})")
         
-        # Validate the new number
-        if validate_accession_number(new_number):
-            return new_number
-        else:
-            print(f"Warning: Generated invalid accession number for {old_number}")
-            return old_number
-            
-    except (ValueError, IndexError) as e:
-        print(f"Error converting {old_number}: {e}")
-        return old_number
-
-
-def migrate_accession_numbers():
-    """Migrate all existing accession numbers to the new format"""
-    with app.app_context():
-        try:
-            # Get all animals
-            animals = Animal.query.all()
-            
-            print(f"Found {len(animals)} animals to migrate")
-            
-            migrated_count = 0
-            error_count = 0
-            
-            for animal in animals:
-                old_number = animal.accession_number
-                
-                # Check if already in new format
-                if validate_accession_number(old_number):
-                    print(f"✓ {old_number} already in new format")
-                    continue
-                
-                # Convert to new format
-                new_number = convert_old_accession_number(old_number)
-                
-                if new_number != old_number:
-                    # Check if new number already exists
-                    existing = Animal.query.filter_by(accession_number=new_number).first()
-                    if existing and existing.id != animal.id:
-                        print(f"✗ Conflict: {new_number} already exists")
-                        error_count += 1
-                        continue
-                    
-                    # Update the accession number
-                    animal.accession_number = new_number
-                    print(f"✓ {old_number} → {new_number}")
-                    migrated_count += 1
-                else:
-                    print(f"✗ Could not convert {old_number}")
-                    error_count += 1
-            
-            # Commit changes
-            if migrated_count > 0:
-                db.session.commit()
-                print(f"\nMigration completed:")
-                print(f"  ✓ Successfully migrated: {migrated_count}")
-                print(f"  ✗ Errors: {error_count}")
-            else:
-                print("\nNo migration needed - all accession numbers are already in new format")
-                
-        except Exception as e:
-            db.session.rollback()
-            print(f"Migration failed: {e}")
-            raise
-
-
-def validate_all_accession_numbers():
+        print(f"\n{'Dry run' if dry_run else 'Migration'} completed in {result['seconds']:.1f}s "
+              f"({result['rows_per_second']:.0f} rows/s):")
+        print(f"  ✓ {'Would migrate' if dry_run else 'Successfully migrated'}: "
+              f"{result['migrated']}")
+        print(f"  ✓ Already in new format: {result['already_valid']}")
+        print(f"  ✗ Errors: {result['conflicts'] + result['unconvertible']}")
+        return result
+
+
+def validate_all_accession_numbers(chunk_size: int = 50000):
     """Validate all accession numbers in the database"""
     with app.app_context():
-        animals = Animal.query.all()
-        
         valid_count = 0
         invalid_count = 0
         
-        for animal in animals:
-            if validate_accession_number(animal.accession_number):
-                valid_count += 1
-            else:
-                print(f"Invalid accession number: {animal.accession_number}")
-                invalid_count += 1
+        # Stream just the accession column and check each chunk in one
+        # vectorized call
+        rows = db.session.execute(select(Animal.accession_number)
+                                  .execution_options(yield_per=chunk_size))
+        for chunk in rows.scalars().partitions():
+            invalid = [number for number, ok in zip(chunk, validate_many(chunk)) if not ok]
+            for accession_number in invalid:
+                print(f"Invalid accession number: {accession_number}")
+            valid_count += len(chunk) - len(invalid)
+            invalid_count += len(invalid)
         
         print(f"\nValidation results:")
         print(f"  ✓ Valid: {valid_count}")
@@ -160,6 +114,15 @@ def test_new_accession_number_generation():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="InvivoDB Accession Number Migration Tool")
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report what would change, and how fast, without writing')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Animals per transaction')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore the checkpoint of an interrupted run')
+    args = parser.parse_args()
+    
     print("InvivoDB Accession Number Migration Tool")
     print("=" * 50)
     
@@ -174,11 +137,12 @@ if __name__ == "__main__":
     if not all_valid:
         # Perform migration
         print("\n3. Migrating accession numbers:")
-        migrate_accession_numbers()
+        migrate_accession_numbers(args.batch_size, args.dry_run, args.restart)
         
-        # Validate again
-        print("\n4. Validating after migration:")
-        validate_all_accession_numbers()
+        if not args.dry_run:
+            # Validate again
+            print("\n4. Validating after migration:")
+            validate_all_accession_numbers()
     else:
         print("\n3. No migration needed - all accession numbers are valid")
     
@@ -7,9 +7,11 @@ import sys
 import os
 sys.path.append('src')
 
-from web.app import app, db
+from web.app import create_app, db
 from models.database import AssayType
 
+app = create_app()
+
 def test_add_assay_type():
     """Test adding a new assay type"""
     with app.app_context():
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+# Add src/ to path for imports
+dir_path = os.path.dirname(os.path.realpath(__file__))
+src_path = os.path.abspath(os.path.join(dir_path, '../src'))
+sys.path.insert(0, src_path)
+# The web app module (src/web/app.py) is imported as `app`
+sys.path.insert(0, os.path.join(src_path, 'web'))
+
+from models.database import db
+from models.engine import READ_ENGINE_KEY
+
+
+@pytest.fixture
+def db_app():
+    """Bare Flask app bound to a fresh in-memory database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def create_app(monkeypatch):
+    """
+    The web app factory, with INVIVODB_DATABASE_URI defaulting to an
+    in-memory database
+
+    The read engines of the apps it builds are disposed afterwards.
+    """
+    if 'INVIVODB_DATABASE_URI' not in os.environ:
+        monkeypatch.setenv('INVIVODB_DATABASE_URI', 'sqlite://')
+    from app import create_app as factory
+    built = []
+
+    def create(config=None):
+        app = factory(config)
+        built.append(app)
+        return app
+
+    yield create
+    for app in built:
+        read_engine = app.extensions.get(READ_ENGINE_KEY)
+        if read_engine is not None:
+            read_engine.dispose()
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+from flask import Flask
+from sqlalchemy import select
+
+from models.database import (
+    db, Species, Animal, AccessionCounter, generate_accession_number, parse_accession_number
+)
+from models.accession import (
+    allocate_accession_number, allocate_accession_numbers, reserve_sequences
+)
+
+
+def test_sequential_and_block_allocation(db_app):
+    assert allocate_accession_number('MM', 2025) == generate_accession_number('MM', 2025, 1)
+    assert allocate_accession_number('MM', 2025) == generate_accession_number('MM', 2025, 2)
+    assert list(reserve_sequences('MM', 2025, 1000)) == list(range(3, 1003))
+    assert allocate_accession_numbers('RN', 2025, 3) == [
+        generate_accession_number('RN', 2025, seq) for seq in (1, 2, 3)]
+    db.session.commit()
+    assert db.session.get(AccessionCounter, ('MM', 2025)).last_sequence == 1002
+
+
+def test_counter_seeded_from_existing_animals(db_app):
+    mouse = Species(common_name='Mouse', scientific_name='Mus musculus')
+    db.session.add(mouse)
+    db.session.flush()
+    db.session.add(Animal(accession_number=generate_accession_number('MM', 2024, 41),
+                          species_id=mouse.id))
+    db.session.commit()
+
+    assert parse_accession_number(allocate_accession_number('MM', 2024))['sequence'] == 42
+    assert parse_accession_number(allocate_accession_number('MM', 2025))['sequence'] == 1
+
+
+def test_rollback_returns_sequences(db_app):
+    allocate_accession_number('MAC', 2025)
+    db.session.commit()
+    reserve_sequences('MAC', 2025, 10)
+    db.session.rollback()
+    assert list(reserve_sequences('MAC', 2025, 1)) == [2]
+
+
+def test_invalid_and_exhausted_blocks(db_app):
+    with pytest.raises(ValueError):
+        reserve_sequences('MM', 2025, 0)
+    with pytest.raises(ValueError):
+        reserve_sequences('MM', 2025, 1000000)
+    assert db.session.get(AccessionCounter, ('MM', 2025)) is None
+
+
+def test_failed_reservation_leaves_the_counter_unchanged(db_app):
+    reserve_sequences('MM', 2025, 999990)
+    db.session.commit()
+    with pytest.raises(ValueError):
+        reserve_sequences('MM', 2025, 10)
+    assert db.session.execute(
+        select(AccessionCounter.last_sequence).where(AccessionCounter.species_code == 'MM')
+    ).scalar_one() == 999990
+    assert list(reserve_sequences('MM', 2025, 9)) == list(range(999991, 1000000))
+
+
+def test_concurrent_allocation_is_unique(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'alloc.db'}"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+
+    issued, errors = [], []
+
+    def worker():
+        with app.app_context():
+            try:
+                for _ in range(20):
+                    issued.extend(reserve_sequences('MM', 2025, 5))
+                    db.session.commit()
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert sorted(issued) == list(range(1, 401))
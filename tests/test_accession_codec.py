@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from models import accession_codec
+from models.accession_codec import checksums, generate_many, parse_many, validate_many
+from models.database import (
+    generate_accession_number, generate_checksum, validate_accession_number, parse_accession_number
+)
+
+
+@pytest.fixture(params=['numpy', 'tables'])
+def codec(request, monkeypatch):
+    """Run each test with NumPy and with the per-character table fallback"""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(accession_codec, 'np', None)
+    return request.param
+
+
+def _accession_numbers(count=3000, seed=11):
+    """Valid numbers, numbers with one character replaced, and assorted junk"""
+    rng = random.Random(seed)
+    alphabet = 'ABCMRNZabz0123456789-_ é\x00'
+    numbers = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            number = generate_accession_number(rng.choice(['MM', 'RN', 'MAC', 'CAN', 'mm', 'Xy']),
+                                               rng.randrange(1000, 10000), rng.randrange(1000000))
+            if rng.random() < 0.5:
+                position = rng.randrange(len(number))
+                number = number[:position] + rng.choice(alphabet) + number[position + 1:]
+            numbers.append(number)
+        elif kind < 0.55:
+            numbers.append(None)
+        else:
+            length = rng.choice([0, 2, 13, 14, 15, 16, 30])
+            numbers.append(''.join(rng.choice(alphabet) for _ in range(length)))
+    return numbers
+
+
+def _scalar_parse(number):
+    try:
+        parsed = parse_accession_number(number)
+    except ValueError:
+        return (False, '', 0, 0, '')
+    return (True, parsed['species_code'], parsed['year'], parsed['sequence'], parsed['checksum'])
+
+
+def test_validate_matches_scalar(codec):
+    numbers = _accession_numbers()
+
+    assert [bool(ok) for ok in validate_many(numbers)] == \
+        [validate_accession_number(n) for n in numbers]
+
+
+def test_parse_matches_scalar(codec):
+    numbers = _accession_numbers() + ['MAC2025000123' + generate_checksum('MAC2025000123')]
+    parsed = parse_many(numbers)
+
+    rows = zip(parsed['valid'], parsed['species_code'], parsed['year'], parsed['sequence'],
+               parsed['checksum'])
+    assert [(bool(v), str(c), int(y), int(s), str(k)) for v, c, y, s, k in rows] == \
+        [_scalar_parse(n) for n in numbers]
+
+
+def test_checksums_match_scalar(codec):
+    bases = [number[:-2] for number in _accession_numbers() if number] + ['', 'MM-001-2024']
+
+    assert [str(checksum) for checksum in checksums(bases)] == \
+        [generate_checksum(base) for base in bases]
+
+
+def test_generate_matches_scalar(codec):
+    rng = random.Random(5)
+    triples = [(rng.choice(['MM', 'MAC', 'X', 'UNKN', 'Ré', 'MA\x00']),
+                rng.choice([2025, 999, 10000]), rng.choice([0, 42, 999999, 1000000, -3]))
+               for _ in range(500)]
+
+    generated = generate_many(*zip(*triples))
+
+    assert [str(number) for number in generated] == \
+        [generate_accession_number(*triple) for triple in triples]
+    assert [str(number) for number in generate_many('MM', 2025, range(1, 4))] == \
+        [generate_accession_number('MM', 2025, sequence) for sequence in range(1, 4)]
+
+
+def test_empty_input(codec):
+    assert list(validate_many([])) == []
+    assert list(parse_many([])['valid']) == []
+    assert list(generate_many([], [], [])) == []
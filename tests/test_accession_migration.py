@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import select
+
+from models.accession import allocate_accession_number
+from models.accession_migration import CHECKPOINT_NAME, migrate_accession_numbers
+from models.database import db, Species, Animal, MigrationCheckpoint, generate_accession_number
+
+
+def _animals(*accession_numbers):
+    species = Species(common_name='Mouse', scientific_name='Mus musculus')
+    db.session.add(species)
+    db.session.flush()
+    db.session.add_all([Animal(accession_number=number, species_id=species.id)
+                        for number in accession_numbers])
+    db.session.commit()
+
+
+def _numbers():
+    return db.session.execute(select(Animal.accession_number).order_by(Animal.id)).scalars().all()
+
+
+def _checkpoint():
+    return db.session.get(MigrationCheckpoint, CHECKPOINT_NAME)
+
+
+def test_migrates_in_batches_and_reports_conflicts(db_app):
+    taken = generate_accession_number('RN', 2023, 7)
+    _animals('MM-001-2024', generate_accession_number('MM', 2025, 1), 'RN-007-2023', taken,
+             'MM-002-2024', 'MM-2-2024', 'not-an-id', 'M1-001-2024')
+
+    result = migrate_accession_numbers(batch_size=3)
+
+    assert _numbers() == [
+        generate_accession_number('MM', 2024, 1), generate_accession_number('MM', 2025, 1),
+        'RN-007-2023', taken, generate_accession_number('MM', 2024, 2), 'MM-2-2024', 'not-an-id',
+        'M1-001-2024',
+    ]
+    assert (result['scanned'], result['batches'], result['migrated'],
+            result['already_valid']) == (8, 3, 2, 2)
+    # RN-007-2023 collides with an existing animal, MM-2-2024 with MM-002-2024
+    assert result['conflicts'] == 2
+    assert [old for _, old, _ in result['conflict_examples']] == ['RN-007-2023', 'MM-2-2024']
+    assert [old for _, old in result['unconvertible_examples']] == ['not-an-id', 'M1-001-2024']
+    assert _checkpoint() is None
+
+
+def test_dry_run_writes_nothing(db_app):
+    _animals('MM-001-2024', 'MM-002-2024')
+
+    result = migrate_accession_numbers(dry_run=True)
+
+    assert result['migrated'] == 2 and result['rows_per_second'] > 0
+    assert _numbers() == ['MM-001-2024', 'MM-002-2024']
+    assert _checkpoint() is None
+
+
+def test_interrupted_run_resumes_from_checkpoint(db_app):
+    _animals(*[f'MM-{sequence:03d}-2024' for sequence in range(1, 6)])
+
+    def stop_after_first_batch(totals):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        migrate_accession_numbers(batch_size=2, progress=stop_after_first_batch)
+    db.session.rollback()
+    assert _checkpoint().last_id == 2
+    assert _numbers()[2:] == ['MM-003-2024', 'MM-004-2024', 'MM-005-2024']
+
+    result = migrate_accession_numbers(batch_size=2)
+
+    assert result['resumed_from'] == 2 and result['scanned'] == 3
+    assert _numbers() == [generate_accession_number('MM', 2024, sequence)
+                          for sequence in range(1, 6)]
+    assert _checkpoint() is None
+
+
+def test_allocation_continues_after_converted_numbers(db_app):
+    _animals('MM-003-2024', 'MM-012-2024', 'RN-004-2024')
+    # The counter exists before the migration, seeded while only old-style
+    # numbers were stored
+    assert allocate_accession_number('MM', 2024) == generate_accession_number('MM', 2024, 1)
+    db.session.commit()
+
+    migrate_accession_numbers(batch_size=2)
+
+    assert allocate_accession_number('MM', 2024) == generate_accession_number('MM', 2024, 13)
+    assert allocate_accession_number('RN', 2024) == generate_accession_number('RN', 2024, 5)
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import inspect
+
+from models.cache import statistics_cache
+from models.database import db
+from models.engine import pragma_statements
+
+
+def _pragma(app, name):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def test_factory_does_not_create_schema(create_app, tmp_path):
+    app = create_app({'DATABASE_PROFILE': 'testing',
+                      'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/fresh.db'})
+
+    with app.app_context():
+        assert inspect(db.engine).get_table_names() == []
+
+
+def test_testing_profile_serves_routes(create_app):
+    app = create_app('testing')
+    statistics_cache.clear()
+    with app.app_context():
+        db.create_all()
+        response = app.test_client().get('/api/summary')
+
+    assert response.status_code == 200
+    assert response.get_json()['total_animals'] == 0
+    assert _pragma(app, 'foreign_keys') == 1
+
+
+def test_production_sqlite_profile_applies_pragmas(create_app, tmp_path):
+    app = create_app({'DATABASE_PROFILE': 'production',
+                      'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/prod.db'})
+
+    assert _pragma(app, 'journal_mode') == 'wal'
+    assert _pragma(app, 'busy_timeout') == 15000
+    assert _pragma(app, 'synchronous') == 1  # NORMAL
+    assert _pragma(app, 'foreign_keys') == 1
+    assert _pragma(app, 'cache_size') == -65536
+    with app.app_context():
+        assert db.engine.pool.size() == 10
+
+
+def test_journal_mode_is_set_first():
+    statements = pragma_statements({'busy_timeout': 1, 'journal_mode': 'WAL'})
+    assert statements[0] == 'PRAGMA journal_mode=WAL'
+
+
+def test_profile_errors(create_app, monkeypatch):
+    monkeypatch.delenv('INVIVODB_DATABASE_URI', raising=False)
+    with pytest.raises(ValueError, match='Unknown database profile'):
+        create_app('mainframe')
+    with pytest.raises(ValueError, match='INVIVODB_DATABASE_URI'):
+        create_app('postgresql')
@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import pytest
+
+from models.database import (
+    db, Species, Animal, Experiment, AssayType, Assay, AssayMeasurement
+)
+from models.assay_ingest import ingest_assays, compute_is_normal, AssayIngestError
+from models.series import get_series, refresh_series
+
+
+def _experiment():
+    mouse = Species(common_name='Mouse', scientific_name='Mus musculus')
+    chemistry = AssayType(name='Blood Chemistry', category='Biochemical')
+    db.session.add_all([mouse, chemistry])
+    db.session.flush()
+    animal = Animal(accession_number='MM2025000001C9', species_id=mouse.id)
+    db.session.add(animal)
+    db.session.flush()
+    experiment = Experiment(title='Panel', animal_id=animal.id, start_date=datetime(2025, 1, 1))
+    db.session.add(experiment)
+    db.session.commit()
+    return experiment, chemistry
+
+
+def test_compute_is_normal():
+    assert compute_is_normal([5, 11, None, 3], [1, 1, 1, None],
+                             [10, 10, 10, 4]) == [True, False, None, None]
+
+
+def test_ingest_many_assays(db_app):
+    experiment, chemistry = _experiment()
+    refresh_series()  # The rebuild-series command has built the store
+    panel = [{'parameter_name': f'P{i}', 'value': float(i), 'unit': 'mg/dL',
+              'reference_range_min': 10.0, 'reference_range_max': 100.0} for i in range(200)]
+    payloads = [
+        {'experiment_id': experiment.id, 'assay_type_id': chemistry.id, 'timepoint': 'Day 0',
+         'timepoint_hours': 0, 'measurements': panel},
+        {'experiment_id': experiment.id, 'assay_type_id': chemistry.id, 'timepoint': 'Day 7',
+         'measurements': [{'parameter_name': 'Glucose', 'value': 5.0, 'is_normal': True}]},
+    ]
+
+    result = ingest_assays(payloads)
+
+    assert result['assays'] == 2 and result['measurements'] == 201 and result['animal_links'] == 2
+    day0 = db.session.get(Assay, result['assay_ids'][0])
+    assert day0.timepoint == 'Day 0'
+    assert [a.id for a in day0.animals] == [experiment.animal_id]
+    flags = {m.parameter_name: m.is_normal for m in day0.measurements}
+    assert flags['P5'] is False and flags['P50'] is True
+    assert AssayMeasurement.query.filter_by(parameter_name='Glucose').one().is_normal is True
+    # The series store is refreshed in the ingest transaction
+    assert list(get_series(experiment.animal_id, 'Glucose').values) == [5.0]
+
+
+def test_invalid_payload_writes_nothing(db_app):
+    experiment, chemistry = _experiment()
+    payloads = [
+        {'experiment_id': experiment.id, 'assay_type_id': chemistry.id,
+         'measurements': [{'parameter_name': 'Glucose', 'value': 5.0}]},
+        {'experiment_id': 999, 'assay_type_id': chemistry.id},
+        {'experiment_id': experiment.id, 'assay_type_id': chemistry.id,
+         'measurements': [{'value': 'high'}]},
+    ]
+    with pytest.raises(AssayIngestError) as excinfo:
+        ingest_assays(payloads)
+    assert {error['index'] for error in excinfo.value.errors} == {2}
+
+    with pytest.raises(AssayIngestError) as excinfo:
+        ingest_assays(payloads[:2])
+    assert excinfo.value.errors == [{'index': 1, 'field': 'experiment_id',
+                                     'error': 'Experiment not found'}]
+    assert Assay.query.count() == 0 and AssayMeasurement.query.count() == 0
+
+
+def test_null_lists_are_treated_as_empty(db_app):
+    experiment, chemistry = _experiment()
+
+    result = ingest_assays([{'experiment_id': experiment.id, 'assay_type_id': chemistry.id,
+                             'animal_ids': None, 'measurements': None}])
+
+    assert result['assays'] == 1 and result['measurements'] == 0
+    assay = db.session.get(Assay, result['assay_ids'][0])
+    assert [a.id for a in assay.animals] == [experiment.animal_id]
@@ -0,0 +1,134 @@
+from datetime import datetime
+
+import pytest
+
+from models.autocomplete import AutocompleteIndex, autocomplete_index
+from models.cache import statistics_cache
+from models.database import db, Species, Animal, Experiment, AssayType, Assay, AssayMeasurement
+
+
+def _populate():
+    statistics_cache.watch(db.session)
+    autocomplete_index.clear()
+    blood = AssayType(name='Blood Chemistry', category='Biochemical', units='mg/dL')
+    db.session.add_all([
+        blood,
+        AssayType(name='Body Weight', category='Physiological', units='g'),
+        AssayType(name='Cytokine Panel', category='Immunological', units='pg/mL'),
+        AssayType(name='Histology', category='Pathology'),
+    ])
+    species = Species(common_name='Mouse', scientific_name='Mus musculus')
+    db.session.add(species)
+    db.session.flush()
+    animal = Animal(accession_number='MM2025000001A5', species_id=species.id)
+    db.session.add(animal)
+    db.session.flush()
+    experiment = Experiment(title='Baseline', animal_id=animal.id, start_date=datetime(2025, 1, 6))
+    db.session.add(experiment)
+    db.session.flush()
+    _measure(experiment, blood, Glucose='mg/dL', Insulin='ng/mL', ALT='U/L')
+    _measure(experiment, blood, Glucose='mmol/L')
+    return blood, experiment
+
+
+@pytest.fixture
+def catalog(db_app):
+    yield _populate()
+    autocomplete_index.clear()
+
+
+def _measure(experiment, assay_type, **units):
+    assay = Assay(experiment_id=experiment.id, assay_type_id=assay_type.id, timepoint_hours=0.0)
+    assay.measurements = [AssayMeasurement(parameter_name=name, value=1.0, unit=unit)
+                          for name, unit in units.items()]
+    db.session.add(assay)
+    db.session.commit()
+
+
+def _names(entries, field='name'):
+    return [entry[field] for entry in entries]
+
+
+def test_prefix_and_substring_lookups(catalog):
+    blood, _ = catalog
+    snapshot = AutocompleteIndex().snapshot()
+
+    assert _names(snapshot.find_assay_types('b', prefix=True)) == ['Blood Chemistry', 'Body Weight']
+    # Substring matches names and categories, case-insensitively, in name order
+    assert _names(snapshot.find_assay_types('LOG')) == \
+        ['Body Weight', 'Cytokine Panel', 'Histology']
+    assert _names(snapshot.find_assay_types('log', prefix=True)) == []
+    assert _names(snapshot.find_assay_types(category='Pathology')) == ['Histology']
+    assert len(snapshot.find_assay_types(limit=2)) == 2
+
+    assert [(p['parameter_name'], p['unit']) for p in snapshot.find_parameters(blood.id)] == [
+        ('ALT', 'U/L'), ('Glucose', 'mg/dL'), ('Glucose', 'mmol/L'), ('Insulin', 'ng/mL')]
+    assert _names(snapshot.find_parameters(blood.id, 'MM', prefix=True), 'unit') == ['mmol/L']
+    assert _names(snapshot.find_parameters(blood.id, 'l'), 'parameter_name') == \
+        ['ALT', 'Glucose', 'Glucose', 'Insulin']
+    assert snapshot.find_parameters(blood.id + 100) == []
+
+
+def test_writes_refresh_the_index_incrementally(catalog):
+    blood, experiment = catalog
+    index = AutocompleteIndex()
+    snapshot = index.snapshot()
+    statistics_cache.invalidate('autocomplete_index')
+    unchanged = index.snapshot()
+    assert unchanged is not snapshot and unchanged.version == snapshot.version
+
+    _measure(experiment, blood, Creatinine='mg/dL')
+    db.session.add(AssayType(name='Behavior', category='Behavioral'))
+    db.session.commit()
+    refreshed = index.snapshot()
+
+    assert index.snapshot() is refreshed and refreshed.version != snapshot.version
+    assert 'Creatinine' in _names(refreshed.find_parameters(blood.id), 'parameter_name')
+    assert _names(refreshed.find_assay_types('beh', prefix=True)) == ['Behavior']
+    assert (index.builds, index.full_builds) == (3, 1)
+
+
+def test_rebuilds_pick_up_measurements_committed_below_the_watermark(catalog):
+    blood, experiment = catalog
+    index = AutocompleteIndex()
+    assay = Assay(experiment_id=experiment.id, assay_type_id=blood.id, timepoint_hours=24.0)
+    assay.measurements = [AssayMeasurement(id=100, parameter_name='Urea', value=1.0, unit='mg/dL')]
+    db.session.add(assay)
+    db.session.commit()
+    index.snapshot()
+
+    # A transaction holding a lower id commits after the snapshot saw id 100
+    db.session.add(AssayMeasurement(id=50, assay_id=assay.id, parameter_name='Lactate', value=1.0,
+                                    unit='mmol/L'))
+    db.session.commit()
+
+    assert 'Lactate' in _names(index.snapshot().find_parameters(blood.id), 'parameter_name')
+    assert index.full_builds == 1
+
+
+def test_routes_answer_from_the_index_with_etags(create_app, tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/autocomplete.db'})
+    with app.app_context():
+        db.create_all()
+        blood, _ = _populate()
+        blood_id = blood.id
+        db.session.remove()
+    client = app.test_client()
+
+    response = client.get('/api/assay_types?search=ical')
+    assert [entry['name'] for entry in response.get_json()] == \
+        ['Blood Chemistry', 'Body Weight', 'Cytokine Panel']
+    assert response.headers['Cache-Control'] == 'no-cache'
+    etag = response.headers['ETag']
+
+    repeat = client.get('/api/assay_types?search=ical', headers={'If-None-Match': etag})
+    assert repeat.status_code == 304 and repeat.headers['ETag'] == etag and not repeat.data
+    other = client.get('/api/assay_types?search=body', headers={'If-None-Match': etag})
+    assert other.status_code == 200
+
+    parameters = client.get(f'/api/assay_parameters?assay_type_id={blood_id}'
+                            f'&search=glu&match=prefix')
+    assert parameters.get_json() == [{'parameter_name': 'Glucose', 'unit': 'mg/dL'},
+                                     {'parameter_name': 'Glucose', 'unit': 'mmol/L'}]
+    assert client.get('/api/assay_parameters').get_json() == []
+    autocomplete_index.clear()
@@ -0,0 +1,89 @@
+import io
+import json
+
+from sqlalchemy import select
+
+from models.database import (
+    db, Species, Animal, generate_accession_number, parse_accession_number
+)
+from models.accession import allocate_accession_number
+from models.bulk_import import import_animals
+
+
+def _species():
+    db.session.add_all([
+        Species(common_name='Mouse', scientific_name='Mus musculus'),
+        Species(common_name='Rat', scientific_name='Rattus norvegicus'),
+    ])
+    db.session.commit()
+
+
+def test_csv_import_in_batches_with_row_errors(db_app):
+    _species()
+    existing = generate_accession_number('RN', 2025, 7)
+    lines = ['species_code,strain,sex,age_at_start,weight_at_start,accession_number']
+    for i in range(25):
+        lines.append(f'MM,C57BL/6,{"Male" if i % 2 else "Female"},8,{20 + i},')
+    lines.append('RN,Sprague-Dawley,Female,10,250,' + existing)
+    lines.append('XX,Unknown,Male,1,1,')               # unknown species
+    lines.append('MM,C57BL/6,Robot,8,20,')              # invalid sex
+    lines.append('RN,Wistar,Male,-1,250,')              # negative age
+    lines.append('RN,Wistar,Male,9,250,' + existing)    # duplicate accession number
+
+    report = import_animals(io.StringIO('\n'.join(lines)), fmt='csv', batch_size=10, year=2025)
+
+    assert report.processed == 30
+    assert report.inserted == 26
+    assert [e['line'] for e in report.errors] == [28, 29, 30, 31]
+    assert 'Unknown species' in report.errors[0]['error']
+    assert report.errors[1]['error'].startswith('sex')
+
+    mice = Animal.query.filter(Animal.accession_number.like('MM2025%')).all()
+    sequences = sorted(parse_accession_number(a.accession_number)['sequence'] for a in mice)
+    assert sequences == list(range(1, 26))
+    assert Animal.query.filter_by(accession_number=existing).one().strain == 'Sprague-Dawley'
+
+
+def test_jsonl_import(db_app):
+    _species()
+    rows = [
+        json.dumps({'species': 'Rattus norvegicus', 'strain': 'Wistar', 'weight_at_start': 300}),
+        '{not json',
+        json.dumps({'species_id': 1, 'sex': 'Male'}),
+        '',
+    ]
+    report = import_animals(io.StringIO('\n'.join(rows)), fmt='jsonl', year=2025)
+    assert report.inserted == 2
+    assert report.errors == [{'line': 2, 'error': report.errors[0]['error']}]
+    assert Animal.query.filter_by(strain='Wistar').one().accession_number.startswith('RN2025')
+
+
+def test_allocation_skips_explicitly_imported_numbers(db_app):
+    _species()
+    assert allocate_accession_number('MM', 2025) == generate_accession_number('MM', 2025, 1)
+    db.session.commit()
+    explicit = generate_accession_number('MM', 2025, 237)
+    lines = ['species_code,strain,accession_number', f'MM,C57BL/6,{explicit}',
+             f'RN,Wistar,{generate_accession_number("RN", 2025, 12)}']
+
+    assert import_animals(io.StringIO('\n'.join(lines)), fmt='csv', year=2025).inserted == 2
+
+    assert allocate_accession_number('MM', 2025) == generate_accession_number('MM', 2025, 238)
+    # A counter seeded by the import also starts after the imported number
+    assert allocate_accession_number('RN', 2025) == generate_accession_number('RN', 2025, 13)
+
+
+def test_generated_numbers_skip_explicit_numbers_in_the_same_batch(db_app):
+    _species()
+    assert allocate_accession_number('MM', 2025) == generate_accession_number('MM', 2025, 1)
+    db.session.commit()
+    lines = ['species_code,strain,accession_number', 'MM,C57BL/6,',
+             f'MM,C57BL/6,{generate_accession_number("MM", 2025, 2)}',
+             f'MM,C57BL/6,{generate_accession_number("MM", 2025, 3)}', 'MM,C57BL/6,']
+
+    report = import_animals(io.StringIO('\n'.join(lines)), fmt='csv', year=2025)
+
+    assert (report.inserted, report.errors) == (4, [])
+    sequences = sorted(parse_accession_number(number)['sequence']
+                       for number in db.session.execute(select(Animal.accession_number)).scalars())
+    assert sequences == [2, 3, 4, 5]
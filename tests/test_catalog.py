@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import event
+
+from models.cache import statistics_cache
+from models.catalog import group_therapies
+from models.database import db, TherapyCategory, Therapy
+from models.engine import READ_ENGINE_KEY
+
+
+def _add_catalog(categories=30):
+    for number in range(categories):
+        category = TherapyCategory(name=f'Category {number:02d}',
+                                   mechanism_of_action=f'MOA {number}')
+        category.therapies = [Therapy(name=f'Drug {number:02d}{suffix}') for suffix in 'BA']
+        db.session.add(category)
+    db.session.add(TherapyCategory(name='Empty'))
+    db.session.commit()
+
+
+def test_groups_from_one_query(db_app):
+    _add_catalog(3)
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    catalog = group_therapies()
+    names = [(category.name, [therapy.name for therapy in therapies])
+             for category, therapies in catalog]
+    assert names == [
+        ('Category 00', ['Drug 00A', 'Drug 00B']), ('Category 01', ['Drug 01A', 'Drug 01B']),
+        ('Category 02', ['Drug 02A', 'Drug 02B']), ('Empty', [])]
+    assert catalog[0][1][0].category.mechanism_of_action == 'MOA 0'
+
+    searched = group_therapies('01a')
+    assert [(category.name, len(therapies)) for category, therapies in searched] == [
+        ('Category 00', 0), ('Category 01', 1), ('Category 02', 0), ('Empty', 0)]
+    assert len(statements) == 2
+
+
+@pytest.fixture
+def app(create_app, tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/catalog.db'})
+    statistics_cache.clear()
+    with app.app_context():
+        db.create_all()
+        _add_catalog()
+        db.session.remove()
+    yield app
+
+
+def test_rendered_catalog_is_cached_per_term_until_therapies_change(app):
+    client = app.test_client()
+    statements = []
+    event.listen(app.extensions[READ_ENGINE_KEY], 'before_cursor_execute',
+                 lambda *args: statements.append(args[2]))
+
+    page = client.get('/therapies').get_data(as_text=True)
+    assert len(statements) == 1
+    assert page.count('class="accordion-item"') == 31 and 'MOA 29' in page and 'Drug 29A' in page
+    assert client.get('/therapies').get_data(as_text=True) == page and len(statements) == 1
+
+    searched = client.get('/therapies?q=drug 07').get_data(as_text=True)
+    assert 'Drug 07A' in searched and 'Drug 08A' not in searched and len(statements) == 2
+
+    with app.app_context():
+        db.session.add(Therapy(name='Drug 99', category_id=1))
+        db.session.commit()
+        db.session.remove()
+    assert 'Drug 99' in client.get('/therapies').get_data(as_text=True) and len(statements) == 3
@@ -0,0 +1,149 @@
+import statistics
+from datetime import datetime
+
+import pytest
+
+from api.rest import api_bp
+from models import cohort_statistics
+from models.cache import statistics_cache
+from models.cohort_statistics import compute_experiment_stats, get_experiment_stats, t_critical
+from models.database import (
+    db, Species, Animal, Experiment, Therapy, TherapyCategory, AssayType, Assay, AssayMeasurement
+)
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def engine(request, monkeypatch):
+    """Run each test with the NumPy reductions and with the Python fallback"""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(cohort_statistics, 'np', None)
+    return request.param
+
+
+@pytest.fixture
+def study(db_app):
+    """One experiment with assays of three treated and two control animals"""
+    species = Species(common_name='Mouse', scientific_name='Mus musculus')
+    category = TherapyCategory(name='Small Molecule')
+    assay_type = AssayType(name='Blood Chemistry')
+    db.session.add_all([species, category, assay_type])
+    db.session.flush()
+    therapy = Therapy(name='Metformin', category_id=category.id)
+    animals = [Animal(accession_number=f'MM20250000{index:02d}A5', species_id=species.id)
+               for index in range(5)]
+    db.session.add_all(animals + [therapy])
+    db.session.flush()
+    experiments = [Experiment(title=f'Study {index}', animal_id=animal.id,
+                              start_date=datetime(2025, 1, 6),
+                              control_group='Vehicle' if index >= 3 else None)
+                   for index, animal in enumerate(animals)]
+    db.session.add_all(experiments)
+    db.session.flush()
+    for experiment in experiments[:3]:
+        experiment.therapies.append(therapy)
+
+    glucose = {0: [100.0, 110.0, 120.0, 90.0, 95.0], 24: [80.0, 90.0, None, 96.0, 100.0]}
+    for hours, values in glucose.items():
+        for animal, value in zip(animals, values):
+            assay = Assay(experiment_id=experiments[0].id, assay_type_id=assay_type.id,
+                          timepoint_hours=hours)
+            assay.animals.append(animal)
+            assay.measurements = [AssayMeasurement(parameter_name='Glucose', value=value,
+                                                   unit='mg/dL')]
+            db.session.add(assay)
+    db.session.commit()
+    return experiments[0], animals
+
+
+def _group(stats, arm, hours):
+    return next(g for g in stats['groups'] if g['arm'] == arm and g['timepoint_hours'] == hours)
+
+
+def test_groups_by_arm_timepoint_and_parameter(study, engine):
+    experiment, animals = study
+
+    stats = compute_experiment_stats(experiment.id)
+
+    assert stats['arms'] == [
+        {'label': 'Metformin', 'animal_ids': [a.id for a in animals[:3]]},
+        {'label': 'Vehicle (control)', 'animal_ids': [a.id for a in animals[3:]]},
+    ]
+    treated = _group(stats, 'Metformin', 0)
+    values = [100.0, 110.0, 120.0]
+    sd = statistics.stdev(values)
+    assert (treated['n'], treated['mean'], treated['median'], treated['unit']) == \
+        (3, 110.0, 110.0, 'mg/dL')
+    assert treated['sd'] == pytest.approx(sd) and treated['sem'] == pytest.approx(sd / 3 ** 0.5)
+    assert (treated['q1'], treated['q3'], treated['iqr']) == (105.0, 115.0, 10.0)
+    assert treated['ci_low'] == pytest.approx(110.0 - 4.303 * sd / 3 ** 0.5)
+    assert treated['ci_high'] == pytest.approx(110.0 + 4.303 * sd / 3 ** 0.5)
+
+    # The missing value is left out of n
+    assert _group(stats, 'Metformin', 24)['n'] == 2
+    assert _group(stats, 'Vehicle (control)', 24)['mean'] == 98.0
+
+
+def test_single_value_groups_have_no_spread(study, engine):
+    experiment, animals = study
+    db.session.delete(animals[4].assays[0].measurements[0])
+    db.session.delete(animals[4].assays[1].measurements[0])
+    db.session.commit()
+
+    control = _group(compute_experiment_stats(experiment.id), 'Vehicle (control)', 0)
+
+    assert (control['n'], control['mean'], control['median'], control['iqr']) == \
+        (1, 90.0, 90.0, 0.0)
+    assert control['sd'] is None and control['sem'] is None and control['ci_low'] is None
+
+
+def test_t_critical():
+    assert t_critical(1) == 12.706 and t_critical(30) == 2.042
+    assert t_critical(60) == pytest.approx(2.000, abs=1e-3)
+    assert t_critical(1000) == pytest.approx(1.962, abs=1e-3)
+
+
+def test_endpoint_is_cached_until_measurements_change(db_app, study):
+    experiment, animals = study
+    db_app.register_blueprint(api_bp)
+    statistics_cache.watch(db.session)
+    statistics_cache.clear()
+    client = db_app.test_client()
+
+    first = client.get(f'/api/experiments/{experiment.id}/stats').get_json()
+    cached = statistics_cache.get(f'experiment_stats:{experiment.id}')
+    assert get_experiment_stats(experiment.id) is cached[1]
+
+    assay = Assay(experiment_id=experiment.id, assay_type_id=animals[0].assays[0].assay_type_id,
+                  timepoint_hours=0)
+    assay.animals.append(animals[0])
+    assay.measurements = [AssayMeasurement(parameter_name='Glucose', value=130.0, unit='mg/dL')]
+    db.session.add(assay)
+    db.session.commit()
+
+    second = client.get(f'/api/experiments/{experiment.id}/stats').get_json()
+    assert _group(first, 'Metformin', 0)['n'] == 3 and _group(second, 'Metformin', 0)['n'] == 4
+    assert client.get('/api/experiments/999/stats').status_code == 404
+
+
+def test_cache_is_kept_when_other_experiments_change(db_app, study):
+    experiment, animals = study
+    statistics_cache.watch(db.session)
+    statistics_cache.clear()
+    first = get_experiment_stats(experiment.id)
+
+    other = Assay(experiment_id=experiment.id + 1, assay_type_id=animals[0].assays[0].assay_type_id,
+                  timepoint_hours=0)
+    other.measurements = [AssayMeasurement(parameter_name='Glucose', value=130.0, unit='mg/dL')]
+    db.session.add(other)
+    db.session.commit()
+    assert get_experiment_stats(experiment.id) is first
+
+    assay = Assay(experiment_id=experiment.id, assay_type_id=other.assay_type_id, timepoint_hours=0)
+    assay.animals.append(animals[0])
+    assay.measurements = [AssayMeasurement(parameter_name='Glucose', value=130.0, unit='mg/dL')]
+    db.session.add(assay)
+    db.session.commit()
+    second = get_experiment_stats(experiment.id)
+    assert second is not first and _group(second, 'Metformin', 0)['n'] == 4
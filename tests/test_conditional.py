@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models.cache import statistics_cache
+from models.conditional import touch_validators
+from models.database import db, Species, Animal, Experiment, AssayType, Assay, AssayMeasurement
+from models.engine import READ_ENGINE_KEY
+from models.series import refresh_series
+
+
+@pytest.fixture
+def app(create_app, tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/conditional.db'})
+    statistics_cache.clear()
+    with app.app_context():
+        db.create_all()
+        species = Species(common_name='Mouse', scientific_name='Mus musculus')
+        assay_type = AssayType(name='Blood Chemistry')
+        db.session.add_all([species, assay_type])
+        db.session.flush()
+        animal = Animal(accession_number='MM2025000001A5', species_id=species.id)
+        db.session.add(animal)
+        db.session.flush()
+        experiment = Experiment(title='Baseline', animal_id=animal.id,
+                                start_date=datetime(2025, 1, 6))
+        db.session.add(experiment)
+        db.session.flush()
+        assay = Assay(experiment_id=experiment.id, assay_type_id=assay_type.id, timepoint_hours=0.0)
+        assay.animals.append(animal)
+        assay.measurements = [AssayMeasurement(parameter_name='Glucose', value=100.0, unit='mg/dL')]
+        db.session.add(assay)
+        db.session.commit()
+        refresh_series()
+        db.session.remove()
+    yield app
+
+
+def _add_data(app):
+    """Add a Glucose value to the assay and a second assay to the experiment"""
+    with app.app_context():
+        db.session.add_all([AssayMeasurement(assay_id=1, parameter_name='Glucose', value=110.0,
+                                             unit='mg/dL'),
+                            Assay(experiment_id=1, assay_type_id=1, timepoint_hours=24.0)])
+        db.session.commit()
+        refresh_series()
+        db.session.remove()
+
+
+@pytest.mark.parametrize('url, cache_control', [
+    ('/experiments/1', 'private, no-cache'),
+    ('/experiment_profile/1', 'private, no-cache'),
+    ('/assay/1', 'private, no-cache'),
+    ('/api/experiments/1/stats', 'no-cache'),
+    ('/api/animals/1/series/Glucose', 'no-cache'),
+    ('/api/assays?experiment_id=1', 'no-cache'),
+])
+def test_repeat_requests_get_304_until_the_data_changes(app, url, cache_control):
+    client = app.test_client()
+    first = client.get(url)
+    first.get_data()
+    assert first.status_code == 200 and first.headers['Cache-Control'] == cache_control
+    etag = first.headers['ETag']
+
+    repeat = client.get(url, headers={'If-None-Match': etag})
+    assert repeat.status_code == 304 and repeat.headers['ETag'] == etag and not repeat.data
+    if 'Last-Modified' in first.headers:
+        since = first.headers['Last-Modified']
+        assert client.get(url, headers={'If-Modified-Since': since}).status_code == 304
+
+    _add_data(app)
+    changed = client.get(url, headers={'If-None-Match': etag})
+    changed.get_data()
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+
+def test_304_is_answered_before_the_view_queries(app):
+    client = app.test_client()
+    etag = client.get('/experiment_profile/1').headers['ETag']
+    with app.app_context():
+        statements = []
+        event.listen(app.extensions[READ_ENGINE_KEY], 'before_cursor_execute',
+                     lambda *args: statements.append(args[2]))
+        response = client.get('/experiment_profile/1', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+    assert len(statements) == 1
+
+
+def test_bulk_rewrites_and_missing_entities(app):
+    client = app.test_client()
+    with client.get('/assay/1') as response:
+        etag = response.headers['ETag']
+    # As a maintenance command would, outside any request
+    with app.app_context(), Session(db.engine) as session:
+        touch_validators(session)
+        session.commit()
+    assert client.get('/assay/1', headers={'If-None-Match': etag}).status_code == 200
+
+    missing = client.get('/api/experiments/99/stats')
+    assert missing.status_code == 404 and 'ETag' not in missing.headers
+    assert client.get('/api/animals/1/series/Weight').status_code == 404
+    assert client.get('/api/summary').headers['Cache-Control'] == 'public, max-age=30'
+
+
+def test_collection_validators_do_not_scan_tables(app):
+    client = app.test_client()
+    etag = client.get('/api/measurements?experiment_id=1').headers['ETag']
+    statements = []
+    event.listen(app.extensions[READ_ENGINE_KEY], 'before_cursor_execute',
+                 lambda *args: statements.append(args[2]))
+
+    response = client.get('/api/measurements?experiment_id=1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert len(statements) == 1 and 'count(' not in statements[0].lower()
@@ -0,0 +1,77 @@
+import io
+from datetime import datetime
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from models.database import (
+    db, Species, Animal, TherapyCategory, Therapy, Experiment, AssayType, Assay, AssayMeasurement
+)
+from models.export import write_measurements, stream_measurements
+
+
+def _measurements(count=25):
+    mouse = Species(common_name='Mouse', scientific_name='Mus musculus')
+    chemistry = AssayType(name='Blood Chemistry', category='Biochemical')
+    small_molecules = TherapyCategory(name='Small Molecules')
+    db.session.add_all([mouse, chemistry, small_molecules])
+    db.session.flush()
+    animal = Animal(accession_number='MM2025000001C9', species_id=mouse.id, strain='C57BL/6',
+                    sex='Female')
+    db.session.add(animal)
+    db.session.flush()
+    experiment = Experiment(title='Panel', animal_id=animal.id, start_date=datetime(2025, 1, 1))
+    experiment.therapies = [Therapy(name='Metformin', category_id=small_molecules.id),
+                           Therapy(name='Aspirin', category_id=small_molecules.id)]
+    db.session.add(experiment)
+    db.session.flush()
+    assay = Assay(experiment_id=experiment.id, assay_type_id=chemistry.id, timepoint='Day 7')
+    db.session.add(assay)
+    db.session.flush()
+    db.session.add_all([AssayMeasurement(assay_id=assay.id, parameter_name=f'P{i % 3}',
+                                         value=float(i), unit='mg/dL', is_normal=i % 2 == 0)
+                        for i in range(count)])
+    db.session.commit()
+    return experiment
+
+
+def test_write_parquet_in_chunks(db_app):
+    experiment = _measurements()
+    sink = io.BytesIO()
+
+    written = write_measurements(sink, 'parquet', experiment_id=experiment.id, chunk_size=10)
+
+    assert written == 25
+    parquet = pq.ParquetFile(io.BytesIO(sink.getvalue()))
+    assert parquet.metadata.num_rows == 25
+    assert parquet.num_row_groups == 3
+    table = parquet.read()
+    assert pa.types.is_dictionary(table.schema.field('parameter_name').type)
+    assert table.column('value').to_pylist() == [float(i) for i in range(25)]
+    assert set(table.column('therapies').to_pylist()) == {'Aspirin; Metformin'}
+    assert set(table.column('species').to_pylist()) == {'Mus musculus'}
+
+
+def test_filters_exclude_other_experiments(db_app):
+    experiment = _measurements()
+    sink = io.BytesIO()
+
+    assert write_measurements(sink, 'arrow', experiment_id=experiment.id + 1) == 0
+    assert pa.ipc.open_stream(io.BytesIO(sink.getvalue())).read_all().num_rows == 0
+
+
+def test_streamed_arrow_file_is_readable(db_app):
+    _measurements()
+
+    chunks = list(stream_measurements('arrow', chunk_size=10))
+
+    table = pa.ipc.open_stream(io.BytesIO(b''.join(chunks))).read_all()
+    assert table.num_rows == 25
+    assert table.column('is_normal').to_pylist()[:2] == [True, False]
+
+
+def test_stream_rejects_unknown_format(db_app):
+    with pytest.raises(ValueError):
+        stream_measurements('csv')
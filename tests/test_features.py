@@ -0,0 +1,146 @@
+import csv
+import io
+import math
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+np = pytest.importorskip('numpy')
+
+from models.database import (
+    db, Species, Animal, Experiment, Therapy, TherapyCategory, AssayType, Assay, AssayMeasurement
+)
+from models.features import FeatureMatrixBuilder, feature_matrices, write_feature_matrix
+from models.synthetic import generate_dataset
+
+
+def _animal(species, accession_number, **columns):
+    animal = Animal(accession_number=accession_number, species_id=species.id, **columns)
+    db.session.add(animal)
+    db.session.flush()
+    experiment = Experiment(title='Dosing', animal_id=animal.id, start_date=datetime(2025, 1, 6))
+    db.session.add(experiment)
+    db.session.flush()
+    return animal, experiment
+
+
+def _measure(animal, experiment, assay_type, hours, **values):
+    assay = Assay(experiment_id=experiment.id, assay_type_id=assay_type.id, timepoint_hours=hours)
+    assay.animals.append(animal)
+    assay.measurements = [AssayMeasurement(parameter_name=name, value=value, unit='mg/dL')
+                          for name, value in values.items()]
+    db.session.add(assay)
+    db.session.commit()
+
+
+@pytest.fixture
+def cohort(db_app):
+    species = Species(common_name='Mouse', scientific_name='Mus musculus')
+    assay_type = AssayType(name='Blood Chemistry')
+    category = TherapyCategory(name='Small Molecule')
+    db.session.add_all([species, assay_type, category])
+    db.session.flush()
+    first, first_experiment = _animal(species, 'MM2025000001A5', strain='C57BL/6', sex='Male',
+                                      age_at_start=8.0, weight_at_start=25.0)
+    second, second_experiment = _animal(species, 'MM2025000002A6', sex='Female', age_at_start=10.0)
+    therapy = Therapy(name='Metformin', category_id=category.id)
+    first_experiment.therapies.append(therapy)
+    db.session.commit()
+    _measure(first, first_experiment, assay_type, 0.0, Glucose=100.0, Insulin=1.0)
+    _measure(first, first_experiment, assay_type, 168.0, Glucose=80.0)
+    _measure(second, second_experiment, assay_type, 0.0, Glucose=120.0)
+    return first, second, second_experiment, assay_type
+
+
+def test_per_animal_and_per_timepoint_rows(cohort):
+    first, second, _, _ = cohort
+    builder = FeatureMatrixBuilder()
+
+    by_animal = builder.build()
+    assert by_animal.animal_ids.tolist() == [first.id, second.id]
+    assert by_animal.parameters == ['Glucose', 'Insulin'] and by_animal.units == ['mg/dL', 'mg/dL']
+    assert by_animal.values[0].tolist() == [90.0, 1.0]
+    assert by_animal.values[1, 0] == 120.0 and math.isnan(by_animal.values[1, 1])
+    assert by_animal.covariates['sex'].tolist() == ['Male', 'Female']
+    assert by_animal.therapies == ['Metformin']
+    assert by_animal.therapy_matrix[:, 0].tolist() == [1, 0]
+
+    by_timepoint = builder.build(by='timepoint')
+    assert by_timepoint.animal_ids.tolist() == [first.id, first.id, second.id]
+    assert by_timepoint.timepoint_hours.tolist() == [0.0, 168.0, 0.0]
+    assert by_timepoint.values[:, 0].tolist() == [100.0, 80.0, 120.0]
+    assert by_timepoint.covariates['age_weeks'].tolist() == [8.0, 9.0, 10.0]
+    assert by_timepoint.therapy_matrix[:, 0].tolist() == [1, 1, 0]
+    assert [column['kind'] for column in by_timepoint.columns()].count('measurement') == 2
+
+
+def test_unchanged_data_is_served_from_cache_and_changes_decode_only_affected_animals(cohort):
+    _, second, second_experiment, assay_type = cohort
+    builder = FeatureMatrixBuilder()
+
+    matrix = builder.build()
+    assert builder.build() is matrix
+    assert (builder.builds, builder.animals_decoded) == (1, 2)
+
+    _measure(second, second_experiment, assay_type, 24.0, Glucose=130.0, Weight=22.0)
+    refreshed = builder.build()
+
+    assert refreshed is not matrix and refreshed.parameters == ['Glucose', 'Insulin', 'Weight']
+    assert refreshed.values[1].tolist()[::2] == [125.0, 22.0]
+    assert (builder.builds, builder.animals_decoded) == (2, 3)
+
+
+def test_assays_entered_without_animal_links(db_app):
+    species = Species(common_name='Mouse', scientific_name='Mus musculus')
+    assay_type = AssayType(name='Blood Chemistry')
+    db.session.add_all([species, assay_type])
+    db.session.flush()
+    animal, experiment = _animal(species, 'MM2025000001A5')
+    # The web form creates assays without animal_assays links
+    assay = Assay(experiment_id=experiment.id, assay_type_id=assay_type.id, timepoint_hours=0.0)
+    assay.measurements = [AssayMeasurement(parameter_name='Glucose', value=95.0, unit='mg/dL')]
+    db.session.add(assay)
+    db.session.commit()
+
+    matrix = FeatureMatrixBuilder().build()
+
+    assert matrix.animal_ids.tolist() == [animal.id] and matrix.parameters == ['Glucose']
+    assert matrix.values.tolist() == [[95.0]]
+
+
+def test_matches_measurement_rows(db_app):
+    generate_dataset(scale=0.01, seed=3)
+    matrix = FeatureMatrixBuilder().build(by='timepoint')
+
+    rows = db.session.execute(select(Animal.id, Assay.timepoint_hours,
+                                     AssayMeasurement.parameter_name,
+                                     AssayMeasurement.canonical_value)
+                              .join(Animal.assays).join(Assay.measurements)).all()
+    expected = {}
+    for animal_id, hours, name, value in rows:
+        if value is not None:
+            expected.setdefault((animal_id, hours, name), []).append(value)
+    column = {name: index for index, name in enumerate(matrix.parameters)}
+    keys = zip(matrix.animal_ids, matrix.timepoint_hours.tolist())
+    row = {(int(a), h): i for i, (a, h) in enumerate(keys)}
+    assert int(np.count_nonzero(~np.isnan(matrix.values))) == len(expected)
+    for (animal_id, hours, name), values in expected.items():
+        mean = sum(values) / len(values)
+        assert matrix.values[row[animal_id, hours], column[name]] == pytest.approx(mean)
+
+
+def test_csv_and_npz_export(cohort, tmp_path):
+    feature_matrices.clear()
+    stream = io.StringIO()
+
+    assert write_feature_matrix(stream, 'csv') == 2
+    rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+    assert rows[0]['Glucose'] == '90.0' and rows[1]['Insulin'] == ''
+    assert rows[0]['therapy:Metformin'] == '1' and rows[0]['species'] == 'Mus musculus'
+
+    path = tmp_path / 'features.npz'
+    write_feature_matrix(str(path), 'npz', by='timepoint')
+    archive = np.load(path)
+    assert archive['values'].shape == (3, 2)
+    assert archive['parameters'].tolist() == ['Glucose', 'Insulin']
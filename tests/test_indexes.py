@@ -0,0 +1,59 @@
+from sqlalchemy import Column, MetaData, Table, inspect, insert, select, func
+
+from models.database import db, experiment_therapy_association
+from models.indexes import ASSOCIATION_TABLES, migrate_indexes, association_key_name
+
+
+def create_legacy_schema(connection):
+    """Schema before the index plan: no indexes, unkeyed association tables"""
+    db.metadata.create_all(connection)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.drop(connection)
+    legacy = MetaData()
+    for table in ASSOCIATION_TABLES:
+        table.drop(connection)
+        Table(table.name, legacy, *[Column(column.name, column.type) for column in table.columns])
+    legacy.create_all(connection)
+
+
+def _index_names(connection, table):
+    return {index['name'] for index in inspect(connection).get_indexes(table)}
+
+
+def test_new_databases_are_already_indexed(db_app):
+    with db.engine.begin() as connection:
+        assert migrate_indexes(connection) == []
+        assert ('ix_assay_measurements_assay_id_parameter_name'
+                in _index_names(connection, 'assay_measurements'))
+        key = inspect(connection).get_pk_constraint('experiment_therapy')
+        assert key['constrained_columns'] == ['experiment_id', 'therapy_id']
+
+
+def test_migrates_legacy_schema(db_app):
+    db.drop_all()
+    with db.engine.begin() as connection:
+        create_legacy_schema(connection)
+        assert _index_names(connection, 'experiments') == set()
+        connection.execute(insert(experiment_therapy_association), [
+            {'experiment_id': 1, 'therapy_id': 2},
+            {'experiment_id': 1, 'therapy_id': 2},
+            {'experiment_id': 1, 'therapy_id': None},
+            {'experiment_id': 2, 'therapy_id': 2},
+        ])
+
+        changes = migrate_indexes(connection)
+
+        assert 'Added composite key to experiment_therapy (2 bad link rows removed)' in changes
+        assert ({'ix_experiments_created_at', 'ix_experiments_animal_id'}
+                <= _index_names(connection, 'experiments'))
+        assert (association_key_name(experiment_therapy_association)
+                in _index_names(connection, 'experiment_therapy'))
+        assert connection.execute(
+            select(func.count()).select_from(experiment_therapy_association)).scalar() == 2
+        plan = ' '.join(row[-1] for row in connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT value FROM assay_measurements "
+            "WHERE assay_id = 1 AND parameter_name = 'ALT'"))
+        assert 'ix_assay_measurements_assay_id_parameter_name' in plan
+
+        assert migrate_indexes(connection) == []
@@ -0,0 +1,75 @@
+import logging
+
+from flask import render_template_string
+from sqlalchemy import text
+
+from models.database import db
+from models.metrics import MetricsRegistry, init_app
+
+
+def _instrumented(db_app):
+    registry = MetricsRegistry()
+    init_app(db_app, registry)
+
+    @db_app.route('/three-queries')
+    def three_queries():
+        for _ in range(3):
+            db.session.execute(text('SELECT :one'), {'one': 1})
+        return render_template_string('{{ n }} queries', n=3)
+
+    return registry, db_app.test_client()
+
+
+def test_records_requests_sql_and_templates(db_app):
+    registry, client = _instrumented(db_app)
+
+    client.get('/three-queries')
+    client.get('/three-queries')
+    client.get('/missing')
+
+    assert registry.requests[('three_queries', 'GET', 200)] == 2
+    assert registry.requests[('unmatched', 'GET', 404)] == 1
+    assert registry.sql_statements['three_queries'] == 6
+    assert registry.statements_per_request['three_queries'].count == 2
+    assert registry.templates['inline'].count == 2
+
+    exposition = registry.render()
+    assert ('invivodb_http_requests_total{endpoint="three_queries",method="GET",status="200"} 2'
+            in exposition)
+    assert ('invivodb_sql_statements_per_request_bucket{endpoint="three_queries",le="5"} 2'
+            in exposition)
+    assert ('invivodb_sql_statements_per_request_bucket{endpoint="three_queries",le="2"} 0'
+            in exposition)
+    assert 'invivodb_http_request_duration_seconds_count{endpoint="three_queries"} 2' in exposition
+
+
+def test_logs_slow_queries_with_route(db_app, caplog):
+    registry, client = _instrumented(db_app)
+    db_app.config['SLOW_QUERY_THRESHOLD_MS'] = 0
+
+    with caplog.at_level(logging.WARNING, logger='invivodb.sql'):
+        client.get('/three-queries')
+
+    assert registry.slow_queries['three_queries'] == 3
+    assert 'on GET /three-queries: SELECT ?' in caplog.text
+    assert 'parameters' not in caplog.text
+
+    caplog.clear()
+    db_app.config['LOG_QUERY_PARAMETERS'] = True
+    with caplog.at_level(logging.WARNING, logger='invivodb.sql'):
+        client.get('/three-queries')
+    assert 'SELECT ? | parameters: (1,)' in caplog.text
+
+
+def test_metrics_endpoint_only_answers_allowed_clients(create_app):
+    app = create_app('testing')
+    client = app.test_client()
+
+    assert client.get('/metrics').status_code == 200  # The test client connects from 127.0.0.1
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.1.2.3'}).status_code == 403
+
+    app.config['METRICS_ALLOWED_IPS'] = ['10.0.0.0/8']
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.1.2.3'}).status_code == 200
+    assert client.get('/metrics').status_code == 403
+    app.config['METRICS_ALLOWED_IPS'] = ['*']
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '192.0.2.7'}).status_code == 200
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from models.database import db, Species, Animal, AssayType
+from models.pagination import paginate_keyset, encode_cursor, decode_cursor, DIRECTION_NEXT
+
+ANIMAL_ORDER = [(Animal.created_at, True), (Animal.id, True)]
+
+
+def _populate_animals(count):
+    mouse = Species(common_name='Mouse', scientific_name='Mus musculus')
+    db.session.add(mouse)
+    db.session.flush()
+    start = datetime(2025, 1, 1)
+    # Pairs of animals share a timestamp so the id tie-breaker matters
+    db.session.add_all([
+        Animal(accession_number=f'MM{i:012d}', species_id=mouse.id,
+               created_at=start + timedelta(hours=i // 2))
+        for i in range(count)
+    ])
+    db.session.commit()
+    return [a.id for a in Animal.query.order_by(Animal.created_at.desc(), Animal.id.desc())]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([datetime(2025, 3, 4, 5, 6, 7), 42, 'x'], DIRECTION_NEXT, 3)
+    assert decode_cursor(cursor) == ([datetime(2025, 3, 4, 5, 6, 7), 42, 'x'], DIRECTION_NEXT, 3)
+    assert decode_cursor('not-a-cursor') is None
+
+
+def test_walk_forward_and_back(db_app):
+    expected = _populate_animals(47)
+
+    seen, pages, cursor = [], [], None
+    while True:
+        page = paginate_keyset(Animal.query, ANIMAL_ORDER, cursor=cursor, per_page=10)
+        pages.append(page)
+        seen.extend(a.id for a in page.items)
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    assert seen == expected
+    assert [p.page for p in pages] == [1, 2, 3, 4, 5]
+    assert not pages[0].has_prev and pages[-1].has_prev
+
+    # Walking back from the last page reproduces earlier pages
+    back = paginate_keyset(Animal.query, ANIMAL_ORDER, cursor=pages[-1].prev_cursor, per_page=10)
+    assert back.page == 4
+    assert [a.id for a in back.items] == [a.id for a in pages[3].items]
+    assert back.has_next and back.has_prev
+
+    first = paginate_keyset(Animal.query, ANIMAL_ORDER, cursor=pages[1].prev_cursor, per_page=10)
+    assert first.page == 1 and not first.has_prev
+
+
+def test_legacy_page_number_and_total(db_app):
+    expected = _populate_animals(25)
+    page = paginate_keyset(Animal.query, ANIMAL_ORDER, per_page=10, page=2, total=lambda: 25)
+    assert [a.id for a in page.items] == expected[10:20]
+    assert page.total == 25 and page.pages == 3
+    assert list(page.iter_pages()) == [2]
+
+    following = paginate_keyset(Animal.query, ANIMAL_ORDER, cursor=page.next_cursor, per_page=10)
+    assert [a.id for a in following.items] == expected[20:]
+    assert following.pages == 3 and not following.has_next
+
+
+def test_mixed_directions(db_app):
+    db.session.add_all([AssayType(name=f'Assay {i % 4}-{i}', category=str(i % 3))
+                        for i in range(12)])
+    db.session.commit()
+    order = [(AssayType.category, True), (AssayType.name, False)]
+    expected = [at.name for at in
+                AssayType.query.order_by(AssayType.category.desc(), AssayType.name)]
+
+    names, cursor = [], None
+    while True:
+        page = paginate_keyset(AssayType.query, order, cursor=cursor, per_page=5)
+        names.extend(at.name for at in page.items)
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    assert names == expected
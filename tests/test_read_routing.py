@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import event, select, text
+from sqlalchemy.exc import OperationalError
+
+from models.cache import statistics_cache
+from models.database import db, AssayType
+from models.engine import READ_ENGINE_KEY, read_only_url
+
+
+@pytest.fixture
+def app(create_app, tmp_path):
+    app = create_app({'DATABASE_PROFILE': 'production',
+                      'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/split.db'})
+    statistics_cache.clear()
+    with app.app_context():
+        db.create_all()
+    yield app
+
+
+def _statements(engine):
+    seen = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: seen.append(args[2]))
+    return seen
+
+
+def test_read_only_url():
+    assert read_only_url('sqlite:////data/invivo db.db') == \
+        'sqlite:///file:/data/invivo%20db.db?mode=ro&uri=true'
+    assert read_only_url('sqlite:///file:/data/x.db?uri=true&cache=shared') == \
+        'sqlite:///file:/data/x.db?cache=shared&mode=ro&uri=true'
+    assert read_only_url('sqlite://') is None
+    assert read_only_url('sqlite:///file:mem?mode=memory&uri=true') is None
+    assert read_only_url('postgresql://invivo@db/invivodb') is None
+
+
+def test_get_reads_from_replica_and_post_writes_to_primary(app):
+    with app.app_context():
+        primary, replica = db.engine, app.extensions[READ_ENGINE_KEY]
+    primary_statements, replica_statements = _statements(primary), _statements(replica)
+    client = app.test_client()
+
+    response = client.post('/add_assay_type', data={'name': 'Hematology', 'category': 'Blood'})
+    assert response.status_code == 302
+    assert any(statement.startswith('INSERT INTO assay_types') for statement in primary_statements)
+    assert replica_statements == []
+
+    primary_statements.clear()
+    response = client.get('/api/assay_types')
+    assert [item['name'] for item in response.get_json()] == ['Hematology']
+    assert primary_statements == []
+    assert replica_statements
+
+
+def test_long_read_does_not_block_writes(app):
+    with app.app_context():
+        replica = app.extensions[READ_ENGINE_KEY]
+        with replica.connect() as reader:
+            reader.exec_driver_sql('BEGIN')
+            assert reader.execute(select(AssayType.id)).all() == []
+
+            # The writer commits while the read transaction is still open; the
+            # reader keeps its snapshot
+            db.session.add(AssayType(name='Urinalysis'))
+            db.session.commit()
+            assert reader.execute(select(AssayType.id)).all() == []
+            reader.exec_driver_sql('COMMIT')
+
+            assert len(reader.execute(select(AssayType.id)).all()) == 1
+
+
+def test_write_during_get_is_rejected(app):
+    with app.test_request_context('/', method='GET'):
+        with pytest.raises(OperationalError, match='readonly'):
+            db.session.execute(text("INSERT INTO assay_types (name) VALUES ('Stray')"))
+        db.session.rollback()
+
+        # Pending ORM changes flush to the primary
+        db.session.add(AssayType(name='Deliberate'))
+        db.session.commit()
+        assert db.session.execute(select(AssayType.name)).scalars().all() == ['Deliberate']
+
+
+def test_split_can_be_disabled(create_app, tmp_path):
+    assert READ_ENGINE_KEY not in create_app('testing').extensions
+    app = create_app({'DATABASE_PROFILE': 'production', 'READ_DATABASE_URI': False,
+                      'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/single.db'})
+    assert READ_ENGINE_KEY not in app.extensions
@@ -0,0 +1,145 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from models.database import (
+    db, Species, Animal, Experiment, AssayType, Assay, AssayMeasurement, MigrationCheckpoint,
+    ReferenceRange
+)
+from models.reference_ranges import (
+    CHECKPOINT_NAME, load_reference_ranges, match_reference_range, reflag_measurements
+)
+
+
+@pytest.fixture
+def mice(db_app):
+    """Glucose of a young male C57BL/6, an older female and a BALB/c mouse"""
+    species = Species(common_name='Mouse', scientific_name='Mus musculus')
+    assay_type = AssayType(name='Blood Chemistry')
+    db.session.add_all([species, assay_type])
+    db.session.flush()
+    animals = [Animal(accession_number='MM2025000001A5', species_id=species.id, strain='C57BL/6',
+                      sex='Male', age_at_start=6.0),
+               Animal(accession_number='MM2025000002A6', species_id=species.id, strain='C57BL/6',
+                      sex='Female', age_at_start=20.0),
+               Animal(accession_number='MM2025000003A7', species_id=species.id, strain='BALB/c',
+                      sex='Male', age_at_start=10.0)]
+    db.session.add_all(animals)
+    db.session.flush()
+    for animal, value in zip(animals, (150.0, 150.0, 150.0)):
+        experiment = Experiment(title='Baseline', animal_id=animal.id,
+                                start_date=datetime(2025, 1, 6))
+        db.session.add(experiment)
+        db.session.flush()
+        assay = Assay(experiment_id=experiment.id, assay_type_id=assay_type.id,
+                      timepoint_hours=336.0)
+        assay.measurements = [
+            AssayMeasurement(parameter_name='Glucose', value=value, unit='mg/dL',
+                             reference_range_min=70.0, reference_range_max=160.0, is_normal=True),
+            AssayMeasurement(parameter_name='Glucose', value=8.3, unit='mmol/L'),
+            AssayMeasurement(parameter_name='ALT', value=40.0, unit='U/L', is_normal=True),
+        ]
+        db.session.add(assay)
+    db.session.commit()
+    return species
+
+
+def _flags(parameter='Glucose', unit='mg/dL'):
+    return db.session.execute(select(AssayMeasurement.reference_range_min,
+                                     AssayMeasurement.reference_range_max,
+                                     AssayMeasurement.is_normal)
+                              .where(AssayMeasurement.parameter_name == parameter,
+                                     AssayMeasurement.unit == unit)
+                              .order_by(AssayMeasurement.id)).all()
+
+
+def test_most_specific_range_wins(mice):
+    db.session.add_all([
+        ReferenceRange(species_id=mice.id, parameter_name='Glucose', unit='mg/dL',
+                       range_min=80, range_max=200),
+        ReferenceRange(species_id=mice.id, parameter_name='Glucose', unit='mg/dL', sex='Female',
+                       range_min=90, range_max=140),
+        # Young C57BL/6: the first animal is 8 weeks old at the 336 h timepoint
+        ReferenceRange(species_id=mice.id, parameter_name='Glucose', unit='mg/dL', strain='C57BL/6',
+                       age_max_weeks=12, range_min=100, range_max=145),
+    ])
+    db.session.commit()
+
+    result = reflag_measurements(batch_size=2)
+
+    assert _flags() == [(100.0, 145.0, False), (90.0, 140.0, False), (80.0, 200.0, True)]
+    # Only Glucose has ranges; the mmol/L rows have no range in their unit and
+    # are left alone
+    assert (result['scanned'], result['matched'], result['unmatched'], result['updated']) == \
+        (6, 3, 3, 3)
+    assert _flags(unit='mmol/L') == [(None, None, None)] * 3
+    assert _flags('ALT', 'U/L') == [(None, None, True)] * 3
+    assert db.session.get(MigrationCheckpoint, CHECKPOINT_NAME) is None
+
+
+def test_unit_spelling_variants_match(mice):
+    db.session.add(ReferenceRange(species_id=mice.id, parameter_name='Glucose', unit='mmol/l',
+                                  range_min=4.0, range_max=8.0))
+    db.session.execute(AssayMeasurement.__table__.update()
+                       .where(AssayMeasurement.parameter_name == 'Glucose',
+                              AssayMeasurement.unit == 'mg/dL')
+                       .values(unit=' mg/dl'))
+    db.session.add(ReferenceRange(species_id=mice.id, parameter_name='Glucose', unit='mg/dL',
+                                  range_min=80, range_max=200))
+    db.session.commit()
+
+    result = reflag_measurements()
+
+    assert (result['matched'], result['unmatched']) == (6, 0)
+    assert _flags(unit='mmol/L') == [(4.0, 8.0, False)] * 3
+    assert _flags(unit=' mg/dl') == [(80.0, 200.0, True)] * 3
+
+
+def test_revised_range_only_rewrites_changed_rows(mice):
+    reference = ReferenceRange(species_id=mice.id, parameter_name='Glucose', unit='mg/dL',
+                               range_min=70, range_max=160)
+    db.session.add(reference)
+    db.session.commit()
+    assert reflag_measurements()['updated'] == 0
+
+    reference.range_max = 120
+    db.session.commit()
+    progress = []
+    result = reflag_measurements(species_id=mice.id, batch_size=4,
+                                 progress=lambda totals: progress.append(dict(totals)))
+
+    assert _flags() == [(70.0, 120.0, False)] * 3
+    assert result['updated'] == 3 and [totals['scanned'] for totals in progress] == [4, 6]
+
+
+def test_interrupted_run_resumes(mice):
+    db.session.add(ReferenceRange(species_id=mice.id, parameter_name='Glucose', unit='mg/dL',
+                                  range_min=70, range_max=120))
+    db.session.commit()
+
+    def stop(totals):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        reflag_measurements(batch_size=2, progress=stop)
+    db.session.rollback()
+    assert _flags()[1:] == [(70.0, 160.0, True)] * 2
+
+    result = reflag_measurements(batch_size=2)
+
+    assert result['resumed_from'] > 0 and _flags() == [(70.0, 120.0, False)] * 3
+
+
+def test_match_without_age_skips_age_bands(mice):
+    db.session.add_all([
+        ReferenceRange(species_id=mice.id, parameter_name='ALT', unit='U/L', age_min_weeks=4,
+                       range_min=1, range_max=2),
+        ReferenceRange(species_id=mice.id, parameter_name='ALT', unit='U/L',
+                       range_min=10, range_max=50),
+    ])
+    db.session.commit()
+    candidates = load_reference_ranges()[(mice.id, 'ALT', 'U/L')]
+
+    assert match_reference_range(candidates, 'C57BL/6', 'Male', None) == (10, 50)
+    assert match_reference_range(candidates, 'C57BL/6', 'Male', 5.0) == (1, 2)
@@ -0,0 +1,86 @@
+import json
+
+from sqlalchemy import event, func, select
+
+from api.rest import api_bp
+from models.database import db, Species, Animal, Experiment, Assay, AssayMeasurement
+from models.synthetic import generate_dataset
+
+
+def _client(db_app):
+    db_app.register_blueprint(api_bp)
+    return db_app.test_client()
+
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def _count(model):
+    return db.session.execute(select(func.count(model.id))).scalar()
+
+
+def test_streams_every_collection_as_ndjson(db_app):
+    generate_dataset(scale=0.01, seed=3)
+    client = _client(db_app)
+
+    for path, model in (('/api/animals', Animal), ('/api/experiments', Experiment),
+                        ('/api/assays', Assay), ('/api/measurements', AssayMeasurement)):
+        response = client.get(f'{path}?batch_size=7')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        rows = _ndjson(response)
+        assert len(rows) == _count(model), path
+        assert [row['id'] for row in rows] == sorted(row['id'] for row in rows)
+
+    experiment = _ndjson(client.get('/api/experiments?limit=1'))[0]
+    assert experiment['animal']['species']['scientific_name']
+    assert experiment['therapies'] and experiment['therapies'][0]['category']['name']
+    assay = _ndjson(client.get('/api/assays?limit=1'))[0]
+    assert assay['assay_type']['name'] and assay['measurements'][0]['parameter_name']
+
+
+def test_json_array_format_and_resume(db_app):
+    generate_dataset(scale=0.01, seed=3)
+    client = _client(db_app)
+
+    everything = client.get('/api/measurements?format=json&batch_size=50')
+    assert everything.mimetype == 'application/json'
+    rows = json.loads(everything.get_data(as_text=True))
+    assert len(rows) == _count(AssayMeasurement)
+
+    first = _ndjson(client.get('/api/measurements?limit=10'))
+    rest = _ndjson(client.get(f"/api/measurements?after_id={first[-1]['id']}"))
+    assert [row['id'] for row in first + rest] == [row['id'] for row in rows]
+
+    response = client.get('/api/animals?format=json&species_id=999')
+    assert json.loads(response.get_data(as_text=True)) == []
+    assert client.get('/api/animals?format=csv').status_code == 400
+
+
+def test_statements_do_not_grow_with_rows(db_app):
+    generate_dataset(scale=0.02, seed=3)
+    client = _client(db_app)
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    rows = _ndjson(client.get('/api/experiments?batch_size=10000'))
+
+    # The ETag/Last-Modified query, one query for the experiments and one IN
+    # query for their therapies
+    assert len(rows) > 20
+    assert len(statements) == 3
+
+
+def test_stored_values_outside_schema_enums_are_streamed(db_app):
+    species = Species(common_name='Mouse', scientific_name='Mus musculus')
+    db.session.add(species)
+    db.session.flush()
+    db.session.add(Animal(accession_number='MM2025000001A5', species_id=species.id, sex='Intersex'))
+    db.session.commit()
+
+    rows = _ndjson(_client(db_app).get('/api/animals?sex=Intersex'))
+
+    assert [(row['accession_number'], row['sex']) for row in rows] == [
+        ('MM2025000001A5', 'Intersex')]
+    assert rows[0]['species']['common_name'] == 'Mouse'
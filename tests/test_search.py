@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from models.database import db, Species, Animal, TherapyCategory, Therapy, Experiment
+from models.search import (
+    build_match_expression, fts_available, rebuild_search_index, search_experiments
+)
+
+
+def _populate():
+    mouse = Species(common_name='Mouse', scientific_name='Mus musculus')
+    category = TherapyCategory(name='Gene Therapy')
+    db.session.add_all([mouse, category])
+    db.session.flush()
+    aav = Therapy(name='AAV9-SMN1', category_id=category.id, molecular_target='SMN1')
+    animal = Animal(accession_number='MM2025000001C9', species_id=mouse.id)
+    db.session.add_all([aav, animal])
+    db.session.flush()
+    glucose = Experiment(title='Glucose tolerance after gene transfer', animal_id=animal.id,
+                         start_date=datetime(2025, 1, 1), notes='Fasted overnight')
+    motor = Experiment(title='Motor function study', animal_id=animal.id,
+                       start_date=datetime(2025, 2, 1), primary_endpoint='Rotarod latency')
+    db.session.add_all([glucose, motor])
+    db.session.commit()
+    return glucose, motor, aav
+
+
+def _titles(query):
+    experiments_query, _ = search_experiments(query)
+    return [experiment.title for experiment in experiments_query.all()]
+
+
+def test_match_expression_quotes_tokens():
+    assert build_match_expression('gluc tol') == '"gluc"* "tol"*'
+    assert build_match_expression('NEAR(" OR *') == '"NEAR"* "OR"*'
+    assert build_match_expression('  --  ') == ''
+
+
+def test_index_follows_writes(db_app):
+    assert fts_available(db.session.connection())
+    glucose, motor, aav = _populate()
+
+    assert _titles('gluc') == ['Glucose tolerance after gene transfer']
+    assert _titles('rotarod') == ['Motor function study']
+    assert _titles('MM2025') == ['Motor function study', 'Glucose tolerance after gene transfer']
+    assert _titles('smn1') == []
+
+    # Linking a therapy indexes its name and molecular target
+    motor.therapies.append(aav)
+    db.session.commit()
+    assert _titles('smn1') == ['Motor function study']
+
+    aav.molecular_target = 'Survival motor neuron'
+    db.session.commit()
+    assert _titles('neuron') == ['Motor function study']
+
+    db.session.delete(glucose)
+    db.session.commit()
+    assert _titles('glucose') == []
+
+
+def test_title_matches_rank_first(db_app):
+    glucose, motor, _ = _populate()
+    motor.notes = 'Glucose was not measured'
+    db.session.commit()
+    assert _titles('glucose')[0] == glucose.title
+
+
+def test_rebuild_search_index(db_app):
+    _populate()
+    connection = db.session.connection()
+    connection.exec_driver_sql('DELETE FROM experiment_search')
+    assert _titles('glucose') == []
+    assert rebuild_search_index(connection) == 2
+    assert _titles('glucose') == ['Glucose tolerance after gene transfer']
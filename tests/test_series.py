@@ -0,0 +1,163 @@
+import math
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, func, select
+
+from api.rest import api_bp
+from models import series as series_module
+from models.database import (
+    db, Species, Animal, Experiment, AssayType, Assay, AssayMeasurement, MeasurementSeries
+)
+from models.series import (
+    decode_series, encode_series, get_animal_series, get_series, rebuild_series, refresh_series
+)
+from models.synthetic import generate_dataset
+
+
+@pytest.fixture(params=['numpy', 'array'])
+def arrays(request, monkeypatch):
+    """Decode with NumPy and with the array module fallback"""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(series_module, 'np', None)
+    return request.param
+
+
+def _animal_with_assays():
+    species = Species(common_name='Mouse', scientific_name='Mus musculus')
+    db.session.add(species)
+    db.session.flush()
+    animal = Animal(accession_number='MM2025000001A5', species_id=species.id)
+    assay_type = AssayType(name='Blood Chemistry')
+    db.session.add_all([animal, assay_type])
+    db.session.flush()
+    experiment = Experiment(title='Dosing', animal_id=animal.id, start_date=datetime(2025, 1, 6))
+    db.session.add(experiment)
+    db.session.flush()
+    return animal, experiment, assay_type
+
+
+def _measure(animal, experiment, assay_type, hours, **values):
+    assay = Assay(experiment_id=experiment.id, assay_type_id=assay_type.id, timepoint_hours=hours)
+    assay.animals.append(animal)
+    assay.measurements = [AssayMeasurement(parameter_name=name, value=value, unit='mg/dL')
+                          for name, value in values.items()]
+    db.session.add(assay)
+    db.session.commit()
+
+
+def test_encode_decode_round_trip(arrays):
+    hours, values = decode_series(encode_series([0.0, 24.0, None], [1.5, None, 3.0]), 3)
+
+    assert list(hours[:2]) == [0.0, 24.0] and math.isnan(hours[2])
+    assert values[0] == 1.5 and math.isnan(values[1]) and values[2] == 3.0
+
+
+def test_refresh_rebuilds_only_animals_with_new_measurements(db_app, arrays):
+    animal, experiment, assay_type = _animal_with_assays()
+    _measure(animal, experiment, assay_type, 48.0, Glucose=110.0)
+    _measure(animal, experiment, assay_type, 0.0, Glucose=95.0, Insulin=1.2)
+
+    assert refresh_series() == 2
+    glucose = get_series(animal.id, 'Glucose')
+    assert (list(glucose.timepoint_hours), list(glucose.values), glucose.unit) == \
+        ([0.0, 48.0], [95.0, 110.0], 'mg/dL')
+    assert refresh_series() == 0
+
+    _measure(animal, experiment, assay_type, 24.0, Glucose=101.0)
+    assert refresh_series() == 2
+    assert list(get_series(animal.id, 'Glucose').values) == [95.0, 101.0, 110.0]
+    assert sorted(get_animal_series(animal.id)) == ['Glucose', 'Insulin']
+    assert get_series(animal.id, 'Weight') is None
+
+
+def test_refresh_picks_up_rows_committed_below_the_watermark(db_app):
+    animal, experiment, assay_type = _animal_with_assays()
+    _measure(animal, experiment, assay_type, 0.0, Glucose=95.0)
+    # A later transaction's id is folded in first ...
+    assay = Assay(experiment_id=experiment.id, assay_type_id=assay_type.id, timepoint_hours=24.0)
+    assay.animals.append(animal)
+    assay.measurements = [AssayMeasurement(id=50, parameter_name='Glucose', value=101.0,
+                                           unit='mg/dL')]
+    db.session.add(assay)
+    db.session.commit()
+    assert refresh_series() == 1
+
+    # ... then an earlier id commits, leaving the newest id unchanged
+    assay = Assay(experiment_id=experiment.id, assay_type_id=assay_type.id, timepoint_hours=48.0)
+    assay.animals.append(animal)
+    assay.measurements = [AssayMeasurement(id=2, parameter_name='Glucose', value=110.0,
+                                           unit='mg/dL')]
+    db.session.add(assay)
+    db.session.commit()
+    assert refresh_series() == 1
+    assert list(get_series(animal.id, 'Glucose').values) == [95.0, 101.0, 110.0]
+    assert refresh_series() == 0
+
+
+def test_assays_without_linked_animals_belong_to_the_experiment_animal(db_app):
+    animal, experiment, assay_type = _animal_with_assays()
+    # As the web form creates them: no animal_assays link
+    assay = Assay(experiment_id=experiment.id, assay_type_id=assay_type.id, timepoint_hours=0.0)
+    assay.measurements = [AssayMeasurement(parameter_name='Glucose', value=95.0, unit='mg/dL')]
+    db.session.add(assay)
+    db.session.commit()
+
+    assert refresh_series() == 1
+    assert list(get_series(animal.id, 'Glucose').values) == [95.0]
+    assert rebuild_series() == 1
+
+
+def test_writers_leave_building_and_rechecks_to_the_command(db_app):
+    animal, experiment, assay_type = _animal_with_assays()
+    _measure(animal, experiment, assay_type, 0.0, Glucose=95.0)
+    assert refresh_series(recheck=False) == 0 and get_series(animal.id, 'Glucose') is None
+
+    assert refresh_series() == 1
+    _measure(animal, experiment, assay_type, 24.0, Glucose=101.0)
+    assert refresh_series(recheck=False) == 1
+    assert list(get_series(animal.id, 'Glucose').values) == [95.0, 101.0]
+
+
+def test_refresh_matches_full_rebuild(db_app):
+    generate_dataset(scale=0.01, seed=3)
+    refresh_series()
+    incremental = {(row.animal_id, row.parameter_name): row.data
+                   for row in db.session.execute(select(MeasurementSeries)).scalars()}
+    db.session.rollback()
+
+    assert rebuild_series() == len(incremental)
+    rebuilt = {(row.animal_id, row.parameter_name): row.data
+               for row in db.session.execute(select(MeasurementSeries)).scalars()}
+    assert rebuilt == incremental
+    total = db.session.execute(select(func.sum(MeasurementSeries.count))).scalar()
+    assert total == db.session.execute(select(func.count(AssayMeasurement.id))).scalar()
+
+
+def test_series_api_serves_arrays_without_loading_measurements(db_app):
+    animal, experiment, assay_type = _animal_with_assays()
+    _measure(animal, experiment, assay_type, 0.0, Glucose=95.0)
+    _measure(animal, experiment, assay_type, None, Glucose=90.0)
+    db_app.register_blueprint(api_bp)
+    client = db_app.test_client()
+    refresh_series()
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    response = client.get(f'/api/animals/{animal.id}/series/Glucose')
+
+    assert response.get_json() == {'animal_id': animal.id, 'parameter_name': 'Glucose',
+                                   'unit': 'mg/dL', 'count': 2, 'timepoint_hours': [0.0, None],
+                                   'values': [95.0, 90.0]}
+    assert not any('assay_measurements' in statement and 'max(' not in statement
+                   for statement in statements)
+
+    binary = client.get(f'/api/animals/{animal.id}/series/Glucose?format=binary')
+    assert binary.mimetype == 'application/octet-stream'
+    assert binary.headers['X-Series-Count'] == '2' and binary.headers['X-Series-Unit'] == 'mg/dL'
+    assert binary.data == encode_series([0.0, None], [95.0, 90.0])
+
+    assert list(client.get(f'/api/animals/{animal.id}/series').get_json()['series']) == ['Glucose']
+    assert client.get(f'/api/animals/{animal.id}/series/Weight').status_code == 404
@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+
+from models.database import (
+    db, Species, Animal, Experiment, AssayType, Assay, AssayMeasurement, ExperimentResult
+)
+from models.statistics import compute_summary, compute_measurement_insights, get_summary
+from models.cache import StatisticsCache, statistics_cache
+
+
+def _populate(now):
+    mouse = Species(common_name='Mouse', scientific_name='Mus musculus')
+    rat = Species(common_name='Rat', scientific_name='Rattus norvegicus')
+    blood = AssayType(name='Blood Chemistry', category='Biochemical')
+    db.session.add_all([mouse, rat, blood])
+    db.session.flush()
+
+    animals = []
+    for i in range(30):
+        animal = Animal(
+            accession_number=f'MM{i:012d}',
+            species_id=mouse.id if i % 3 else rat.id,
+            strain='C57BL/6' if i % 2 else None,
+            age_at_start=8.0,
+            weight_at_start=20.0,
+            created_at=now - timedelta(days=13 * i)
+        )
+        animals.append(animal)
+    db.session.add_all(animals)
+    db.session.flush()
+
+    for i, animal in enumerate(animals):
+        experiment = Experiment(
+            title=f'Study {i}',
+            animal_id=animal.id,
+            start_date=now,
+            end_date=now if i % 4 == 0 else None,
+            created_at=now - timedelta(days=11 * i)
+        )
+        db.session.add(experiment)
+        db.session.flush()
+        if i % 5 == 0:
+            db.session.add(Assay(experiment_id=experiment.id, assay_type_id=blood.id))
+    db.session.commit()
+
+
+def test_compute_summary_matches_per_query_counts(db_app):
+    now = datetime(2025, 6, 15, 12, 0, 0)
+    _populate(now)
+
+    summary = compute_summary(now=now)
+
+    assert summary['total_animals'] == 30
+    assert summary['total_experiments'] == 30
+    assert summary['total_therapies'] == 0
+    assert summary['total_assays'] == 6
+    assert summary['species_breakdown'] == {'Mouse': 20, 'Rat': 10}
+    assert summary['assay_distribution'] == {'Biochemical': 6}
+    assert summary['recent_experiments'] == Experiment.query.filter(
+        Experiment.created_at >= now - timedelta(days=30)).count()
+    assert summary['data_quality'] == {
+        'complete_experiments': 8,
+        'experiments_with_assays': 6,
+        'animals_with_metadata': 15
+    }
+
+    # Monthly buckets must agree with the original one-query-per-month loop
+    assert len(summary['monthly_data']) == 12
+    for i, bucket in enumerate(summary['monthly_data']):
+        month_start = now - timedelta(days=30 * (12 - i))
+        month_end = month_start + timedelta(days=30)
+        assert bucket['month'] == month_start.strftime('%b')
+        assert bucket['animals'] == Animal.query.filter(
+            Animal.created_at >= month_start, Animal.created_at < month_end).count()
+        assert bucket['experiments'] == Experiment.query.filter(
+            Experiment.created_at >= month_start, Experiment.created_at < month_end).count()
+
+
+def test_compute_summary_empty_database(db_app):
+    summary = compute_summary()
+    assert summary['total_animals'] == 0
+    assert summary['species_breakdown'] == {}
+    assert [m['animals'] for m in summary['monthly_data']] == [0] * 12
+
+
+def test_summary_cache_invalidated_by_commit(db_app):
+    statistics_cache.clear()
+    statistics_cache.watch(db.session)
+    mouse = Species(common_name='Mouse', scientific_name='Mus musculus')
+    db.session.add(mouse)
+    db.session.commit()
+
+    assert get_summary()['total_animals'] == 0
+    assert get_summary()['total_animals'] == 0
+    stats = statistics_cache.stats()
+    assert stats['hits'] >= 1 and stats['entries'] == 1
+
+    # A write to an unrelated table leaves the entry alone
+    db.session.add(ExperimentResult(experiment_id=1))
+    db.session.commit()
+    assert statistics_cache.stats()['entries'] == 1
+
+    db.session.add(Animal(accession_number='MM2025000001XX', species_id=mouse.id))
+    db.session.commit()
+    assert statistics_cache.stats()['entries'] == 0
+    assert get_summary()['total_animals'] == 1
+
+
+def test_cache_ttl_and_table_invalidation():
+    cache = StatisticsCache(ttl=0)
+    cache.set('expired', 1, depends_on=('animals',))
+    assert cache.get('expired') is None
+
+    cache = StatisticsCache()
+    cache.set('a', 1, depends_on=(Animal,))
+    cache.set('b', 2, depends_on=('assays',))
+    assert cache.invalidate_tables(['animals']) == 1
+    assert cache.get('a') is None and cache.get('b') == 2
+
+
+def _naive_insights(experiment_id):
+    """The per-row algorithm experiment_profile() used before grouping"""
+    all_measurements = []
+    for assay in Assay.query.filter_by(experiment_id=experiment_id).order_by(Assay.id):
+        for measurement in sorted(assay.measurements, key=lambda m: m.id):
+            all_measurements.append({'parameter': measurement.parameter_name,
+                                     'value': measurement.value, 'unit': measurement.unit})
+    groups = {}
+    for m in all_measurements:
+        groups.setdefault(m['parameter'], []).append(m['value'])
+    insights = []
+    for param, values in groups.items():
+        if values and all(v is not None for v in values):
+            insights.append({
+                'parameter': param,
+                'value': round(sum(values) / len(values), 2),
+                'unit': next(m['unit'] for m in all_measurements if m['parameter'] == param),
+                'count': len(values), 'min': min(values), 'max': max(values)
+            })
+    insights.sort(key=lambda x: x['count'], reverse=True)
+    return insights
+
+
+def test_measurement_insights_match_python_grouping(db_app):
+    now = datetime(2025, 6, 15)
+    _populate(now)
+    blood = AssayType.query.first()
+    experiment = Experiment.query.first()
+    other = Experiment.query.offset(1).first()
+    for i in range(4):
+        assay = Assay(experiment_id=experiment.id, assay_type_id=blood.id)
+        db.session.add(assay)
+        db.session.flush()
+        db.session.add_all([
+            AssayMeasurement(assay_id=assay.id, parameter_name='Glucose', value=90.0 + i,
+                             unit='mg/dL'),
+            AssayMeasurement(assay_id=assay.id, parameter_name='ALT', value=30.5 * i,
+                             unit='U/L' if i else 'IU/L'),
+            AssayMeasurement(assay_id=assay.id, parameter_name='Weight',
+                             value=None if i == 2 else 20.0),
+        ])
+        if i % 2:
+            db.session.add(AssayMeasurement(assay_id=assay.id, parameter_name='BUN', value=i / 3,
+                                            unit='mg/dL'))
+    other_assay = Assay(experiment_id=other.id, assay_type_id=blood.id)
+    db.session.add(other_assay)
+    db.session.flush()
+    db.session.add(AssayMeasurement(assay_id=other_assay.id, parameter_name='Glucose', value=500.0))
+    db.session.commit()
+
+    insights = compute_measurement_insights(experiment.id)
+    assert insights == _naive_insights(experiment.id)
+    assert [i['parameter'] for i in insights] == ['Glucose', 'ALT', 'BUN']
+    assert insights[1]['unit'] == 'IU/L'
+    assert compute_measurement_insights(experiment.id, limit=1) == insights[:1]
@@ -0,0 +1,74 @@
+import pytest
+from sqlalchemy import select, update
+
+from models import units
+from models.database import db, AssayMeasurement
+from models.synthetic import generate_dataset
+from models.units import (
+    backfill_canonical_values, canonical_conversion, canonical_values, conversion_factor,
+    normalize_unit_name
+)
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def converter(request, monkeypatch):
+    """Run each test with NumPy and with the plain Python conversion"""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(units, 'np', None)
+    return request.param
+
+
+def test_conversion_factors():
+    assert conversion_factor('Albumin', 'g/L', 'g/dL') == pytest.approx(0.1)
+    assert conversion_factor('Glucose', 'mmol/l', 'mg/dL') == pytest.approx(18.016)
+    assert conversion_factor('Glucose', 'mg/dL', 'mmol/L') == pytest.approx(1 / 18.016)
+    assert conversion_factor('Creatinine', 'umol/L', 'mg/dL') == pytest.approx(0.011312)
+    # Molar <-> mass needs a molar mass; different dimensions never convert
+    assert conversion_factor('Unknown analyte', 'mmol/L', 'mg/dL') is None
+    assert conversion_factor('Glucose', 'U/L', 'mg/dL') is None
+    assert normalize_unit_name(' K/uL ') == '10^3/µL' and normalize_unit_name('') is None
+
+
+def test_canonical_units():
+    assert canonical_conversion('Glucose', 'mmol/L') == (pytest.approx(18.016), 'mg/dL')
+    assert canonical_conversion('Albumin', 'g/L') == (pytest.approx(0.1), 'g/dL')
+    assert canonical_conversion('RBC', '10^12/L') == (pytest.approx(1.0), '10^6/µL')
+    assert canonical_conversion('ALT', 'IU/L') == (1.0, 'U/L')
+    assert canonical_conversion('Inflammation score', 'score') == (1.0, 'score')
+    assert canonical_conversion('Glucose', None) == (1.0, None)
+
+
+def test_canonical_values(converter):
+    values, unit_names = canonical_values(['Glucose', 'Glucose', 'Albumin', 'ALT'],
+                                          [5.5, None, 36.0, 40.0],
+                                          ['mmol/L', 'mg/dL', 'g/L', 'U/L'])
+
+    assert values == [pytest.approx(99.088), None, pytest.approx(3.6), 40.0]
+    assert unit_names == ['mg/dL', 'mg/dL', 'g/dL', 'U/L']
+
+
+def test_backfill_converts_unconverted_rows(db_app, converter):
+    generate_dataset(scale=0.01, seed=3)
+    table = AssayMeasurement.__table__
+    expected = db.session.execute(select(table.c.id, table.c.canonical_value,
+                                         table.c.canonical_unit).order_by(table.c.id)).all()
+    # Enter some glucose in mmol/L, as another lab would, and drop every
+    # stored canonical value
+    db.session.execute(update(table).where(table.c.parameter_name == 'Glucose')
+                       .values(value=table.c.value / 18.016, unit='mmol/L'))
+    db.session.execute(update(table).values(canonical_value=None, canonical_unit=None))
+    db.session.commit()
+
+    progress = []
+    result = backfill_canonical_values(
+        batch_size=100, progress=lambda totals: progress.append(totals['scanned']))
+
+    assert result['scanned'] == len(expected) and progress[-1] == len(expected)
+    assert len(progress) > 1
+    backfilled = db.session.execute(select(table.c.id, table.c.canonical_value,
+                                           table.c.canonical_unit).order_by(table.c.id)).all()
+    assert [row[2] for row in backfilled] == [row[2] for row in expected]
+    assert [row[1] for row in backfilled] == pytest.approx([row[1] for row in expected])
+    assert backfill_canonical_values()['scanned'] == 0